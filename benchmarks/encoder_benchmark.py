@@ -0,0 +1,265 @@
+from typing import *
+
+import sys
+import math
+import json
+import pickle
+import time
+import random
+import string
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+import redis
+
+from wormhole.message import WormholeMessage
+from wormhole.schema import wormhole_schema, get_schema
+from wormhole.encoding.base import WormholeEncoder
+from wormhole.encoding.blobenc import WormholeBlobEncoder
+from wormhole.encoding.blobstore import WormholeMmapBlobStore
+from wormhole.encoding.jsonenc import WormholeJsonEncoder
+from wormhole.encoding.pickleenc import WormholePickleEncoder
+from wormhole.encoding.schemaenc import WormholeSchemaEncoder
+from wormhole.encoding.zdictenc import WormholeZdictEncoder
+
+DEFAULT_SCHEMA_TYPE_ID = 255
+BLOB_SIZES = {"bytes_1k": 1024, "bytes_64k": 64 * 1024, "bytes_1m": 1024 * 1024}
+CATEGORIES = ("small_dict", "message", "schema_message") + tuple(BLOB_SIZES) + ("nested", "exception")
+ENCODERS = ("pickle", "pickle_out_of_band", "json", "schema", "blob", "zdict")
+OUT_OF_BAND_THRESHOLD = 64 * 1024
+BENCHMARK_QUEUE_PREFIX = "benchmark:"
+
+
+class BenchmarkMessage(WormholeMessage):
+    def __init__(self, user_id: int, name: str, position: Tuple[float, float, float], tags: List[str]):
+        self.user_id = user_id
+        self.name = name
+        self.position = position
+        self.tags = tags
+
+
+class BenchmarkSchemaMessage(WormholeMessage):
+    """Becomes a schema class once register_schema() was called"""
+    user_id: int
+    x: float
+    y: float
+    z: float
+    name: str
+
+
+def register_schema(type_id: int = DEFAULT_SCHEMA_TYPE_ID) -> Type[BenchmarkSchemaMessage]:
+    """Registers the schema of BenchmarkSchemaMessage under type_id, unless it was registered already"""
+    global BenchmarkSchemaMessage
+    if get_schema(BenchmarkSchemaMessage) is None:
+        BenchmarkSchemaMessage = wormhole_schema(type_id)(BenchmarkSchemaMessage)
+    return BenchmarkSchemaMessage
+
+
+def generate_corpus(seed: int = 0, items_per_category: int = 32) -> Dict[str, List[Any]]:
+    """
+    Generates payloads shaped like the ones sent through wormhole, by category. The same seed generates the same
+    corpus, so runs on different trees compare the same payloads. Registers the benchmark schema if needed.
+    """
+    schema_message_cls = register_schema()
+    rng = random.Random(seed)
+
+    def word() -> str:
+        return "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 10)))
+
+    def small_dict() -> dict:
+        return {"id": rng.randint(0, 2 ** 31), "name": word(), "score": rng.random() * 100,
+                "active": rng.random() < 0.5, "tags": [word() for _ in range(rng.randint(0, 4))]}
+
+    def nested(depth: int) -> Any:
+        if depth == 0:
+            return small_dict()
+        return {word(): [nested(depth - 1) for _ in range(rng.randint(1, 3))] for _ in range(rng.randint(2, 4))}
+
+    def blob(size: int, index: int) -> bytes:
+        # Half of the blobs are incompressible, the other half are repetitive like logs or serialized records
+        if index % 2 == 0:
+            return rng.getrandbits(size * 8).to_bytes(size, "little")
+        line = f"2020-01-01 INFO {word()} handled request {rng.randint(0, 10 ** 6)}\n".encode()
+        return (line * (size // len(line) + 1))[:size]
+
+    exception_types = (ValueError, KeyError, RuntimeError, TimeoutError)
+    corpus: Dict[str, List[Any]] = {
+        "small_dict": [small_dict() for _ in range(items_per_category)],
+        "message": [BenchmarkMessage(rng.randint(0, 2 ** 31), word(), (rng.random(), rng.random(), rng.random()),
+                                     [word() for _ in range(3)]) for _ in range(items_per_category)],
+        "schema_message": [schema_message_cls(rng.randint(0, 2 ** 31), rng.random(), rng.random(), rng.random(),
+                                              word()) for _ in range(items_per_category)],
+    }
+    for category, size in BLOB_SIZES.items():
+        # Fewer large blobs keep a run short, at least one of each kind
+        count = max(2, min(items_per_category, items_per_category * 64 * 1024 // size))
+        corpus[category] = [blob(size, i) for i in range(count)]
+    corpus["nested"] = [nested(3) for _ in range(items_per_category)]
+    # Error replies carry the exception raised by the handler
+    corpus["exception"] = [exception_types[i % len(exception_types)](f"{word()} failed: {word()} {rng.randint(0, 999)}")
+                           for i in range(items_per_category)]
+    return corpus
+
+
+def get_encoders(names: Iterable[str] = ENCODERS, rdb: Optional[redis.Redis] = None,
+                 blob_directory: Optional[str] = None, sample_count: int = 32) -> Dict[str, WormholeEncoder]:
+    """
+    Creates the named encoders, zdict is skipped without a redis client. Its dictionaries are trained from
+    sample_count payloads of every category during the warmup.
+    """
+    encoders: Dict[str, WormholeEncoder] = {}
+    for name in names:
+        if name == "pickle":
+            encoders[name] = WormholePickleEncoder()
+        elif name == "pickle_out_of_band":
+            encoders[name] = WormholePickleEncoder(out_of_band_threshold=OUT_OF_BAND_THRESHOLD)
+        elif name == "json":
+            encoders[name] = WormholeJsonEncoder()
+        elif name == "schema":
+            encoders[name] = WormholeSchemaEncoder()
+        elif name == "blob":
+            encoders[name] = WormholeBlobEncoder(WormholeMmapBlobStore(blob_directory))
+        elif name == "zdict":
+            if rdb is not None:
+                encoders[name] = WormholeZdictEncoder(rdb, sample_count=sample_count)
+        else:
+            raise ValueError(f"Unknown encoder: {name}")
+    return encoders
+
+
+def percentile(sorted_values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if len(sorted_values) == 0:
+        return 0.0
+    rank = math.ceil(percent / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+def summarize(latencies: List[float], total_bytes: int, peak_allocation: int) -> Dict[str, float]:
+    total_time = sum(latencies)
+    latencies = sorted(latencies)
+    return {
+        "ops_per_sec": len(latencies) / total_time if total_time > 0 else 0.0,
+        "mb_per_sec": total_bytes / total_time / 1024 / 1024 if total_time > 0 else 0.0,
+        "p50_us": percentile(latencies, 50) * 1000000,
+        "p99_us": percentile(latencies, 99) * 1000000,
+        "peak_allocation_bytes": peak_allocation,
+    }
+
+
+def benchmark_encoder(encoder: WormholeEncoder, items: List[Any], queue_name: str, iterations: int) -> Dict[str, Any]:
+    """
+    Encodes and decodes every item iterations times, one operation at a time. Payloads are encoded for queue_name
+    like a channel sending to it would. Throughput is measured over the pickled size of the items so encoders
+    compare on the same bytes, peak allocation is measured in a separate pass since tracing allocations slows every
+    operation down.
+    """
+    try:
+        # Warms caches up and lets adaptive encoders sample and train, an item the encoder can't handle fails here
+        for item in items:
+            encoder.decode(encoder.encode_for_queue(item, queue_name))
+        if isinstance(encoder, WormholeZdictEncoder):
+            encoder.wait_for_training()
+    except Exception as e:
+        return {"supported": False, "error": f"{type(e).__name__}: {e}"}
+    payload_size = sum(len(pickle.dumps(item)) for item in items)
+    encode_latencies: List[float] = []
+    decode_latencies: List[float] = []
+    encoded_bytes = 0
+    for _ in range(iterations):
+        encoded_items = []
+        for item in items:
+            start = time.perf_counter()
+            encoded = encoder.encode_for_queue(item, queue_name)
+            encode_latencies.append(time.perf_counter() - start)
+            encoded_items.append(encoded)
+        for encoded in encoded_items:
+            start = time.perf_counter()
+            encoder.decode(encoded)
+            decode_latencies.append(time.perf_counter() - start)
+        encoded_bytes += sum(len(encoded) for encoded in encoded_items)
+    encode_peak, decode_peak = 0, 0
+    for item in items:
+        tracemalloc.start()
+        encoded = encoder.encode_for_queue(item, queue_name)
+        encode_peak = max(encode_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+        tracemalloc.start()
+        encoder.decode(encoded)
+        decode_peak = max(decode_peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    encoded_count = iterations * len(items)
+    return {
+        "supported": True,
+        "items": len(items),
+        "mean_payload_size": payload_size / len(items),
+        "mean_encoded_size": encoded_bytes / encoded_count if encoded_count else 0.0,
+        "size_ratio": encoded_bytes / (payload_size * iterations) if encoded_count else 0.0,
+        "encode": summarize(encode_latencies, payload_size * iterations, encode_peak),
+        "decode": summarize(decode_latencies, payload_size * iterations, decode_peak),
+    }
+
+
+def run_benchmark(encoders: Dict[str, WormholeEncoder], corpus: Dict[str, List[Any]],
+                  iterations: int = 20) -> Dict[str, Any]:
+    """Benchmarks every encoder on every category of the corpus, the report is json serializable"""
+    results = []
+    for encoder_name, encoder in encoders.items():
+        for category, items in corpus.items():
+            result = benchmark_encoder(encoder, items, f"{BENCHMARK_QUEUE_PREFIX}{category}", iterations)
+            results.append({"encoder": encoder_name, "category": category, **result})
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": time.time(),
+        "iterations": iterations,
+        "results": results,
+    }
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [f"{'encoder':<20}{'category':<16}{'size':>10}{'ratio':>8}{'enc MB/s':>10}{'enc p50':>10}{'enc p99':>10}"
+             f"{'dec MB/s':>10}{'dec p50':>10}{'dec p99':>10}{'enc peak':>10}{'dec peak':>10}"]
+    for result in report["results"]:
+        prefix = f"{result['encoder']:<20}{result['category']:<16}"
+        if not result["supported"]:
+            lines.append(f"{prefix}unsupported: {result['error']}")
+            continue
+        encode, decode = result["encode"], result["decode"]
+        lines.append(f"{prefix}{result['mean_encoded_size']:>10.0f}{result['size_ratio']:>8.2f}"
+                     f"{encode['mb_per_sec']:>10.1f}{encode['p50_us']:>10.1f}{encode['p99_us']:>10.1f}"
+                     f"{decode['mb_per_sec']:>10.1f}{decode['p50_us']:>10.1f}{decode['p99_us']:>10.1f}"
+                     f"{encode['peak_allocation_bytes']:>10}{decode['peak_allocation_bytes']:>10}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmarks wormhole encoders on a generated payload corpus")
+    parser.add_argument("--iterations", type=int, default=20, help="passes over the corpus per encoder")
+    parser.add_argument("--items", type=int, default=32, help="payloads generated per category")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the generated corpus")
+    parser.add_argument("--encoders", nargs="+", choices=ENCODERS, default=list(ENCODERS))
+    parser.add_argument("--categories", nargs="+", choices=CATEGORIES, default=list(CATEGORIES))
+    parser.add_argument("--redis-uri", help="redis for the zdict encoder, its dictionaries are left there")
+    parser.add_argument("--json", dest="json_path", help="writes the report as json to this path")
+    parser.add_argument("--schema-type-id", type=int, default=DEFAULT_SCHEMA_TYPE_ID,
+                        help="schema type id of the schema messages, one the benchmarked code does not use")
+    args = parser.parse_args(argv)
+    register_schema(args.schema_type_id)
+    corpus = generate_corpus(args.seed, args.items)
+    corpus = {category: corpus[category] for category in args.categories}
+    rdb = redis.from_url(args.redis_uri) if args.redis_uri else None
+    with tempfile.TemporaryDirectory(prefix="wormhole-benchmark-") as blob_directory:
+        encoders = get_encoders(args.encoders, rdb, blob_directory, sample_count=args.items)
+        report = run_benchmark(encoders, corpus, args.iterations)
+    report["seed"] = args.seed
+    print(format_report(report))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
\ No newline at end of file
@@ -15,7 +15,7 @@ setup(
     author_email = "litaln@gmail.com",
     description = ("Minimal RPC and message distribution framework"),
     license = "MIT",
-    install_requires = ["redis>=3.3.11"],
+    install_requires = ["redis>=4.1"],
     keywords = "wormhole rdisq redis messaging",
     packages=find_packages(),
     long_description="Please see README.md",
@@ -1,176 +1,597 @@
-﻿import time
-import redis
-
-from tests.test_objects import Vector3
-from wormhole.channel import WormholeRedisChannel
-
-from typing import *
-
-
-class TestRedisChannel:
-    TEST_REDIS_URL = "redis://localhost:6379/1"
-    redis_client: Optional[redis.Redis]
-    tested_channel: Optional[WormholeRedisChannel]
-
-    def setup_method(self):
-        self.redis_client = redis.from_url(self.TEST_REDIS_URL)
-        self.redis_client.flushdb()
-        self.tested_channel = WormholeRedisChannel(self.TEST_REDIS_URL)
-
-    def teardown_method(self):
-        self.redis_client.flushdb()
-        self.redis_client = None
-        self.tested_channel = None
-
-    def test_locks(self):
-        lock1_name = "lock1"
-        secret = self.tested_channel.lock(lock1_name)
-        assert secret
-        assert self.tested_channel.is_locked(lock1_name)
-        assert not self.tested_channel.lock(lock1_name, block=False)
-        assert not self.tested_channel.lock(lock1_name, block_timeout=1)
-        assert self.tested_channel.release(lock1_name, secret)
-        assert not self.tested_channel.is_locked(lock1_name)
-        # test lock timeout
-        secret = self.tested_channel.lock(lock1_name, lock_timeout=1)
-        assert secret
-        assert self.tested_channel.is_locked(lock1_name)
-        time.sleep(1.1)
-        assert not self.tested_channel.is_locked(lock1_name)
-        assert not self.tested_channel.release(lock1_name, secret)
-        # Test release with forces
-        assert self.tested_channel.lock(lock1_name)
-        assert self.tested_channel.is_locked(lock1_name)
-        assert self.tested_channel.release(lock1_name, "invalid_secret", force=True)
-        assert not self.tested_channel.is_locked(lock1_name)
-
-    def test_core_send_and_reply_str(self):
-        imaginary_receiver_id = "receiver1"
-        test_queue_name = "my_queue"
-        dummy_queue_name = "i am another queue"
-        test_payload_data = "data123data321"
-        test_reply_data = "reply10001011"
-
-        # Send data
-        channel = self.tested_channel
-        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
-        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
-                                                                             [test_queue_name, dummy_queue_name],
-                                                                             timeout=1)
-        assert not channel.check_for_reply(result_message_id)
-        assert result_message_id == message_id
-        assert result_queue_name == test_queue_name
-        assert result_data == test_payload_data
-        assert flags == 0
-
-        # Test replying to the received data
-        channel.reply(result_message_id, test_reply_data, False, 1)
-        assert channel.check_for_reply(result_message_id)
-        is_success, reply_data, reply_receiver_id = channel.wait_for_reply(result_message_id, 1)
-        assert is_success
-        assert reply_data == test_reply_data
-        assert reply_receiver_id == imaginary_receiver_id
-        assert not channel.check_for_reply(result_message_id)
-
-    def test_wormhole_async_send_and_reply_str(self):
-        imaginary_receiver_id = "receiver1"
-        test_queue_name = "my_queue"
-        dummy_queue_name = "i am another queue"
-        test_payload_data = "data123data321"
-        test_reply_data = "reply10001011"
-
-        # Send data
-        channel = self.tested_channel
-        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
-        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
-                                                                             [test_queue_name, dummy_queue_name],
-                                                                             timeout=1)
-        assert result_message_id == message_id
-        assert result_queue_name == test_queue_name
-        assert result_data == test_payload_data
-        assert flags == 0
-
-        # Test replying to the received data using the async object
-        channel.reply(result_message_id, test_reply_data, False, 1)
-        is_success, data, receiver_id = self.tested_channel.wait_for_reply(message_id, 2)
-        assert is_success
-        assert data == test_reply_data
-
-    def test_wormhole_send_instances_of_objects(self):
-        imaginary_receiver_id = "receiver1"
-        test_queue_name = "my_queue"
-        dummy_queue_name = "i am another queue"
-        test_payload_data = Vector3(1, 5, 8)
-        test_reply_data = Vector3(1, 0, 1)
-
-        # Send data
-        channel = self.tested_channel
-        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10, 1)
-        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
-                                                                             [test_queue_name, dummy_queue_name],
-                                                                             timeout=1)
-        assert result_message_id == message_id
-        assert result_queue_name == test_queue_name
-        assert result_data == test_payload_data
-        assert flags == 1
-        assert isinstance(result_data, Vector3)
-        assert result_data.magnitude == test_payload_data.magnitude
-
-        # Test replying to the received data using the async object
-        channel.reply(result_message_id, test_reply_data, False, 1)
-        # Test replying to the received data using the async object
-        channel.reply(result_message_id, test_reply_data, False, 1)
-        is_success, data, receiver_id = self.tested_channel.wait_for_reply(message_id, 2)
-        assert is_success
-        assert data == test_reply_data
-        assert isinstance(data, Vector3)
-        assert data.magnitude == test_reply_data.magnitude
-
-    def test_stats(self):
-        imaginary_receiver_id = "receiver1"
-        test_queue_name = "my_queue"
-        dummy_queue_name = "i am another queue"
-        test_payload_data = Vector3(1, 5, 8)
-        test_reply_data = Vector3(1, 0, 1)
-
-        channel = self.tested_channel
-        # Send data
-        for _ in range(0, 3000):
-            message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10, flags=1)
-            result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
-                                                                                 [test_queue_name, dummy_queue_name],
-                                                                                 timeout=10)
-            assert result_message_id == message_id
-            assert result_queue_name == test_queue_name
-            assert result_data == test_payload_data
-            assert flags == 1
-            assert isinstance(result_data, Vector3)
-            assert result_data.magnitude == test_payload_data.magnitude
-        stats = channel.get_stats()
-        assert stats.sends_per_second > 60
-        assert stats.processing_per_second > 60
-
-    def test_disable_stats(self):
-        imaginary_receiver_id = "receiver1"
-        test_queue_name = "my_queue"
-        dummy_queue_name = "i am another queue"
-        test_payload_data = Vector3(1, 5, 8)
-        test_reply_data = Vector3(1, 0, 1)
-
-        channel = self.tested_channel
-        channel.stats_enabled = False
-        # Send data
-        for _ in range(0, 3000):
-            message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
-            result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
-                                                                                 [test_queue_name, dummy_queue_name],
-                                                                                 timeout=10)
-            assert result_message_id == message_id
-            assert result_queue_name == test_queue_name
-            assert result_data == test_payload_data
-            assert flags == 0
-            assert isinstance(result_data, Vector3)
-            assert result_data.magnitude == test_payload_data.magnitude
-        stats = channel.get_stats()
-        assert stats.sends_per_second == -1
-        assert stats.processing_per_second == -1
+﻿import time
+import types
+import threading
+import unittest.mock
+import redis
+
+from tests.test_objects import Vector3
+from wormhole.channel import WormholeRedisChannel
+from wormhole.error import WormholeWaitForReplyError, WormholeChannelPopError
+
+from typing import *
+
+
+class TestRedisChannel:
+    TEST_REDIS_URL = "redis://localhost:6379/1"
+    redis_client: Optional[redis.Redis]
+    tested_channel: Optional[WormholeRedisChannel]
+
+    def setup_method(self):
+        self.redis_client = redis.from_url(self.TEST_REDIS_URL)
+        self.redis_client.flushdb()
+        self.tested_channel = WormholeRedisChannel(self.TEST_REDIS_URL)
+
+    def teardown_method(self):
+        self.redis_client.flushdb()
+        self.redis_client = None
+        self.tested_channel = None
+
+    def test_locks(self):
+        lock1_name = "lock1"
+        secret = self.tested_channel.lock(lock1_name)
+        assert secret
+        assert self.tested_channel.is_locked(lock1_name)
+        assert not self.tested_channel.lock(lock1_name, block=False)
+        assert not self.tested_channel.lock(lock1_name, block_timeout=1)
+        assert self.tested_channel.release(lock1_name, secret)
+        assert not self.tested_channel.is_locked(lock1_name)
+        # test lock timeout
+        secret = self.tested_channel.lock(lock1_name, lock_timeout=1)
+        assert secret
+        assert self.tested_channel.is_locked(lock1_name)
+        time.sleep(1.1)
+        assert not self.tested_channel.is_locked(lock1_name)
+        assert not self.tested_channel.release(lock1_name, secret)
+        # Test release with forces
+        assert self.tested_channel.lock(lock1_name)
+        assert self.tested_channel.is_locked(lock1_name)
+        assert self.tested_channel.release(lock1_name, "invalid_secret", force=True)
+        assert not self.tested_channel.is_locked(lock1_name)
+
+    def test_lock_fencing_and_handoff(self):
+        lock_name = "lock1"
+        first_secret = self.tested_channel.lock(lock_name, lock_timeout=5)
+        assert 0 < self.redis_client.pttl(f"{WormholeRedisChannel.LOCK_PREFIX}{lock_name}") <= 5000
+        try:
+            self.tested_channel.release(lock_name, "invalid_secret")
+            assert False, "Released a lock with the wrong secret"
+        except KeyError:
+            pass
+        assert self.tested_channel.is_locked(lock_name)
+        # A blocked locker takes the lock as soon as it is released
+        threading.Timer(0.2, lambda: self.tested_channel.release(lock_name, first_secret)).start()
+        start_time = time.time()
+        second_secret = self.tested_channel.lock(lock_name, block_timeout=3)
+        assert second_secret is not None
+        assert time.time() - start_time < 1
+        assert second_secret.fencing_token > first_secret.fencing_token
+        # A blocked locker takes an expired lock without waiting for the block timeout
+        assert self.tested_channel.release(lock_name, second_secret)
+        self.tested_channel.lock(lock_name, lock_timeout=0.3)
+        start_time = time.time()
+        assert self.tested_channel.lock(lock_name, block_timeout=3) is not None
+        assert time.time() - start_time < 1
+
+    def test_lock_block_timeout_expires_mid_wait(self):
+        lock_name = "lock1"
+        assert self.tested_channel.lock(lock_name)
+        start_time = time.time()
+        assert self.tested_channel.lock(lock_name, block_timeout=0.2) is None
+        assert 0.2 <= time.time() - start_time < 1
+        # Less than a millisecond left is a timeout, not a wait without a timeout
+        clock_times = [1000.0]
+        fake_time = types.SimpleNamespace(time=lambda: clock_times.pop(0) if clock_times else 1000.0996)
+        result = []
+
+        def lock_with_timeout():
+            result.append(self.tested_channel.lock(lock_name, block_timeout=0.1))
+
+        with unittest.mock.patch("wormhole.channel.time", fake_time):
+            locker = threading.Thread(target=lock_with_timeout, daemon=True)
+            locker.start()
+            locker.join(2)
+        assert not locker.is_alive()
+        assert result == [None]
+
+    def test_requeue(self):
+        for channel in (self.tested_channel, WormholeRedisChannel(self.TEST_REDIS_URL, inline_messages=True)):
+            first_id = channel.send("sender1", "queue1", Vector3(1, 2, 3))
+            second_id = channel.send("sender1", "queue1", Vector3(4, 5, 6))
+            popped = channel.pop_many("receiver1", ["queue1"], 2, timeout=1)
+            assert [r[1] for r in popped] == [first_id, second_id]
+            # Requeued messages are popped again first, in the same order
+            channel.requeue("receiver1", popped)
+            channel.send("sender1", "queue1", Vector3(7, 8, 9))
+            repopped = channel.pop_many("receiver2", ["queue1"], 3, timeout=1)
+            assert [(r[1], r[2]) for r in repopped[:2]] == [(first_id, Vector3(1, 2, 3)), (second_id, Vector3(4, 5, 6))]
+            channel.reply(first_id, "done", False, wh_receiver_id="receiver2")
+            assert channel.wait_for_reply(first_id, 1) == (True, "done", "receiver2")
+
+    def test_rate_limit(self):
+        assert all(self.tested_channel.threshold_lock("limit1", 3, 1) for _ in range(3))
+        result = self.tested_channel.rate_limit("limit1", 3, 1)
+        assert not result.allowed
+        assert 0 < result.retry_after <= 0.34
+        assert 0 < self.redis_client.pttl(f"{WormholeRedisChannel.RATE_LIMIT_PREFIX}limit1") <= 1000
+        time.sleep(result.retry_after + 0.01)
+        assert self.tested_channel.rate_limit("limit1", 3, 1).allowed
+        assert not self.tested_channel.rate_limit("limit1", 3, 1).allowed
+        # Batches are admitted whole, unless partial admission was asked for
+        assert self.tested_channel.rate_limit("limit2", 10, 1, count=6).admitted_count == 6
+        assert self.tested_channel.rate_limit("limit2", 10, 1, count=6).admitted_count == 0
+        assert self.tested_channel.rate_limit("limit2", 10, 1, count=6, partial=True).admitted_count == 4
+
+    def test_pool_stats(self):
+        channel = WormholeRedisChannel(self.TEST_REDIS_URL, max_connections=1, max_blocking_connections=1)
+        try:
+            # A receiver blocked on an empty queue does not keep senders waiting for a connection
+            receiver_thread = threading.Thread(target=channel.pop_next, args=("receiver1", ["empty_queue"], 1))
+            receiver_thread.start()
+            time.sleep(0.1)
+            start_time = time.time()
+            channel.send("sender1", "my_queue", "hello")
+            assert time.time() - start_time < 0.5
+            pool_stats = channel.get_pool_stats()
+            assert pool_stats["blocking"].in_use == 1
+            assert pool_stats["blocking"].max_connections == 1
+            assert pool_stats["commands"].in_use == 0
+            assert pool_stats["commands"].checkouts >= 1
+            assert pool_stats["commands"].max_wait_time < 0.5
+            assert 0 <= pool_stats["commands"].average_wait_time <= pool_stats["commands"].max_wait_time
+            receiver_thread.join()
+        finally:
+            channel.close()
+
+    def test_core_send_and_reply_str(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = "data123data321"
+        test_reply_data = "reply10001011"
+
+        # Send data
+        channel = self.tested_channel
+        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name, dummy_queue_name],
+                                                                             timeout=1)
+        assert not channel.check_for_reply(result_message_id)
+        assert result_message_id == message_id
+        assert result_queue_name == test_queue_name
+        assert result_data == test_payload_data
+        assert flags == 0
+
+        # Test replying to the received data
+        channel.reply(result_message_id, test_reply_data, False, 1)
+        assert channel.check_for_reply(result_message_id)
+        is_success, reply_data, reply_receiver_id = channel.wait_for_reply(result_message_id, 1)
+        assert is_success
+        assert reply_data == test_reply_data
+        assert reply_receiver_id == imaginary_receiver_id
+        assert not channel.check_for_reply(result_message_id)
+
+    def test_wormhole_async_send_and_reply_str(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = "data123data321"
+        test_reply_data = "reply10001011"
+
+        # Send data
+        channel = self.tested_channel
+        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name, dummy_queue_name],
+                                                                             timeout=1)
+        assert result_message_id == message_id
+        assert result_queue_name == test_queue_name
+        assert result_data == test_payload_data
+        assert flags == 0
+
+        # Test replying to the received data using the async object
+        channel.reply(result_message_id, test_reply_data, False, 1)
+        is_success, data, receiver_id = self.tested_channel.wait_for_reply(message_id, 2)
+        assert is_success
+        assert data == test_reply_data
+
+    def test_wormhole_send_instances_of_objects(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        # Send data
+        channel = self.tested_channel
+        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10, 1)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name, dummy_queue_name],
+                                                                             timeout=1)
+        assert result_message_id == message_id
+        assert result_queue_name == test_queue_name
+        assert result_data == test_payload_data
+        assert flags == 1
+        assert isinstance(result_data, Vector3)
+        assert result_data.magnitude == test_payload_data.magnitude
+
+        # Test replying to the received data using the async object
+        channel.reply(result_message_id, test_reply_data, False, 1)
+        # Test replying to the received data using the async object
+        channel.reply(result_message_id, test_reply_data, False, 1)
+        is_success, data, receiver_id = self.tested_channel.wait_for_reply(message_id, 2)
+        assert is_success
+        assert data == test_reply_data
+        assert isinstance(data, Vector3)
+        assert data.magnitude == test_reply_data.magnitude
+
+    def test_groups(self):
+        channel = self.tested_channel
+        channel.touch_for_groups(["group1", "group2"], "receiver1", timeout=10)
+        channel.touch_for_groups(["group1"], "receiver2", timeout=1)
+        assert self.redis_client.type("whgm://group1") == b"zset"
+        assert set(channel.find_group_members("group1")) == {"receiver1", "receiver2"}
+        assert channel.find_group_members("group2") == ["receiver1"]
+        # A shorter timeout of another member does not shorten the life of the group
+        assert self.redis_client.ttl("whgm://group1") > 5
+        time.sleep(1.1)
+        assert channel.find_group_members("group1") == ["receiver1"]
+        assert self.redis_client.zcard("whgm://group1") == 1
+        channel.remove_from_groups(["group1", "group2"], "receiver1")
+        assert channel.find_group_members("group1") == []
+        assert channel.find_group_members("group2") == []
+
+    def test_group_cache(self):
+        channel = self.tested_channel
+        cached_channel = WormholeRedisChannel(self.TEST_REDIS_URL, group_cache_ttl=10)
+        assert channel.get_group_cache_stats() is None
+        channel.touch_for_groups(["group1"], "receiver1", timeout=10)
+
+        def wait_for_members(expected_members):
+            deadline = time.time() + 2
+            while set(cached_channel.find_group_members("group1")) != expected_members:
+                assert time.time() < deadline
+                time.sleep(0.01)
+
+        # Members are cached once the cache listens to changes
+        while cached_channel.get_group_cache_stats().hits == 0:
+            wait_for_members({"receiver1"})
+        # Joins and leaves of other channels drop the cached members
+        channel.touch_for_groups(["group1"], "receiver2", timeout=10)
+        wait_for_members({"receiver1", "receiver2"})
+        channel.remove_from_groups(["group1"], "receiver1")
+        wait_for_members({"receiver2"})
+        # Refreshing a member is not a change, changes of the channel itself are seen at once
+        invalidations = cached_channel.get_group_cache_stats().invalidations
+        cached_channel.touch_for_groups(["group1"], "receiver2", timeout=10)
+        time.sleep(0.1)
+        assert cached_channel.get_group_cache_stats().invalidations == invalidations
+        cached_channel.remove_from_groups(["group1"], "receiver2")
+        assert cached_channel.find_group_members("group1") == []
+        stats = cached_channel.get_group_cache_stats()
+        assert stats.hits > 0 and stats.misses > 0
+        cached_channel.close()
+
+    def test_stats(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        channel = self.tested_channel
+        # Send data
+        for _ in range(0, 3000):
+            message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10, flags=1)
+            result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                                 [test_queue_name, dummy_queue_name],
+                                                                                 timeout=10)
+            assert result_message_id == message_id
+            assert result_queue_name == test_queue_name
+            assert result_data == test_payload_data
+            assert flags == 1
+            assert isinstance(result_data, Vector3)
+            assert result_data.magnitude == test_payload_data.magnitude
+        stats = channel.get_stats()
+        assert stats.sends_per_second > 60
+        assert stats.processing_per_second > 60
+        # Stats are kept in process
+        assert self.redis_client.keys("whstats://*") == []
+
+    def test_stats_flush(self):
+        channel = WormholeRedisChannel(self.TEST_REDIS_URL, stats_flush_interval=0.2)
+        channel.send_many("sender1", "my_queue", list(range(10)))
+        channel.pop_many("receiver1", ["my_queue"], 10, timeout=1)
+        time.sleep(0.5)
+        sender_stats = self.redis_client.hgetall("whstats://sender1")
+        assert int(sender_stats[b"sends"]) == 10
+        assert float(sender_stats[b"sends_per_second"]) > 0
+        receiver_stats = self.redis_client.hgetall("whstats://receiver1")
+        assert int(receiver_stats[b"processed"]) == 10
+        assert float(receiver_stats[b"processing_per_second"]) > 0
+        assert 0 < self.redis_client.ttl("whstats://receiver1") <= 1
+        channel.close()
+
+    def test_disable_stats(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        channel = self.tested_channel
+        channel.stats_enabled = False
+        # Send data
+        for _ in range(0, 3000):
+            message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
+            result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                                 [test_queue_name, dummy_queue_name],
+                                                                                 timeout=10)
+            assert result_message_id == message_id
+            assert result_queue_name == test_queue_name
+            assert result_data == test_payload_data
+            assert flags == 0
+            assert isinstance(result_data, Vector3)
+            assert result_data.magnitude == test_payload_data.magnitude
+        stats = channel.get_stats()
+        assert stats.sends_per_second == -1
+        assert stats.processing_per_second == -1
+
+    def test_scripted_send_reloads_flushed_script(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        test_payload_data = Vector3(1, 5, 8)
+
+        channel = self.tested_channel
+        assert channel.scripted_send
+        for _ in range(0, 3):
+            # Make the server forget the send script, the channel should load it again on NOSCRIPT
+            self.redis_client.script_flush()
+            message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10, flags=1)
+            assert self.redis_client.ttl(message_id) > 0
+            result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                                 [test_queue_name], timeout=1)
+            assert result_message_id == message_id
+            assert result_queue_name == test_queue_name
+            assert result_data == test_payload_data
+            assert flags == 1
+
+    def test_unscripted_send(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        test_payload_data = "data123data321"
+        test_reply_data = "reply10001011"
+
+        channel = WormholeRedisChannel(self.TEST_REDIS_URL, scripted_send=False)
+        message_id = channel.send(imaginary_receiver_id, test_queue_name, test_payload_data, 10)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name], timeout=1)
+        assert result_message_id == message_id
+        assert result_data == test_payload_data
+        channel.reply(result_message_id, test_reply_data, False, 1)
+        is_success, reply_data, reply_receiver_id = channel.wait_for_reply(message_id, 1)
+        assert is_success
+        assert reply_data == test_reply_data
+        assert reply_receiver_id == imaginary_receiver_id
+        channel.close()
+
+    def test_send_many(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        for scripted_send in (True, False):
+            channel = WormholeRedisChannel(self.TEST_REDIS_URL, scripted_send=scripted_send)
+            channel.SEND_MANY_CHUNK_SIZE = 7
+            payloads = [Vector3(i, i * 2, i * 3) for i in range(20)]
+            message_ids = channel.send_many(imaginary_receiver_id, test_queue_name, payloads, 10, flags=1)
+            assert len(message_ids) == len(payloads)
+            assert len(set(message_ids)) == len(payloads)
+            # Messages are popped in the order they were sent
+            for message_id, payload in zip(message_ids, payloads):
+                result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                                     [test_queue_name], timeout=1)
+                assert result_message_id == message_id
+                assert result_data == payload
+                assert flags == 1
+            assert channel.send_many(imaginary_receiver_id, test_queue_name, []) == []
+            channel.close()
+
+    def test_pop_many(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        other_queue_name = "my_other_queue"
+        channel = self.tested_channel
+        assert channel.pop_many(imaginary_receiver_id, [test_queue_name], 10, timeout=1) == []
+        payloads = [Vector3(i, i * 2, i * 3) for i in range(10)]
+        message_ids = channel.send_many(imaginary_receiver_id, test_queue_name, payloads, 10)
+        other_message_id = channel.send(imaginary_receiver_id, other_queue_name, "other", 10)
+        # Expired messages are skipped
+        self.redis_client.delete(message_ids[1])
+        results = channel.pop_many(imaginary_receiver_id, [test_queue_name], 4, timeout=1)
+        assert [r[1] for r in results] == [message_ids[0], message_ids[2], message_ids[3]]
+        assert [r[2] for r in results] == [payloads[0], payloads[2], payloads[3]]
+        results = channel.pop_many(imaginary_receiver_id, [test_queue_name, other_queue_name], 100, timeout=1)
+        assert sorted([r[1] for r in results]) == sorted(message_ids[4:] + [other_message_id])
+        for result_queue_name, result_message_id, result_data, flags in results:
+            assert self.redis_client.hget(result_message_id, "hid") == imaginary_receiver_id.encode()
+            if result_message_id == other_message_id:
+                assert result_queue_name == other_queue_name
+                assert result_data == "other"
+            else:
+                assert result_queue_name == test_queue_name
+                assert result_data == payloads[message_ids.index(result_message_id)]
+        assert channel.pop_many(imaginary_receiver_id, [test_queue_name, other_queue_name], 10, timeout=1) == []
+
+    def test_inline_messages(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        for scripted_send in (True, False):
+            sender_channel = WormholeRedisChannel(self.TEST_REDIS_URL, scripted_send=scripted_send,
+                                                  inline_messages=True)
+            # The receiving channel does not need to be configured for inline messages
+            channel = self.tested_channel
+            message_id = sender_channel.send("sender1", test_queue_name, test_payload_data, 10, flags=1)
+            # No message hash is created for inline messages
+            assert self.redis_client.keys("wh:*") == []
+            result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                                 [test_queue_name], timeout=1)
+            assert result_message_id == message_id
+            assert result_queue_name == test_queue_name
+            assert result_data == test_payload_data
+            assert flags == 1
+            assert not sender_channel.check_for_reply(message_id)
+            channel.reply(result_message_id, test_reply_data, False, 1, wh_receiver_id=imaginary_receiver_id)
+            assert sender_channel.check_for_reply(message_id)
+            is_success, reply_data, reply_receiver_id = sender_channel.wait_for_reply(message_id, 1)
+            assert is_success
+            assert reply_data == test_reply_data
+            assert reply_receiver_id == imaginary_receiver_id
+            assert not sender_channel.check_for_reply(message_id)
+
+            # Errors and empty replies
+            message_id = sender_channel.send("sender1", test_queue_name, test_payload_data, 10)
+            result_message_id = channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)[1]
+            channel.reply(result_message_id, ValueError("oops"), True, wh_receiver_id=imaginary_receiver_id)
+            is_success, reply_data, reply_receiver_id = sender_channel.wait_for_reply(message_id, 1)
+            assert not is_success
+            assert isinstance(reply_data, ValueError)
+            message_id = sender_channel.send("sender1", test_queue_name, test_payload_data, 10)
+            result_message_id = channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)[1]
+            channel.reply(result_message_id, None, False, wh_receiver_id=imaginary_receiver_id)
+            assert sender_channel.wait_for_reply(message_id, 1) == (True, None, imaginary_receiver_id)
+
+            # Timeouts
+            is_success, reply_data, reply_receiver_id = sender_channel.wait_for_reply(message_id, 1)
+            assert not is_success
+            assert reply_receiver_id == ""
+            sender_channel.close()
+
+    def test_reply_in_signal(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        channel = self.tested_channel
+        message_id = channel.send("sender1", test_queue_name, Vector3(1, 2, 3))
+        channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)
+        channel.reply(message_id, Vector3(3, 2, 1), False, wh_receiver_id=imaginary_receiver_id)
+        # The reply is in the signal, the message hash is cleaned up by the receiver
+        assert self.redis_client.exists(message_id) == 0
+        assert channel.wait_for_reply(message_id, 1) == (True, Vector3(3, 2, 1), imaginary_receiver_id)
+        assert self.redis_client.keys("response:*") == []
+
+        # Plain signals with the reply in the message hash are still understood
+        for signal, reply_hkey in (("handled", channel.MESSAGE_RESPONSE_HKEY), ("error", channel.MESSAGE_ERROR_HKEY)):
+            message_id = channel.send("sender1", test_queue_name, Vector3(1, 2, 3))
+            channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)
+            self.redis_client.hset(message_id, reply_hkey, channel.encoder.encode(Vector3(3, 2, 1)))
+            self.redis_client.lpush("response:" + message_id, signal)
+            is_success, reply_data, reply_receiver_id = channel.wait_for_reply(message_id, 1)
+            assert is_success == (signal == "handled")
+            assert reply_data == Vector3(3, 2, 1)
+            assert reply_receiver_id == imaginary_receiver_id
+            assert self.redis_client.exists(message_id) == 0
+
+    def test_reply_to_older_sender(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        channel = self.tested_channel
+        # Messages of new senders are flagged, the flag is not handed to the receiver
+        message_id = channel.send("sender1", test_queue_name, Vector3(1, 2, 3), flags=1)
+        assert int(self.redis_client.hget(message_id, channel.MESSAGE_FLAGS_KEY)) & channel.MESSAGE_FLAG_INLINE_REPLY
+        assert channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)[3] == 1
+        channel.delete(message_id)
+        # An older sender does not flag its message and reads its reply from the message hash after a plain signal
+        for is_error, signal, reply_hkey in ((False, b"handled", channel.MESSAGE_RESPONSE_HKEY),
+                                             (True, b"error", channel.MESSAGE_ERROR_HKEY)):
+            message_id = "wh:oldsender"
+            self.redis_client.hset(message_id, mapping={channel.MESSAGE_DATA_HKEY: channel.encoder.encode(Vector3(1, 2, 3)),
+                                                        channel.MESSAGE_FLAGS_KEY: "0"})
+            self.redis_client.lpush(test_queue_name, message_id)
+            _, popped_message_id, _, flags = channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)
+            assert (popped_message_id, flags) == (message_id, 0)
+            channel.reply(message_id, Vector3(3, 2, 1), is_error, wh_receiver_id=imaginary_receiver_id)
+            assert self.redis_client.brpop("response:" + message_id, 1)[1] == signal
+            assert channel.encoder.decode(self.redis_client.hget(message_id, reply_hkey)) == Vector3(3, 2, 1)
+            assert self.redis_client.ttl(message_id) > 0
+            self.redis_client.delete(message_id)
+
+    def test_reply_inbox(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        sender_channel = WormholeRedisChannel(self.TEST_REDIS_URL, reply_inbox=True)
+        channel = self.tested_channel
+        message_ids = sender_channel.send_many("sender1", test_queue_name, [Vector3(i, 0, 0) for i in range(50)])
+        results = channel.pop_many(imaginary_receiver_id, [test_queue_name], 100, timeout=1)
+        assert [r[1] for r in results] == message_ids
+        # Reply out of order, every reply goes to the single inbox of the sender
+        for _, result_message_id, result_data, _ in reversed(results):
+            channel.reply(result_message_id, result_data.x, result_data.x == 7, wh_receiver_id=imaginary_receiver_id)
+        assert self.redis_client.keys("*") == [b"whinbox://sender1"]
+        assert sender_channel.check_for_reply(message_ids[3])
+        for i, message_id in enumerate(message_ids):
+            is_success, reply_data, reply_receiver_id = sender_channel.wait_for_reply(message_id, 1)
+            assert is_success == (i != 7)
+            assert reply_data == i
+            assert reply_receiver_id == imaginary_receiver_id
+        assert self.redis_client.keys("whinbox://*") == []
+        # Timeouts
+        message_id = sender_channel.send("sender1", test_queue_name, Vector3(1, 2, 3))
+        is_success, error, reply_receiver_id = sender_channel.wait_for_reply(message_id, 1)
+        assert not is_success
+        assert isinstance(error, WormholeWaitForReplyError)
+        sender_channel.close()
+
+    def test_inline_messages_mixed_batch(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        inline_channel = WormholeRedisChannel(self.TEST_REDIS_URL, inline_messages=True)
+        channel = self.tested_channel
+        message_ids = [
+            channel.send("sender1", test_queue_name, "hash1", 10),
+            inline_channel.send("sender1", test_queue_name, "inline1", 10),
+            inline_channel.send("sender1", test_queue_name, "stale", 0),
+            channel.send("sender1", test_queue_name, "hash2", 10),
+        ]
+        time.sleep(2.1)
+        results = channel.pop_many(imaginary_receiver_id, [test_queue_name], 10, timeout=1)
+        # The stale inline message was dropped by the receiver
+        assert [r[1] for r in results] == [message_ids[0], message_ids[1], message_ids[3]]
+        assert [r[2] for r in results] == ["hash1", "inline1", "hash2"]
+        inline_channel.close()
+
+    def test_dedup(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        sender_channel = WormholeRedisChannel(self.TEST_REDIS_URL, dedup_threshold=1024)
+        inline_channel = WormholeRedisChannel(self.TEST_REDIS_URL, dedup_threshold=1024, inline_messages=True)
+        receiver_channel = WormholeRedisChannel(self.TEST_REDIS_URL, dedup_cache_size=1)
+        payload = [Vector3(i, i, i) for i in range(500)]
+        message_ids = sender_channel.send_many("sender1", test_queue_name, [payload, payload, "small"], 10)
+        message_ids.append(sender_channel.send("sender1", test_queue_name, payload, 10))
+        message_ids.append(inline_channel.send("sender1", test_queue_name, payload, 10))
+        # The payload is stored once, small payloads are not deduplicated
+        content_keys = self.redis_client.keys("whc://*")
+        assert len(content_keys) == 1
+        assert 10000 < self.redis_client.pttl(content_keys[0]) <= 12000
+        assert self.redis_client.hget(message_ids[0], "in").startswith(b"&")
+        assert len(self.redis_client.hget(message_ids[0], "in")) < 64
+        results = receiver_channel.pop_many(imaginary_receiver_id, [test_queue_name], 10, timeout=1)
+        assert [r[1] for r in results] == message_ids
+        assert [r[2] for r in results] == [payload, payload, "small", payload, payload]
+        # Every message gets its own payload, a handler modifying its payload does not change later messages
+        assert results[0][2] is not results[1][2]
+        results[0][2].append("modified")
+        sender_channel.send("sender1", test_queue_name, payload, 10)
+        assert receiver_channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)[2] == payload
+        # Cached content is decoded without fetching it, messages referencing expired content fail to decode
+        sender_channel.send("sender1", test_queue_name, payload, 10)
+        self.redis_client.delete(content_keys[0])
+        assert receiver_channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=1)[2] == payload
+        sender_channel.send("sender1", test_queue_name, list(reversed(payload)), 10)
+        sender_channel.send("sender1", test_queue_name, payload, 10)
+        self.redis_client.delete(*self.redis_client.keys("whc://*"))
+        error, result = receiver_channel.pop_many(imaginary_receiver_id, [test_queue_name], 10, timeout=1)
+        assert isinstance(error, WormholeChannelPopError)
+        assert result[2] == payload
+        for channel in (sender_channel, inline_channel, receiver_channel):
+            channel.close()
@@ -0,0 +1,97 @@
+﻿import os
+import time
+import pytest
+import redis
+
+from redis.cluster import RedisCluster
+from redis.crc import key_slot
+
+from wormhole.channel_implementations.channel_cluster import WormholeRedisClusterChannel, get_hash_tag
+
+from typing import *
+
+
+class TestRedisClusterChannel:
+    # A local cluster, e.g. three redis-server --cluster-enabled yes instances joined with redis-cli --cluster create
+    TEST_CLUSTER_URL = os.environ.get("WORMHOLE_TEST_CLUSTER_URL", "redis://localhost:7000")
+    cluster_client: Optional[RedisCluster]
+    tested_channel: Optional[WormholeRedisClusterChannel]
+
+    def setup_method(self):
+        try:
+            self.cluster_client = RedisCluster.from_url(self.TEST_CLUSTER_URL)
+        except (redis.exceptions.RedisClusterException, redis.exceptions.ConnectionError):
+            pytest.skip(f"No redis cluster at {self.TEST_CLUSTER_URL}")
+        self.cluster_client.flushdb(target_nodes=RedisCluster.PRIMARIES)
+        self.tested_channel = WormholeRedisClusterChannel(self.TEST_CLUSTER_URL)
+
+    def teardown_method(self):
+        self.tested_channel.close()
+        self.cluster_client.flushdb(target_nodes=RedisCluster.PRIMARIES)
+        self.cluster_client.close()
+        self.cluster_client = None
+        self.tested_channel = None
+
+    def __find_queue_names_in_different_slots(self, count: int) -> List[str]:
+        queue_names_by_node = {}
+        for i in range(100):
+            queue_name = f"wh://queue{i}"
+            node = self.cluster_client.get_node_from_key(queue_name)
+            queue_names_by_node.setdefault(node.name, queue_name)
+        assert len(queue_names_by_node) >= count, "The test cluster needs more nodes"
+        return list(queue_names_by_node.values())[:count]
+
+    def test_hash_tag(self):
+        assert get_hash_tag("wh://queue") == "wh://queue"
+        assert get_hash_tag("wh://{user1}.queue") == "user1"
+        assert get_hash_tag("wh://{}queue") == "wh://{}queue"
+        message_id = self.tested_channel._generate_message_id("wh://{user1}.queue")
+        assert key_slot(message_id.encode()) == key_slot(b"wh://{user1}.queue")
+
+    def test_send_and_reply(self):
+        for channel in (self.tested_channel,
+                        WormholeRedisClusterChannel(self.TEST_CLUSTER_URL, inline_messages=True),
+                        WormholeRedisClusterChannel(self.TEST_CLUSTER_URL, reply_inbox=True)):
+            try:
+                queue_names = self.__find_queue_names_in_different_slots(3)
+                message_ids = [channel.send("sender1", queue_name, f"hello {i}")
+                               for i, queue_name in enumerate(queue_names)]
+                received = {}
+                for _ in queue_names:
+                    queue_name, message_id, data, _ = channel.pop_next("receiver1", list(queue_names), 2)
+                    received[queue_name] = data
+                    channel.reply(message_id, data.upper(), False, wh_receiver_id="receiver1")
+                assert received == {queue_name: f"hello {i}" for i, queue_name in enumerate(queue_names)}
+                for i, message_id in enumerate(message_ids):
+                    assert channel.wait_for_reply(message_id, 2) == (True, f"HELLO {i}", "receiver1")
+                start_time = time.time()
+                assert channel.pop_next("receiver1", list(queue_names), 1) is None
+                assert time.time() - start_time < 1.5
+            finally:
+                channel.close()
+
+    def test_pop_many_of_one_slot(self):
+        queue_names = ["wh://{user1}.inbox", "wh://{user1}.tasks"]
+        self.tested_channel.send_many("sender1", queue_names[0], ["a", "b"])
+        self.tested_channel.send_many("sender1", queue_names[1], ["c"])
+        results = self.tested_channel.pop_many("receiver1", list(queue_names), 10, 1)
+        assert sorted(r[2] for r in results) == ["a", "b", "c"]
+
+    def test_groups_and_locks(self):
+        channel = self.tested_channel
+        channel.touch_for_groups(["group1", "group2", "group3"], "receiver1")
+        assert channel.find_group_members("group2") == ["receiver1"]
+        channel.remove_from_groups(["group1", "group2", "group3"], "receiver1")
+        assert channel.find_group_members("group2") == []
+        lock_secret = channel.lock("lock1", lock_timeout=5)
+        assert channel.is_locked("lock1")
+        assert channel.lock("lock1", block_timeout=0.2) is None
+        assert channel.release("lock1", lock_secret)
+        assert channel.lock("lock1").fencing_token > lock_secret.fencing_token
+        assert channel.rate_limit("limit1", 1, 1).allowed
+        assert not channel.rate_limit("limit1", 1, 1).allowed
+
+    def test_pool_stats(self):
+        self.tested_channel.send("sender1", "wh://queue", "hello")
+        pool_stats = self.tested_channel.get_pool_stats()
+        assert sum(s.checkouts for name, s in pool_stats.items() if name.startswith("commands:")) >= 1
@@ -0,0 +1,165 @@
+﻿import os
+import time
+import socket
+import threading
+import tempfile
+
+from tests.test_objects import Vector3
+from wormhole.channel_implementations.channel_ipc import WormholeIpcChannel, WormholeIpcBroker, \
+    DEFAULT_SOCKET_PATH
+from wormhole.error import WormholeChannelClosedError, WormholeChannelConnectionError
+from wormhole.setup import create_channel
+
+from typing import *
+
+
+class TestIpcChannel:
+    broker: Optional[WormholeIpcBroker]
+    tested_channel: Optional[WormholeIpcChannel]
+
+    def setup_method(self):
+        self.broker = WormholeIpcBroker(os.path.join(tempfile.mkdtemp(), "wormhole.sock"))
+        self.broker.start()
+        self.tested_channel = WormholeIpcChannel(self.broker.socket_path, shared_memory_threshold=1024)
+
+    def teardown_method(self):
+        self.tested_channel.close()
+        self.broker.stop()
+        self.broker = None
+        self.tested_channel = None
+
+    def test_core_send_and_reply(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        channel = self.tested_channel
+        message_id = channel.send("sender1", test_queue_name, test_payload_data, 10, flags=1)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name], timeout=1)
+        assert result_message_id == message_id
+        assert result_queue_name == test_queue_name
+        assert result_data == test_payload_data
+        assert flags == 1
+        assert not channel.check_for_reply(message_id)
+        channel.reply(result_message_id, test_reply_data, False, wh_receiver_id=imaginary_receiver_id)
+        assert channel.check_for_reply(message_id)
+        is_success, reply_data, reply_receiver_id = channel.wait_for_reply(message_id, 1)
+        assert is_success
+        assert reply_data == test_reply_data
+        assert reply_receiver_id == imaginary_receiver_id
+        assert channel.pop_next(imaginary_receiver_id, [test_queue_name], timeout=0.1) is None
+        is_success, error, _ = channel.wait_for_reply(channel.send("sender1", test_queue_name, 1), 0.1)
+        assert not is_success
+        assert isinstance(error, Exception)
+
+    def test_shared_memory_payloads(self):
+        channel = self.tested_channel
+        large_payload = os.urandom(100000)
+        message_id = channel.send("sender1", "my_queue", large_payload)
+        _, result_message_id, result_data, _ = channel.pop_next("receiver1", ["my_queue"], timeout=1)
+        assert result_message_id == message_id
+        assert result_data == large_payload
+        channel.reply(message_id, large_payload[::-1], False)
+        assert channel.wait_for_reply(message_id, 1)[1] == large_payload[::-1]
+
+    def test_dropped_shared_memory_payload_is_unlinked(self):
+        def count_segments():
+            return len([n for n in os.listdir("/dev/shm") if n.startswith("psm_")])
+        channel = self.tested_channel
+        segment_count = count_segments()
+        channel.send("sender1", "my_queue", os.urandom(100000), queue_timeout=-2)
+        assert count_segments() == segment_count + 1
+        assert channel.pop_next("receiver1", ["my_queue"], timeout=0.1) is None
+        assert count_segments() == segment_count
+
+    def test_requeue(self):
+        channel = self.tested_channel
+        payload = os.urandom(4096)
+        message_ids = [channel.send("sender1", "queue1", data) for data in (Vector3(1, 2, 3), payload)]
+        popped = channel.pop_many("receiver1", ["queue1"], 2, timeout=1)
+        channel.requeue("receiver1", popped)
+        repopped = channel.pop_many("receiver2", ["queue1"], 2, timeout=1)
+        assert [(r[1], r[2]) for r in repopped] == list(zip(message_ids, [Vector3(1, 2, 3), payload]))
+
+    def test_groups_and_locks(self):
+        channel = self.tested_channel
+        channel.touch_for_groups(["group1"], "receiver1")
+        assert channel.find_group_members("group1") == ["receiver1"]
+        channel.remove_from_groups(["group1"], "receiver1")
+        assert channel.find_group_members("group1") == []
+        lock_secret = channel.lock("my_lock")
+        assert channel.is_locked("my_lock")
+        assert channel.lock("my_lock", block_timeout=0.1) is None
+        assert channel.release("my_lock", lock_secret)
+        assert channel.threshold_lock("my_threshold", 1, 1)
+        assert not channel.threshold_lock("my_threshold", 1, 1)
+
+    def test_lock_blocks_until_release(self):
+        lock_secret = self.tested_channel.lock("my_lock")
+        other_channel = WormholeIpcChannel(self.broker.socket_path)
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(other_channel.lock("my_lock")))
+        waiter.start()
+        time.sleep(0.2)
+        assert not acquired
+        self.tested_channel.release("my_lock", lock_secret)
+        waiter.join(2)
+        other_channel.close()
+        assert acquired[0] is not None
+
+    def test_socket_access(self):
+        socket_path = self.broker.socket_path
+        assert os.stat(socket_path).st_mode & 0o777 == 0o600
+        # A second broker does not take the socket of a running one over
+        try:
+            WormholeIpcBroker(socket_path).start()
+            assert False, "Started a broker on the socket of a running broker"
+        except RuntimeError:
+            pass
+        assert self.tested_channel.send("sender1", "my_queue", "hello")
+        assert self.tested_channel.pop_next("receiver1", ["my_queue"], timeout=1)[2] == "hello"
+        # The socket of a broker that did not stop cleanly is replaced
+        stale_socket_path = os.path.join(os.path.dirname(socket_path), "stale.sock")
+        stale_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        stale_socket.bind(stale_socket_path)
+        stale_socket.close()
+        broker = WormholeIpcBroker(stale_socket_path)
+        broker.start()
+        broker.stop()
+
+    def test_default_socket_directory(self):
+        socket_directory = os.path.dirname(DEFAULT_SOCKET_PATH)
+        assert str(os.getuid()) in socket_directory
+        broker = WormholeIpcBroker()
+        broker.start()
+        try:
+            assert os.stat(socket_directory).st_mode & 0o777 == 0o700
+            assert os.stat(DEFAULT_SOCKET_PATH).st_mode & 0o777 == 0o600
+        finally:
+            broker.stop()
+
+    def test_close(self):
+        channel = self.tested_channel
+        start_time = time.time()
+        self.broker.stop()
+        try:
+            channel.pop_next("receiver1", ["my_queue"], timeout=0)
+            assert False, "Popped from a stopped broker"
+        except WormholeChannelConnectionError:
+            pass
+        assert time.time() - start_time < 1
+        channel.close()
+        try:
+            channel.send("sender1", "my_queue", 1)
+            assert False, "Sent using a closed channel"
+        except WormholeChannelClosedError:
+            pass
+
+    def test_create_channel_from_uri(self):
+        channel = create_channel(f"unix://{self.broker.socket_path}")
+        assert isinstance(channel, WormholeIpcChannel)
+        message_id = channel.send("sender1", "my_queue", 5)
+        assert self.tested_channel.pop_next("receiver1", ["my_queue"], timeout=1)[1] == message_id
+        channel.close()
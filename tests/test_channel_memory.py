@@ -0,0 +1,172 @@
+﻿import time
+import threading
+
+from tests.test_objects import Vector3
+from wormhole.channel_implementations.channel_memory import WormholeMemoryChannel, WormholeMemoryStore
+from wormhole.error import WormholeChannelClosedError
+
+from typing import *
+
+
+class TestMemoryChannel:
+    store: Optional[WormholeMemoryStore]
+    tested_channel: Optional[WormholeMemoryChannel]
+
+    def setup_method(self):
+        self.store = WormholeMemoryStore()
+        self.tested_channel = WormholeMemoryChannel(self.store)
+
+    def teardown_method(self):
+        self.tested_channel.close()
+        self.store = None
+        self.tested_channel = None
+
+    def test_core_send_and_reply(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        channel = self.tested_channel
+        message_id = channel.send("sender1", test_queue_name, test_payload_data, 10, flags=1)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name, dummy_queue_name],
+                                                                             timeout=1)
+        assert result_message_id == message_id
+        assert result_queue_name == test_queue_name
+        assert result_data == test_payload_data
+        assert result_data is not test_payload_data
+        assert flags == 1
+        assert not channel.check_for_reply(message_id)
+        channel.reply(result_message_id, test_reply_data, False, wh_receiver_id=imaginary_receiver_id)
+        assert channel.check_for_reply(message_id)
+        is_success, reply_data, reply_receiver_id = channel.wait_for_reply(message_id, 1)
+        assert is_success
+        assert reply_data == test_reply_data
+        assert reply_receiver_id == imaginary_receiver_id
+        assert not channel.check_for_reply(message_id)
+        assert channel.pop_next(imaginary_receiver_id, [test_queue_name, dummy_queue_name], timeout=1) is None
+
+    def test_shared_store(self):
+        other_channel = WormholeMemoryChannel(self.store, encode_payloads=False)
+        test_payload_data = Vector3(1, 2, 3)
+        message_id = other_channel.send("sender1", "my_queue", test_payload_data)
+        result = WormholeMemoryChannel(WormholeMemoryStore()).pop_next("receiver1", ["my_queue"], timeout=0.1)
+        assert result is None
+        _, result_message_id, result_data, _ = other_channel.pop_next("receiver1", ["my_queue"], timeout=1)
+        assert result_message_id == message_id
+        assert result_data is test_payload_data
+        other_channel.close()
+        # Closing a channel does not affect the other channels of the store
+        self.tested_channel.send("sender1", "my_queue", test_payload_data)
+        assert self.tested_channel.pop_next("receiver1", ["my_queue"], timeout=1) is not None
+
+    def test_pop_blocks_until_send(self):
+        channel = self.tested_channel
+        threading.Timer(0.2, lambda: channel.send("sender1", "my_queue", 5)).start()
+        start_time = time.time()
+        result = channel.pop_next("receiver1", ["my_queue", "my_other_queue"], timeout=2)
+        assert 0.1 < time.time() - start_time < 1
+        assert result[2] == 5
+        start_time = time.time()
+        assert channel.pop_next("receiver1", ["my_queue"], timeout=0.2) is None
+        assert time.time() - start_time >= 0.2
+
+    def test_pop_many(self):
+        channel = self.tested_channel
+        message_ids = channel.send_many("sender1", "my_queue", [Vector3(i, 0, 0) for i in range(5)])
+        other_message_id = channel.send("sender1", "my_other_queue", Vector3(9, 9, 9))
+        results = channel.pop_many("receiver1", ["my_queue", "my_other_queue"], 10, timeout=1)
+        assert len(results) == 6
+        assert set(r[1] for r in results) == set(message_ids + [other_message_id])
+        assert [r[2].x for r in results if r[0] == "my_queue"] == list(range(5))
+        assert channel.pop_many("receiver1", ["my_queue", "my_other_queue"], 10, timeout=0.1) == []
+
+    def test_requeue(self):
+        channel = self.tested_channel
+        message_ids = [channel.send("sender1", "queue1", Vector3(i, i, i)) for i in range(2)]
+        popped = channel.pop_many("receiver1", ["queue1"], 2, timeout=1)
+        channel.requeue("receiver1", popped)
+        channel.send("sender1", "queue1", Vector3(2, 2, 2))
+        repopped = channel.pop_many("receiver2", ["queue1"], 3, timeout=1)
+        assert [r[1] for r in repopped[:2]] == message_ids
+        assert repopped[1][2] == Vector3(1, 1, 1)
+
+    def test_expired_message(self):
+        channel = self.tested_channel
+        message_id = channel.send("sender1", "my_queue", 1, queue_timeout=-2)
+        assert channel.pop_next("receiver1", ["my_queue"], timeout=0.1) is None
+        is_success, error, _ = channel.wait_for_reply(message_id, 0.1)
+        assert not is_success
+        assert "no handlers found" in str(error)
+        message_id = channel.send("sender1", "my_queue", 1)
+        channel.pop_next("receiver1", ["my_queue"], timeout=1)
+        is_success, error, _ = channel.wait_for_reply(message_id, 0.1)
+        assert not is_success
+        assert "receiver1" in str(error)
+
+    def test_groups(self):
+        channel = self.tested_channel
+        channel.touch_for_groups(["group1", "group2"], "receiver1", timeout=1)
+        channel.touch_for_groups(["group1"], "receiver2", timeout=0.1)
+        assert set(channel.find_group_members("group1")) == {"receiver1", "receiver2"}
+        time.sleep(0.2)
+        assert channel.find_group_members("group1") == ["receiver1"]
+        channel.remove_from_groups(["group1"], "receiver1")
+        assert channel.find_group_members("group1") == []
+        assert channel.find_group_members("group2") == ["receiver1"]
+
+    def test_locks(self):
+        channel = self.tested_channel
+        lock_secret = channel.lock("my_lock")
+        assert channel.is_locked("my_lock")
+        assert channel.lock("my_lock", block=False) is None
+        assert channel.lock("my_lock", block_timeout=0.1) is None
+        threading.Timer(0.2, lambda: channel.release("my_lock", lock_secret)).start()
+        second_lock_secret = channel.lock("my_lock", block_timeout=2)
+        assert second_lock_secret is not None
+        assert second_lock_secret.fencing_token > lock_secret.fencing_token
+        try:
+            channel.release("my_lock", lock_secret)
+            assert False, "Released a lock with the wrong secret"
+        except KeyError:
+            pass
+        assert channel.release("my_lock", second_lock_secret)
+        assert not channel.release("my_lock", second_lock_secret)
+        channel.lock("my_lock", lock_timeout=0.2)
+        assert channel.lock("my_lock", block_timeout=2) is not None
+
+    def test_lock_blocks_until_release(self):
+        channel = self.tested_channel
+        lock_secret = channel.lock("my_lock")
+        acquired = []
+        waiter = threading.Thread(target=lambda: acquired.append(channel.lock("my_lock")))
+        waiter.start()
+        time.sleep(0.2)
+        assert not acquired
+        channel.release("my_lock", lock_secret)
+        waiter.join(2)
+        assert not waiter.is_alive()
+        assert acquired[0] is not None and acquired[0].fencing_token > lock_secret.fencing_token
+
+    def test_threshold_lock(self):
+        channel = self.tested_channel
+        assert all(channel.threshold_lock("my_threshold", 3, 1) for _ in range(3))
+        assert not channel.threshold_lock("my_threshold", 3, 1)
+        time.sleep(0.4)
+        assert channel.threshold_lock("my_threshold", 3, 1)
+        assert not channel.threshold_lock("my_threshold", 3, 1)
+        assert channel.rate_limit("my_limit", 10, 1, count=6).admitted_count == 6
+        assert channel.rate_limit("my_limit", 10, 1, count=6).admitted_count == 0
+        assert channel.rate_limit("my_limit", 10, 1, count=6, partial=True).admitted_count == 4
+
+    def test_close_wakes_up_pop(self):
+        channel = self.tested_channel
+        threading.Timer(0.2, channel.close).start()
+        try:
+            channel.pop_next("receiver1", ["my_queue"], timeout=0)
+            assert False, "Pop did not notice the channel closed"
+        except WormholeChannelClosedError:
+            pass
+        assert not channel.is_open()
@@ -0,0 +1,110 @@
+﻿import time
+import threading
+import redis
+
+from wormhole.channel import WormholeRedisChannel
+from wormhole.channel_implementations.channel_sharded import WormholeShardedChannel
+
+from typing import *
+
+
+class TestShardedChannel:
+    TEST_REDIS_URLS = ["redis://localhost:6379/1", "redis://localhost:6379/2"]
+    tested_channel: Optional[WormholeShardedChannel]
+
+    def setup_method(self):
+        self.__flush()
+        self.tested_channel = WormholeShardedChannel.from_uris(self.TEST_REDIS_URLS)
+
+    def teardown_method(self):
+        self.tested_channel.close()
+        self.tested_channel = None
+        self.__flush()
+
+    def __flush(self):
+        for redis_url in self.TEST_REDIS_URLS:
+            rdb = redis.Redis.from_url(redis_url)
+            rdb.flushdb()
+            rdb.close()
+
+    def __find_queue_names_on_every_shard(self) -> List[str]:
+        queue_name_by_shard = {}
+        for i in range(100):
+            queue_name = f"wh://queue{i}"
+            queue_name_by_shard.setdefault(self.tested_channel.get_shard_name(queue_name), queue_name)
+        assert len(queue_name_by_shard) == len(self.TEST_REDIS_URLS)
+        return list(queue_name_by_shard.values())
+
+    def test_placement(self):
+        queue_names = [f"wh://queue{i}" for i in range(1000)]
+        placements = {q: self.tested_channel.get_shard_name(q) for q in queue_names}
+        assert 400 < list(placements.values()).count(self.TEST_REDIS_URLS[0]) < 600
+        # Adding a shard only moves queues to the new shard
+        shards = self.tested_channel.shards
+        shards["redis://localhost:6379/3"] = WormholeRedisChannel("redis://localhost:6379/3")
+        grown_channel = WormholeShardedChannel(shards)
+        try:
+            for queue_name, shard_name in placements.items():
+                assert grown_channel.get_shard_name(queue_name) in (shard_name, "redis://localhost:6379/3")
+        finally:
+            shards["redis://localhost:6379/3"].close()
+
+    def test_send_and_reply(self):
+        for queue_name in self.__find_queue_names_on_every_shard():
+            message_id = self.tested_channel.send("sender1", queue_name, "hello")
+            _, popped_message_id, data, _ = self.tested_channel.pop_next("receiver1", [queue_name], 1)
+            assert popped_message_id == message_id
+            self.tested_channel.reply(popped_message_id, data.upper(), False, wh_receiver_id="receiver1")
+            assert self.tested_channel.wait_for_reply(message_id, 1) == (True, "HELLO", "receiver1")
+            # The message and its reply stayed on the shard of the queue
+            shard = self.tested_channel.get_shard(queue_name)
+            assert shard.get_stats().sends_per_second > 0
+
+    def test_pop_listens_on_every_shard(self):
+        queue_names = self.__find_queue_names_on_every_shard()
+        threading.Timer(0.2, lambda: self.tested_channel.send("sender1", queue_names[-1], "last")).start()
+        start_time = time.time()
+        queue_name, _, data, _ = self.tested_channel.pop_next("receiver1", queue_names, 3)
+        assert (queue_name, data) == (queue_names[-1], "last")
+        assert time.time() - start_time < 1
+        # Messages popped by a shard after another shard returned go back to their queue for the next pop
+        for queue_name in queue_names:
+            self.tested_channel.send("sender1", queue_name, queue_name)
+        received = [self.tested_channel.pop_next("receiver1", queue_names, 3)[2] for _ in queue_names]
+        assert sorted(received) == sorted(queue_names)
+        assert self.tested_channel.pop_next("receiver1", queue_names, 0.5) is None
+
+    def test_no_pop_after_return(self):
+        queue_names = self.__find_queue_names_on_every_shard()
+        self.tested_channel.send("sender1", queue_names[0], "first")
+        assert self.tested_channel.pop_many("receiver1", queue_names, 10, 3)[0][2] == "first"
+        # The receiver stopped popping, a message popped for it now goes back to its shard for whoever pops it next
+        self.tested_channel.send("sender1", queue_names[-1], "second")
+        time.sleep(0.3)
+        shard = self.tested_channel.get_shard(queue_names[-1])
+        assert shard.pop_next("receiver2", [queue_names[-1]], 1)[2] == "second"
+
+    def test_leftovers_are_requeued(self):
+        queue_names = self.__find_queue_names_on_every_shard()
+        for queue_name in queue_names:
+            self.tested_channel.send("sender1", queue_name, queue_name)
+        time.sleep(0.1)
+        popped_queue_name = self.tested_channel.pop_next("receiver1", queue_names, 1)[0]
+        # The receiver stops after a single message, the others wait in their shards
+        time.sleep(0.3)
+        for queue_name in queue_names:
+            if queue_name == popped_queue_name:
+                continue
+            shard = self.tested_channel.get_shard(queue_name)
+            assert shard.pop_next("receiver2", [queue_name], 1)[2] == queue_name
+
+    def test_groups_and_locks(self):
+        channel = self.tested_channel
+        group_names = [f"group{i}" for i in range(10)]
+        channel.touch_for_groups(group_names, "receiver1")
+        assert all(channel.find_group_members(g) == ["receiver1"] for g in group_names)
+        lock_secret = channel.lock("lock1")
+        assert channel.is_locked("lock1")
+        assert channel.release("lock1", lock_secret)
+        assert channel.rate_limit("limit1", 1, 1).allowed
+        assert not channel.rate_limit("limit1", 1, 1).allowed
@@ -0,0 +1,116 @@
+﻿import time
+import redis
+
+from tests.test_objects import Vector3
+from wormhole.channel_implementations.channel_streams import WormholeRedisStreamChannel
+
+from typing import *
+
+
+class TestRedisStreamChannel:
+    TEST_REDIS_URL = "redis://localhost:6379/1"
+    redis_client: Optional[redis.Redis]
+    tested_channel: Optional[WormholeRedisStreamChannel]
+
+    def setup_method(self):
+        self.redis_client = redis.from_url(self.TEST_REDIS_URL)
+        self.redis_client.flushdb()
+        self.tested_channel = WormholeRedisStreamChannel(self.TEST_REDIS_URL)
+
+    def teardown_method(self):
+        self.tested_channel.close()
+        self.redis_client.flushdb()
+        self.redis_client = None
+        self.tested_channel = None
+
+    def test_core_send_and_reply(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        dummy_queue_name = "i am another queue"
+        test_payload_data = Vector3(1, 5, 8)
+        test_reply_data = Vector3(1, 0, 1)
+
+        channel = self.tested_channel
+        message_id = channel.send("sender1", test_queue_name, test_payload_data, 10, flags=1)
+        assert self.redis_client.type(test_queue_name) == b"stream"
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next(imaginary_receiver_id,
+                                                                             [test_queue_name, dummy_queue_name],
+                                                                             timeout=1)
+        assert result_message_id == message_id
+        assert result_queue_name == test_queue_name
+        assert result_data == test_payload_data
+        assert flags == 1
+        assert self.redis_client.xpending(test_queue_name, channel.CONSUMER_GROUP_NAME)["pending"] == 1
+        assert not channel.check_for_reply(message_id)
+        channel.reply(result_message_id, test_reply_data, False, wh_receiver_id=imaginary_receiver_id)
+        # Replying acknowledges and removes the entry
+        assert self.redis_client.xpending(test_queue_name, channel.CONSUMER_GROUP_NAME)["pending"] == 0
+        assert self.redis_client.xlen(test_queue_name) == 0
+        assert channel.check_for_reply(message_id)
+        is_success, reply_data, reply_receiver_id = channel.wait_for_reply(message_id, 1)
+        assert is_success
+        assert reply_data == test_reply_data
+        assert reply_receiver_id == imaginary_receiver_id
+        assert channel.pop_next(imaginary_receiver_id, [test_queue_name, dummy_queue_name], timeout=1) is None
+
+    def test_pop_many(self):
+        imaginary_receiver_id = "receiver1"
+        test_queue_name = "my_queue"
+        other_queue_name = "my_other_queue"
+        channel = self.tested_channel
+        payloads = [Vector3(i, i * 2, i * 3) for i in range(10)]
+        message_ids = channel.send_many("sender1", test_queue_name, payloads, 10)
+        other_message_id = channel.send("sender1", other_queue_name, "other", 10)
+        results = channel.pop_many(imaginary_receiver_id, [test_queue_name], 4, timeout=1)
+        assert [r[1] for r in results] == message_ids[:4]
+        assert [r[2] for r in results] == payloads[:4]
+        popped_message_ids = []
+        while True:
+            results = channel.pop_many(imaginary_receiver_id, [test_queue_name, other_queue_name], 4, timeout=1)
+            if len(results) == 0:
+                break
+            assert len(results) <= 4
+            popped_message_ids.extend([r[1] for r in results])
+            for _, message_id, _, _ in results:
+                channel.delete(message_id)
+        assert sorted(popped_message_ids) == sorted(message_ids[4:] + [other_message_id])
+
+    def test_reclaim_from_dead_consumer(self):
+        test_queue_name = "my_queue"
+        channel = self.tested_channel
+        channel.claim_idle_timeout = 1
+        message_id = channel.send("sender1", test_queue_name, "data", 10)
+        assert channel.pop_next("dead_receiver", [test_queue_name], timeout=1)[1] == message_id
+        # The dead receiver never replies, another receiver takes the message over once it is idle long enough
+        assert channel.pop_next("receiver2", [test_queue_name], timeout=1) is None
+        time.sleep(1.1)
+        result_queue_name, result_message_id, result_data, flags = channel.pop_next("receiver2", [test_queue_name],
+                                                                                    timeout=1)
+        assert result_message_id == message_id
+        assert result_data == "data"
+        channel.reply(result_message_id, "reply", False, wh_receiver_id="receiver2")
+        assert channel.wait_for_reply(message_id, 1) == (True, "reply", "receiver2")
+
+    def test_expired_messages_are_dropped(self):
+        test_queue_name = "my_queue"
+        channel = self.tested_channel
+        channel.send("sender1", test_queue_name, "stale", 0)
+        time.sleep(2.1)
+        message_id = channel.send("sender1", test_queue_name, "fresh", 10)
+        results = channel.pop_many("receiver1", [test_queue_name], 10, timeout=1)
+        assert [r[1] for r in results] == [message_id]
+        assert self.redis_client.xlen(test_queue_name) == 1
+
+    def test_recreate_expired_group(self):
+        test_queue_name = "my_queue"
+        channel = self.tested_channel
+        assert channel.pop_next("receiver1", [test_queue_name], timeout=1) is None
+        # The stream expired with its consumer group, a sender creates it again without the group
+        self.redis_client.delete(test_queue_name)
+        message_id = channel.send("sender1", test_queue_name, "data", 10)
+        result = None
+        for _ in range(3):
+            result = channel.pop_next("receiver1", [test_queue_name], timeout=1)
+            if result is not None:
+                break
+        assert result[1] == message_id
@@ -1,36 +1,455 @@
-﻿from typing import *
-
-from tests.test_objects import Vector3
-from wormhole.encoding.base import WormholeEncoder
-from wormhole.encoding.pickleenc import WormholePickleEncoder
-
-
-class TestWormholeEncoder:
-    tested_encoder: Optional[WormholeEncoder]
-
-    def setup_method(self):
-        self.tested_encoder = WormholePickleEncoder()
-
-    def teardown_method(self):
-        self.tested_encoder = None
-
-    def test_encode_decode_10000_str(self):
-        for i in range(0, 10000):
-            data = str(i * 20)
-            encoded = self.tested_encoder.encode(data)
-            assert isinstance(encoded, bytes)
-            assert self.tested_encoder.decode(encoded) == data
-
-    def test_encode_decode_10000_vector3(self):
-        for i in range(0, 10000):
-            data = Vector3(i, i * 2, i * i)
-            encoded = self.tested_encoder.encode(data)
-            assert isinstance(encoded, bytes)
-            assert self.tested_encoder.decode(encoded) == data
-
-    def test_encode_decode_10000_dicts(self):
-        for i in range(0, 10000):
-            data = dict(a=i,b=i*i,c=i*5)
-            encoded = self.tested_encoder.encode(data)
-            assert isinstance(encoded, bytes)
-            assert self.tested_encoder.decode(encoded) == data
+﻿from typing import *
+
+import os
+import gzip
+import json
+import time
+import shutil
+import pickle
+import tempfile
+import threading
+
+import redis
+import pytest
+
+from benchmarks import encoder_benchmark as benchmark
+from tests.test_objects import Vector3, Vector3Message, Vector3SchemaMessage
+from wormhole.channel import WormholeRedisChannel
+from wormhole.encoding.base import WormholeEncoder
+from wormhole.encoding.blobenc import WormholeBlobEncoder
+from wormhole.encoding.blobstore import WormholeMmapBlobStore, DEFAULT_BLOB_DIRECTORY
+from wormhole.encoding.compression import WormholeCompressionPolicy
+from wormhole.encoding.pickleenc import WormholePickleEncoder
+from wormhole.encoding.schemaenc import WormholeSchemaEncoder
+from wormhole.encoding.zdictenc import WormholeZdictEncoder, train_zdict
+from wormhole.error import WormholeDecodeError, WormholeSchemaError
+from wormhole.message import WormholeMessage
+from wormhole.schema import wormhole_schema, get_schema
+
+
+class TestWormholeEncoder:
+    tested_encoder: Optional[WormholeEncoder]
+
+    def setup_method(self):
+        self.tested_encoder = WormholePickleEncoder()
+
+    def teardown_method(self):
+        self.tested_encoder = None
+
+    def test_encode_decode_10000_str(self):
+        for i in range(0, 10000):
+            data = str(i * 20)
+            encoded = self.tested_encoder.encode(data)
+            assert isinstance(encoded, bytes)
+            assert self.tested_encoder.decode(encoded) == data
+
+    def test_encode_decode_10000_vector3(self):
+        for i in range(0, 10000):
+            data = Vector3(i, i * 2, i * i)
+            encoded = self.tested_encoder.encode(data)
+            assert isinstance(encoded, bytes)
+            assert self.tested_encoder.decode(encoded) == data
+
+    def test_encode_decode_10000_dicts(self):
+        for i in range(0, 10000):
+            data = dict(a=i,b=i*i,c=i*5)
+            encoded = self.tested_encoder.encode(data)
+            assert isinstance(encoded, bytes)
+            assert self.tested_encoder.decode(encoded) == data
+
+
+class TestBlobEncoder:
+    blob_directory: Optional[str]
+    tested_encoder: Optional[WormholeBlobEncoder]
+
+    def setup_method(self):
+        self.blob_directory = tempfile.mkdtemp()
+        self.tested_encoder = WormholeBlobEncoder(WormholeMmapBlobStore(self.blob_directory), threshold=1024)
+
+    def teardown_method(self):
+        shutil.rmtree(self.blob_directory)
+        self.tested_encoder = None
+
+    def test_small_payloads_are_inline(self):
+        data = Vector3(1, 2, 3)
+        encoded = self.tested_encoder.encode(data)
+        assert encoded == WormholePickleEncoder().encode(data)
+        assert self.tested_encoder.decode(encoded) == data
+        assert os.listdir(self.blob_directory) == []
+
+    def test_large_payloads_are_offloaded(self):
+        data = [Vector3(i, i * 2, i * i) for i in range(1000)]
+        encoded = self.tested_encoder.encode(data)
+        assert encoded.startswith(WormholeBlobEncoder.BLOB_HEADER)
+        assert len(encoded) < 100
+        assert len(os.listdir(self.blob_directory)) == 1
+        assert self.tested_encoder.decode(encoded) == data
+        # Decoding consumes the blob
+        assert os.listdir(self.blob_directory) == []
+        with pytest.raises(WormholeDecodeError):
+            self.tested_encoder.decode(encoded)
+
+    def test_bytes_payloads(self):
+        payload = os.urandom(64 * 1024)
+        decoded = self.tested_encoder.decode(self.tested_encoder.encode(payload))
+        # Bytes are copied out of the blob unless zero-copy views are asked for
+        assert type(decoded) is bytes
+        assert decoded == payload
+        zero_copy_encoder = WormholeBlobEncoder(self.tested_encoder.blob_store, threshold=1024, zero_copy=True)
+        decoded = zero_copy_encoder.decode(zero_copy_encoder.encode(payload))
+        assert isinstance(decoded, memoryview)
+        assert decoded == payload
+
+    def test_default_blob_directory(self):
+        assert str(os.getuid()) in DEFAULT_BLOB_DIRECTORY
+        blob_store = WormholeMmapBlobStore()
+        assert blob_store.directory == DEFAULT_BLOB_DIRECTORY
+        assert os.stat(DEFAULT_BLOB_DIRECTORY).st_mode & 0o777 == 0o700
+        os.chmod(DEFAULT_BLOB_DIRECTORY, 0o755)
+        try:
+            with pytest.raises(RuntimeError):
+                WormholeMmapBlobStore()
+        finally:
+            os.chmod(DEFAULT_BLOB_DIRECTORY, 0o700)
+
+    def test_expired_blobs_are_removed(self):
+        blob_store = self.tested_encoder.blob_store
+        expired_ref = blob_store.put(b"x" * 10, -10)
+        live_ref = blob_store.put(b"y" * 10, 600)
+        blob_store.cleanup_if_needed(time.time() + blob_store.CLEANUP_INTERVAL)
+        assert sorted(os.listdir(self.blob_directory)) == [live_ref]
+        assert bytes(blob_store.get(live_ref)) == b"y" * 10
+        with pytest.raises(KeyError):
+            blob_store.get(expired_ref)
+        with pytest.raises(KeyError):
+            blob_store.get("../" + live_ref)
+
+    def test_redis_channel_send_and_reply(self):
+        channel = WormholeRedisChannel("redis://localhost:6379/1", encoder=self.tested_encoder)
+        try:
+            payload = os.urandom(64 * 1024)
+            message_id = channel.send("sender1", "blob_queue", payload)
+            _, result_message_id, result_data, _ = channel.pop_next("receiver1", ["blob_queue"], timeout=1)
+            assert result_message_id == message_id
+            assert result_data == payload
+            channel.reply(result_message_id, payload[::-1], False, wh_receiver_id="receiver1")
+            is_success, reply_data, _ = channel.wait_for_reply(message_id, 1)
+            assert is_success
+            assert reply_data == payload[::-1]
+            assert os.listdir(self.blob_directory) == []
+        finally:
+            channel.close()
+
+
+class TestSchemaEncoder:
+    tested_encoder: Optional[WormholeSchemaEncoder]
+
+    def setup_method(self):
+        self.tested_encoder = WormholeSchemaEncoder()
+
+    def teardown_method(self):
+        self.tested_encoder = None
+
+    def test_encode_decode(self):
+        for data in (Vector3SchemaMessage(1.5, -2, 3e100), Vector3SchemaMessage(0, 0, 0, label="ünïcode")):
+            encoded = self.tested_encoder.encode(data)
+            assert encoded[:2] == b"#\x01"
+            decoded = self.tested_encoder.decode(encoded)
+            assert type(decoded) is Vector3SchemaMessage
+            assert decoded == data
+        # Schema messages are several times smaller than pickled ones
+        encoded = self.tested_encoder.encode(Vector3SchemaMessage(1.0, 2.0, 3.0))
+        assert len(encoded) * 3 < len(WormholePickleEncoder().encode(Vector3Message(1.0, 2.0, 3.0)))
+        assert not hasattr(Vector3SchemaMessage(1, 2, 3), "__dict__")
+
+    def test_fallback(self):
+        for data in (Vector3(1, 2, 3), {"a": 1}, b"raw"):
+            encoded = self.tested_encoder.encode(data)
+            assert encoded == WormholePickleEncoder().encode(data)
+            assert self.tested_encoder.decode(encoded) == data
+
+    def test_errors(self):
+        with pytest.raises(WormholeDecodeError):
+            self.tested_encoder.decode(b"#\xfe")
+        with pytest.raises(WormholeDecodeError):
+            self.tested_encoder.decode(self.tested_encoder.encode(Vector3SchemaMessage(1, 2, 3))[:-2])
+        with pytest.raises(WormholeSchemaError):
+            self.tested_encoder.encode(Vector3SchemaMessage(1, 2, "3"))
+        with pytest.raises(WormholeSchemaError):
+            @wormhole_schema(1)
+            class OtherMessage(WormholeMessage):
+                x: float
+        with pytest.raises(WormholeSchemaError):
+            @wormhole_schema(254)
+            class ListMessage(WormholeMessage):
+                items: list
+
+    def test_redis_channel_send_and_reply(self):
+        channel = WormholeRedisChannel("redis://localhost:6379/1", encoder=self.tested_encoder)
+        try:
+            message_id = channel.send("sender1", "schema_queue", Vector3SchemaMessage(1, 2, 3, label="a"))
+            _, result_message_id, result_data, _ = channel.pop_next("receiver1", ["schema_queue"], timeout=1)
+            assert result_message_id == message_id
+            assert result_data == Vector3SchemaMessage(1, 2, 3, label="a")
+            channel.reply(result_message_id, result_data.x + result_data.y, False, wh_receiver_id="receiver1")
+            assert channel.wait_for_reply(message_id, 1)[1] == 3
+        finally:
+            channel.close()
+
+
+class TestCompressionPolicy:
+    def test_codecs(self):
+        data = [Vector3(i, i * 2, i * i) for i in range(1000)]
+        for codec, header in (("gzip", b"$"), ("mgzip", b"$"), ("zlib", b"~"), ("lzma", b"*")):
+            encoder = WormholePickleEncoder(WormholeCompressionPolicy(codec, level=1))
+            encoded = encoder.encode(data)
+            assert encoded[:1] == header
+            assert len(encoded) < len(pickle.dumps(data)) / 2
+            assert WormholePickleEncoder().decode(encoded) == data
+            if header == b"$":
+                # Receivers predating the policy only know gzip
+                assert pickle.loads(gzip.decompress(encoded[1:])) == data
+        with pytest.raises(ValueError):
+            WormholeCompressionPolicy("snappy")
+
+    def test_adaptive_threshold(self):
+        policy = WormholeCompressionPolicy(probe_interval=4)
+        compressible = b"a" * 10000
+        incompressible = os.urandom(10000)
+        assert policy.compress_if_needed(b"a" * 100, "q") == b"a" * 100
+        assert policy.compress_if_needed(compressible, "q").startswith(b"$")
+        # Incompressible payloads are sent as they are and raise the threshold of their queue only
+        assert policy.compress_if_needed(incompressible, "q") == incompressible
+        # Long payloads are skipped by a sample
+        large_incompressible = os.urandom(100000)
+        assert policy.compress_if_needed(large_incompressible, "q2") == large_incompressible
+        assert policy.get_threshold("q2") == 200000
+        assert policy.get_threshold("q") == 20000
+        assert policy.get_threshold("other") == policy.min_length
+        # Payloads below the threshold are probed every probe_interval payloads
+        assert [policy.compress_if_needed(compressible, "q").startswith(b"$") for _ in range(4)] == \
+               [False, False, False, True]
+        assert policy.get_threshold("q") == 10000
+        # Every payload that compresses halves it back
+        assert policy.compress_if_needed(compressible * 2, "q").startswith(b"$")
+        assert policy.get_threshold("q") == 5000
+
+
+class _BufferBackedArray:
+    """Pickles its data as a PickleBuffer under protocol 5, like numpy arrays do"""
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return _BufferBackedArray, (pickle.PickleBuffer(self.data),)
+        return _BufferBackedArray, (bytes(self.data),)
+
+
+class TestPickleOutOfBand:
+    tested_encoder: Optional[WormholePickleEncoder]
+
+    def setup_method(self):
+        self.tested_encoder = WormholePickleEncoder(out_of_band_threshold=1024)
+
+    def teardown_method(self):
+        self.tested_encoder = None
+
+    def test_encode_decode(self):
+        large = os.urandom(100000)
+        data = {"bytes": large, "bytearray": bytearray(large[:5000]), "array": _BufferBackedArray(bytearray(large)),
+                "small": b"small", "vector": Vector3(1, 2, 3)}
+        encoded = self.tested_encoder.encode(data)
+        assert encoded.startswith(b"!")
+        # Out-of-band buffers are framed once instead of being copied into the pickle
+        assert len(encoded) < len(large) * 2 + 6000
+        decoded = self.tested_encoder.decode(encoded)
+        # Decoded to the types they were sent as
+        assert type(decoded["bytes"]) is bytes and decoded["bytes"] == large
+        assert type(decoded["bytearray"]) is bytearray and decoded["bytearray"] == data["bytearray"]
+        assert bytes(decoded["array"].data) == large
+        assert decoded["small"] == b"small"
+        assert decoded["vector"] == Vector3(1, 2, 3)
+        # Decoded over the payload with zero-copy
+        decoded = WormholePickleEncoder(out_of_band_threshold=1024, zero_copy=True).decode(encoded)
+        for key in ("bytes", "bytearray"):
+            assert isinstance(decoded[key], memoryview)
+            assert decoded[key] == data[key]
+            assert decoded[key].obj is encoded
+        assert memoryview(decoded["array"].data).obj is encoded
+        assert bytes(decoded["array"].data) == large
+
+    def test_in_band(self):
+        for data in (Vector3(1, 2, 3), [b"x" * 100] * 3, b"raw" * 1000, list(range(10000))):
+            encoded = self.tested_encoder.encode(data)
+            assert not encoded.startswith(b"!")
+            assert self.tested_encoder.decode(encoded) == data
+            assert WormholePickleEncoder().decode(encoded) == data
+
+    def test_corrupt_payload(self):
+        encoded = self.tested_encoder.encode([os.urandom(2000)])
+        with pytest.raises(WormholeDecodeError):
+            self.tested_encoder.decode(encoded[:-1])
+        with pytest.raises(WormholeDecodeError):
+            self.tested_encoder.decode(encoded[:10])
+
+
+class TestZdictEncoder:
+    TEST_REDIS_URL = "redis://localhost:6379/1"
+    redis_client: Optional[redis.Redis]
+    tested_encoder: Optional[WormholeZdictEncoder]
+
+    def setup_method(self):
+        self.redis_client = redis.from_url(self.TEST_REDIS_URL)
+        self.redis_client.flushdb()
+        self.tested_encoder = WormholeZdictEncoder(self.redis_client, sample_count=20)
+
+    def teardown_method(self):
+        self.redis_client.flushdb()
+        self.redis_client = None
+        self.tested_encoder = None
+
+    @staticmethod
+    def make_payload(i: int):
+        return {"user_id": i, "name": f"user{i}", "email": f"user{i}@example.com", "position": Vector3(i, i, 0.5)}
+
+    def test_train_and_compress(self):
+        encoder = self.tested_encoder
+        # Payloads are sampled until the queue has a dictionary
+        for i in range(20):
+            assert encoder.encode_for_queue(self.make_payload(i), "q") == WormholePickleEncoder().encode(
+                self.make_payload(i))
+        # The dictionary is trained in the background
+        encoder.wait_for_training()
+        dictionary_id = encoder.get_dictionary_id("q")
+        assert dictionary_id is not None
+        assert encoder.get_dictionary_id("other_queue") is None
+        plain = WormholePickleEncoder().encode(self.make_payload(100))
+        encoded = encoder.encode_for_queue(self.make_payload(100), "q")
+        assert encoded.startswith(b"z")
+        assert len(encoded) * 2 < len(plain)
+        assert encoder.encode(self.make_payload(100)) == plain
+        # Receivers fetch the dictionary by the id in the header
+        receiver_encoder = WormholeZdictEncoder(redis.from_url(self.TEST_REDIS_URL))
+        assert receiver_encoder.decode(encoded) == self.make_payload(100)
+        assert receiver_encoder.decode(plain) == self.make_payload(100)
+
+    def test_training_off_send_path(self):
+        training_started, training_released = threading.Event(), threading.Event()
+
+        class _HeldZdictEncoder(WormholeZdictEncoder):
+            def train(self, queue_name: str, samples: List[bytes], replace: bool = True) -> int:
+                training_started.set()
+                training_released.wait(5)
+                return super().train(queue_name, samples, replace)
+
+        encoder = _HeldZdictEncoder(self.redis_client, sample_count=20, refresh_interval=0)
+        for i in range(20):
+            encoder.encode_for_queue(self.make_payload(i), "q")
+        assert training_started.wait(5)
+        # Sends go on uncompressed while the dictionary is trained
+        plain = WormholePickleEncoder().encode(self.make_payload(100))
+        assert encoder.encode_for_queue(self.make_payload(100), "q") == plain
+        training_released.set()
+        encoder.wait_for_training()
+        assert encoder.encode_for_queue(self.make_payload(100), "q").startswith(b"z")
+
+    def test_concurrent_sampling(self):
+        encoder = WormholeZdictEncoder(self.redis_client, sample_count=5, refresh_interval=0)
+        errors = []
+
+        def send_payloads():
+            try:
+                for i in range(200):
+                    encoder.encode_for_queue(self.make_payload(i), "q")
+            except Exception as e:
+                errors.append(e)
+
+        senders = [threading.Thread(target=send_payloads) for _ in range(8)]
+        for sender in senders:
+            sender.start()
+        for sender in senders:
+            sender.join()
+        encoder.wait_for_training()
+        assert errors == []
+        assert encoder.get_dictionary_id("q") is not None
+
+    def test_retrain(self):
+        encoder = self.tested_encoder
+        samples = [WormholePickleEncoder().encode(self.make_payload(i)) for i in range(20)]
+        first_id = encoder.train("q", samples)
+        encoded = encoder.encode_for_queue(self.make_payload(100), "q")
+        # A sender training a dictionary after another one takes the existing dictionary
+        other_encoder = WormholeZdictEncoder(redis.from_url(self.TEST_REDIS_URL))
+        assert other_encoder.train("q", samples, replace=False) == first_id
+        second_id = other_encoder.train("q", samples)
+        assert second_id != first_id
+        assert other_encoder.encode_for_queue(self.make_payload(100), "q")[1:5] != encoded[1:5]
+        # The replaced dictionary is kept for queued messages for a while
+        assert self.redis_client.ttl(f"whzd://{first_id}") > 0
+        assert other_encoder.decode(encoded) == self.make_payload(100)
+        self.redis_client.delete(f"whzd://{first_id}")
+        with pytest.raises(WormholeDecodeError):
+            WormholeZdictEncoder(redis.from_url(self.TEST_REDIS_URL)).decode(encoded)
+
+    def test_train_zdict(self):
+        samples = [b"common-prefix-" + str(i).encode() + b"-common-suffix" for i in range(50)] + [os.urandom(30)]
+        dictionary = train_zdict(samples, 1024)
+        assert b"common-prefix-" in dictionary and b"-common-suffix" in dictionary
+        assert samples[-1] not in dictionary
+        assert len(train_zdict(samples, 16)) == 16
+
+
+class TestEncoderBenchmark:
+    TEST_REDIS_URL = "redis://localhost:6379/1"
+    blob_directory: Optional[str]
+
+    def setup_method(self):
+        self.blob_directory = tempfile.mkdtemp()
+        redis.from_url(self.TEST_REDIS_URL).flushdb()
+
+    def teardown_method(self):
+        shutil.rmtree(self.blob_directory)
+        redis.from_url(self.TEST_REDIS_URL).flushdb()
+        self.blob_directory = None
+
+    def test_corpus(self):
+        corpus = benchmark.generate_corpus(seed=1, items_per_category=4)
+        assert tuple(corpus) == benchmark.CATEGORIES
+        assert all(len(items) >= 2 for items in corpus.values())
+        assert all(len(blob) == 1024 for blob in corpus["bytes_1k"])
+        assert all(isinstance(e, Exception) for e in corpus["exception"])
+        schema = get_schema(type(corpus["schema_message"][0]))
+        assert schema is not None and schema.type_id == benchmark.DEFAULT_SCHEMA_TYPE_ID
+        # The same seed generates the same payloads
+        assert pickle.dumps(corpus) == pickle.dumps(benchmark.generate_corpus(seed=1, items_per_category=4))
+
+    def test_run_benchmark(self):
+        corpus = benchmark.generate_corpus(items_per_category=4)
+        encoders = benchmark.get_encoders(rdb=redis.from_url(self.TEST_REDIS_URL), blob_directory=self.blob_directory,
+                                          sample_count=4)
+        assert tuple(encoders) == benchmark.ENCODERS
+        report = benchmark.run_benchmark(encoders, corpus, iterations=2)
+        results = {(r["encoder"], r["category"]): r for r in report["results"]}
+        assert len(results) == len(benchmark.ENCODERS) * len(benchmark.CATEGORIES)
+        assert not results[("json", "bytes_1k")]["supported"]
+        assert not results[("json", "exception")]["supported"]
+        pickle_result = results[("pickle", "small_dict")]
+        assert pickle_result["encode"]["ops_per_sec"] > 0 and pickle_result["decode"]["mb_per_sec"] > 0
+        assert 0 < pickle_result["encode"]["p50_us"] <= pickle_result["encode"]["p99_us"]
+        assert pickle_result["encode"]["peak_allocation_bytes"] > 0
+        # Schema messages are packed smaller than pickled, large payloads leave only a reference in the blob encoder
+        assert results[("schema", "schema_message")]["size_ratio"] < 1
+        assert results[("blob", "bytes_1m")]["mean_encoded_size"] < 100
+        assert results[("zdict", "small_dict")]["size_ratio"] < 1
+        json.dumps(report)
+
+    def test_main(self):
+        report_path = os.path.join(self.blob_directory, "report.json")
+        benchmark.main(["--iterations", "1", "--items", "2", "--encoders", "pickle", "json",
+                        "--categories", "small_dict", "exception", "--json", report_path])
+        with open(report_path) as f:
+            report = json.load(f)
+        assert [(r["encoder"], r["category"], r["supported"]) for r in report["results"]] == [
+            ("pickle", "small_dict", True), ("pickle", "exception", True),
+            ("json", "small_dict", True), ("json", "exception", False)]
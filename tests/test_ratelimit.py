@@ -0,0 +1,48 @@
+﻿import time
+import redis
+
+from wormhole.channel import WormholeRedisChannel
+from wormhole.ratelimit import WormholeLocalRateLimiter
+
+from typing import *
+
+
+class TestLocalRateLimiter:
+    TEST_REDIS_URL = "redis://localhost:6379/1"
+    redis_client: Optional[redis.Redis]
+    channel: Optional[WormholeRedisChannel]
+
+    def setup_method(self):
+        self.redis_client = redis.Redis.from_url(self.TEST_REDIS_URL)
+        self.redis_client.flushdb()
+        self.channel = WormholeRedisChannel(self.TEST_REDIS_URL)
+
+    def teardown_method(self):
+        self.channel.close()
+        self.redis_client.flushdb()
+        self.redis_client = None
+        self.channel = None
+
+    def test_admit(self):
+        limiter1 = WormholeLocalRateLimiter(self.channel, "my_limit", 10, 1, batch_size=4)
+        limiter2 = WormholeLocalRateLimiter(self.channel, "my_limit", 10, 1, batch_size=4)
+        # The limit is shared, a limiter only admits what it took from the channel
+        assert all(limiter1.admit().allowed for _ in range(8))
+        assert not self.channel.rate_limit("my_limit", 10, 1, count=3).allowed
+        assert limiter2.admit().allowed
+        assert limiter2.admit().allowed
+        result = limiter1.admit()
+        assert not result.allowed
+        assert 0 < result.retry_after <= 0.11
+        # Denied locally until the channel may admit again
+        assert not limiter1.admit().allowed
+        time.sleep(result.retry_after + 0.01)
+        assert limiter1.admit().allowed
+
+    def test_tokens_expire(self):
+        limiter = WormholeLocalRateLimiter(self.channel, "my_limit", 10, 0.5, batch_size=5)
+        assert limiter.admit().allowed
+        time.sleep(0.6)
+        # The unused tokens of the old window are gone, a new batch is taken
+        assert limiter.admit(count=5).allowed
+        assert not self.channel.rate_limit("my_limit", 10, 0.5, count=6).allowed
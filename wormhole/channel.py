@@ -1,337 +1,716 @@
-﻿import random
-import time
-
-import redis
-
-from typing import *
-
-from redis import BlockingConnectionPool
-
-from wormhole.encoding.base import WormholeEncoder
-from wormhole.error import WormholeWaitForReplyError, WormholeChannelClosedError, \
-    WormholeChannelConnectionError, WormholeDecodeError, WormholeChannelPopError
-from wormhole.registry import DEFAULT_MESSAGE_TIMEOUT, DEFAULT_REPLY_TIMEOUT, get_default_encoder
-from wormhole.utils import generate_uid
-
-
-class WormholeChannelStats(NamedTuple):
-    sends_per_second: int
-    processing_per_second: int
-
-
-class AbstractWormholeChannel:
-    MESSAGE_FLAG_DONT_REPLY: ClassVar[int] = 1
-
-    def is_open(self):
-        raise NotImplementedError()
-
-    def get_stats(self):
-        raise NotImplementedError()
-
-    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 0) -> \
-            Optional[Tuple[str, Union[str, bytes]]]:
-        raise NotImplementedError()
-
-    def send(self, wh_sender_id: str, queue_name: str, data: Union[bytes, str], queue_timeout: int = None, flags: int = 0) -> str:
-        raise NotImplementedError()
-
-    def delete(self, message_id: str) -> None:
-        raise NotImplementedError()
-
-    def check_for_reply(self, message_id: str) -> bool:
-        raise NotImplementedError()
-
-    def wait_for_reply(self, message_id: str, timeout: int = 30) -> Tuple[bool, Any, str]:
-        """Returns tuple(isSuccess, data)"""
-        raise NotImplementedError()
-
-    def close(self):
-        raise NotImplementedError()
-
-    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
-        raise NotImplementedError()
-
-    def remove_from_groups(self, group_names: List[str], receiver_id: str):
-        raise NotImplementedError()
-
-    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0, lock_timeout: int = 0) -> Optional[str]:
-        raise NotImplementedError()
-
-    def release(self, lock_name: str, lock_secret: str, force=False):
-        raise NotImplementedError()
-
-    def threshold_lock(self, lock_name: str, max_amount: int, duration: float):
-        raise NotImplementedError()
-
-    def is_locked(self, lock_name: str):
-        raise NotImplementedError()
-
-
-class WormholeRedisChannel(AbstractWormholeChannel):
-    MESSAGE_DATA_HKEY: str = "in"
-    MESSAGE_FLAGS_KEY: str = "meta"
-    MESSAGE_RESPONSE_HKEY = "out"
-    MESSAGE_ERROR_HKEY = "err"
-    MESSAGE_WORMHOLE_RECEIVER_ID_HKEY = "hid"
-    GROUP_REGISTRY_PREFIX = "whgm://"
-    LOCK_PREFIX = "whlk://"
-    LOCK_SIGNAL_PREFIX = "whlks://"
-    THRESHOLD_LOCK_PREFIX = "whth://"
-    STATS_PREFIX = "whstats://"
-
-    __encoder: WormholeEncoder
-    __send_timeout: int
-    __reply_expiration: int
-
-    def __init__(self, redis_uri: str = "redis://localhost:6379/1", max_connections=20, send_timeout: int = DEFAULT_MESSAGE_TIMEOUT, reply_expiration: int = DEFAULT_REPLY_TIMEOUT, redis_pool: BlockingConnectionPool = None):
-        if redis_pool is None:
-            self.__connection_pool = BlockingConnectionPool.from_url(redis_uri, max_connections=max_connections)
-        else:
-            self.__connection_pool = redis_pool
-        self.__encoder = get_default_encoder()
-        self.__closed = False
-        self.__send_timeout = send_timeout
-        self.__reply_expiration = reply_expiration
-        self.__send_rate = -1
-        self.__receive_rate = -1
-        self.stats_enabled = True
-
-    def is_open(self):
-        return not self.__closed
-
-    def __get_rdb(self):
-        if self.__closed:
-            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
-        return redis.Redis(connection_pool=self.__connection_pool)
-
-    def get_stats(self):
-        return WormholeChannelStats(self.__send_rate, self.__receive_rate)
-
-    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
-        rdb = self.__get_rdb()
-        transaction = rdb.pipeline()
-        for group_name in group_names:
-            key_name = f"{self.GROUP_REGISTRY_PREFIX}{group_name}/{receiver_id}"
-            transaction.setex(key_name, timeout, receiver_id)
-        transaction.execute()
-        transaction.close()
-
-    def remove_from_groups(self, group_names: List[str], receiver_id: str):
-        rdb = self.__get_rdb()
-        transaction = rdb.pipeline()
-        for group_name in group_names:
-            key_name = f"{self.GROUP_REGISTRY_PREFIX}{group_name}/{receiver_id}"
-            transaction.delete(key_name)
-        transaction.execute()
-        transaction.close()
-
-    def find_group_members(self, group_name):
-        rdb = self.__get_rdb()
-        prefix = f"{self.GROUP_REGISTRY_PREFIX}{group_name}/"
-        member_keys = rdb.keys(f"{prefix}*")
-        return [d.decode()[len(prefix):] for d in member_keys]
-
-    def send(self, wh_sender_id: str, queue_name: str, data: Any,
-             queue_timeout: int = None, flags: int = 0) -> str:
-        if queue_timeout is None:
-            queue_timeout = self.__send_timeout
-        actual_timeout = queue_timeout + 2
-        message_id = f"wh:{generate_uid()}"
-        rdb = self.__get_rdb()
-
-        # Stats
-        if self.stats_enabled:
-            now = time.time()
-            stats_counter_key = f"{self.STATS_PREFIX}{wh_sender_id}:sends"
-            stats_last_update_key = f"{self.STATS_PREFIX}{wh_sender_id}:sends_touch_time"
-            last_stat_time: Union[bytes, float] = rdb.get(stats_last_update_key)
-            if last_stat_time is None:
-                last_stat_time = time.time()
-                rdb.set(stats_last_update_key, last_stat_time)
-            else:
-                last_stat_time = float(last_stat_time.decode())
-        ############
-
-        transaction = rdb.pipeline()
-        transaction.hset(message_id, self.MESSAGE_DATA_HKEY, self.__encoder.encode(data))
-        transaction.hset(message_id, self.MESSAGE_FLAGS_KEY, str(flags).encode('utf-8'))
-        transaction.expire(message_id, actual_timeout)
-        transaction.lpush(queue_name, message_id)
-        transaction.expire(queue_name, actual_timeout)
-        transaction.execute()
-        assert rdb.exists(message_id)
-
-        # STATS
-        if self.stats_enabled:
-            total_sends_since = rdb.incr(stats_counter_key)
-            seconds_since = now - last_stat_time
-            if seconds_since >= 60 or total_sends_since > 2000:
-                self.__send_rate = total_sends_since / seconds_since
-                transaction = rdb.pipeline()
-                transaction.set(stats_counter_key, 0)
-                transaction.set(stats_last_update_key, now)
-                transaction.execute()
-        #############
-
-        return message_id
-
-    def check_for_reply(self, message_id: str):
-        response_queue = "response:" + message_id
-        rdb = self.__get_rdb()
-        return rdb.llen(response_queue) > 0
-
-    def wait_for_reply(self, message_id: str, timeout: int = DEFAULT_MESSAGE_TIMEOUT) -> Tuple[bool, Any, str]:
-        response_queue = "response:" + message_id
-        rdb = self.__get_rdb()
-        result = rdb.brpop(response_queue, timeout)
-        data = rdb.hget(message_id, self.MESSAGE_RESPONSE_HKEY)
-        error = rdb.hget(message_id, self.MESSAGE_ERROR_HKEY)
-        receiver_id = rdb.hget(message_id, self.MESSAGE_WORMHOLE_RECEIVER_ID_HKEY)
-        if not result:
-            if receiver_id is None:
-                return False, WormholeWaitForReplyError(f"Message timed out, no handlers found for message {message_id}"), ""
-            return False, WormholeWaitForReplyError(f"Timeout waiting for results from {receiver_id}"), ""
-        if isinstance(receiver_id, bytes):
-            receiver_id = receiver_id.decode()
-        rdb.delete(message_id)
-        if error is not None:
-            return False, self.__encoder.decode(error), receiver_id
-        if data is None:
-            return True, None, receiver_id
-        return True, self.__encoder.decode(data), receiver_id
-
-    def delete(self, message_id):
-        self.__get_rdb().delete(message_id)
-
-    def reply(self, message_id: str, data: Any, is_error: bool,
-              timeout: int = None):
-        if not timeout:
-            timeout = self.__reply_expiration
-        try:
-            response_queue = "response:" + message_id
-            rdb = self.__get_rdb()
-            transaction = rdb.pipeline()
-            if is_error:
-                data_hkey = self.MESSAGE_ERROR_HKEY
-                signal_reply = "error"
-            else:
-                data_hkey = self.MESSAGE_RESPONSE_HKEY
-                signal_reply = "handled"
-            if data is not None:
-                transaction.hset(message_id, data_hkey, self.__encoder.encode(data))
-            transaction.lpush(response_queue, signal_reply)
-            transaction.expire(response_queue, timeout)
-            transaction.expire(message_id, timeout)
-            transaction.execute()
-            transaction.close()
-        except redis.exceptions.ConnectionError as e:
-            if self.__closed:
-                raise WormholeChannelClosedError("Cannot reply using a closed channel")
-            raise WormholeChannelConnectionError(f"Connection error during reply: {e}")
-
-    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 5) -> Optional[
-        Tuple[str, str, Any, int]]:
-        rdb = self.__get_rdb()
-        random.shuffle(queue_names)
-        result: Optional[Tuple[bytes, bytes]] = rdb.brpop(queue_names, timeout)
-        did_timeout = result is None
-        if did_timeout:
-            return None
-        result_queue_name = result[0].decode()
-        result_message_id = result[1].decode()
-        result_payload = rdb.hgetall(result_message_id)
-
-        # Stats
-        if self.stats_enabled:
-            now = time.time()
-            stats_counter_key = f"{self.STATS_PREFIX}{wh_receiver_id}:receive"
-            stats_last_update_key = f"{self.STATS_PREFIX}{wh_receiver_id}:receive_touch_time"
-            last_stat_time: Union[bytes, float] = rdb.get(stats_last_update_key)
-            if last_stat_time is None:
-                last_stat_time = time.time()
-                rdb.set(stats_last_update_key, last_stat_time)
-            else:
-                last_stat_time = float(last_stat_time.decode())
-            total_count_since = rdb.incr(stats_counter_key)
-            seconds_since = now - last_stat_time
-            if seconds_since >= 60 or total_count_since > 2000:
-                self.__receive_rate = total_count_since / seconds_since
-                rdb.set(stats_counter_key, 0)
-                rdb.set(stats_last_update_key, now)
-        #############
-
-        # If the queued message already expired - return none
-        if result_payload is None:
-            return None
-        if self.MESSAGE_DATA_HKEY.encode() not in result_payload:
-            return None  # empty stale message
-        if self.MESSAGE_FLAGS_KEY.encode() in result_payload:
-            flags = int(result_payload[self.MESSAGE_FLAGS_KEY.encode()].decode('utf-8'))
-        else:
-            flags = 0
-        try:
-            rdb.hset(result_message_id, self.MESSAGE_WORMHOLE_RECEIVER_ID_HKEY, wh_receiver_id)
-            message_data = result_payload[self.MESSAGE_DATA_HKEY.encode()]
-        except KeyError:
-            return None
-        try:
-            message_data = self.__encoder.decode(message_data)
-            return result_queue_name, result_message_id, message_data, flags
-        except WormholeDecodeError as e:
-            raise WormholeChannelPopError(result_queue_name, result_message_id, str(e), e)
-
-
-    def close(self):
-        self.__closed = True
-        self.__connection_pool.disconnect()
-
-    def threshold_lock(self, lock_name: str, max_amount: int, duration: int):
-        assert duration >= 1, "'duration' cannot be smaller than 1"
-        assert max_amount >= 1, "'max_amount' cannot be smaller than 1"
-        full_lock_name = f"{self.THRESHOLD_LOCK_PREFIX}{lock_name}"
-        rdb = self.__get_rdb()
-        result = rdb.incr(full_lock_name)
-        if result > max_amount:
-            return False
-        if result == 1:
-            rdb.expire(full_lock_name, duration)
-        return True
-
-    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0, lock_timeout: int = 0) -> Optional[str]:
-        lock_secret = generate_uid()
-        key = self.__get_lock_key(lock_name)
-        while not self.__get_rdb().setnx(key, lock_secret):
-            if not block:
-                return None
-            result = self.__get_rdb().brpop(self.__get_lock_signal_key(lock_name), timeout=block_timeout)
-            if result is None:  # Timeout
-                return None
-        if lock_timeout > 0:
-            self.__get_rdb().expire(key, lock_timeout)
-        return lock_secret
-
-    def release(self, lock_name: str, lock_secret: str, force=False):
-        key = self.__get_lock_key(lock_name)
-        locker_secret: bytes = self.__get_rdb().get(key)
-        if locker_secret is None:
-            return False  # not locked
-        if not force and locker_secret.decode() != lock_secret:
-            raise KeyError("Invalid lock secret, not the owner of this lock")
-        self.__get_rdb().delete(key)
-        self.__get_rdb().lpush(self.__get_lock_signal_key(lock_name), 1)
-        self.__get_rdb().expire(key, 10)
-        return True
-
-    def is_locked(self, lock_name: str):
-        key = self.__get_lock_key(lock_name)
-        return self.__get_rdb().exists(key)
-
-    def __get_lock_key(self, lock_name: str):
-        return f"{self.LOCK_PREFIX}{lock_name}"
-
-    def __get_lock_signal_key(self, lock_name: str):
-        return f"{self.LOCK_SIGNAL_PREFIX}{lock_name}"
-
-
-def create_default_channel():
-    return WormholeRedisChannel()
+﻿import math
+import random
+import hashlib
+import time
+import threading
+
+import redis
+
+from typing import *
+
+from collections import OrderedDict
+from redis import BlockingConnectionPool
+
+from wormhole.encoding.base import WormholeEncoder
+from wormhole.groups import WormholeGroupCache, WormholeGroupCacheStats
+from wormhole.inbox import WormholeReplyInbox
+from wormhole.pool import WormholeConnectionPool, WormholePoolStats
+from wormhole.error import WormholeWaitForReplyError, WormholeChannelClosedError, \
+    WormholeChannelConnectionError, WormholeDecodeError, WormholeChannelPopError
+from wormhole.registry import DEFAULT_MESSAGE_TIMEOUT, DEFAULT_REPLY_TIMEOUT, get_default_encoder
+from wormhole.stats import WormholeStatsRecorder, WormholeStatsFlusher
+from wormhole.scripts import get_pool_script, SEND_SCRIPT, SEND_INLINE_SCRIPT, DRAIN_SCRIPT, FETCH_AND_TAG_SCRIPT, \
+    TOUCH_GROUPS_SCRIPT, REMOVE_FROM_GROUPS_SCRIPT, ACQUIRE_LOCK_SCRIPT, RELEASE_LOCK_SCRIPT, \
+    RATE_LIMIT_SCRIPT, TOUCH_CONTENT_SCRIPT, REPLY_SCRIPT
+from wormhole.utils import generate_uid
+from wormhole.wire import is_inline_entry, pack_inline_message, unpack_inline_message, pack_inline_reply, \
+    unpack_inline_reply, pack_inbox_reply
+
+
+class WormholeChannelStats(NamedTuple):
+    sends_per_second: int
+    processing_per_second: int
+
+
+class WormholeLockSecret(str):
+    """
+    The secret releasing a lock, its fencing token grows with every acquisition of the lock so whoever a lock holder
+    writes to can reject writes of a previous holder whose lock expired
+    """
+    fencing_token: int
+
+    def __new__(cls, secret: str, fencing_token: int):
+        lock_secret = super().__new__(cls, secret)
+        lock_secret.fencing_token = fencing_token
+        return lock_secret
+
+    def __getnewargs__(self):
+        return str(self), self.fencing_token
+
+
+class WormholeRateLimitResult(NamedTuple):
+    admitted_count: int
+    retry_after: float  # Seconds until the rest of the requested count may be admitted, 0 when all were admitted
+
+    @property
+    def allowed(self) -> bool:
+        return self.admitted_count > 0
+
+
+class AbstractWormholeChannel:
+    MESSAGE_FLAG_DONT_REPLY: ClassVar[int] = 1
+    # Set by senders reading replies from the signal itself, receivers don't see it
+    MESSAGE_FLAG_INLINE_REPLY: ClassVar[int] = 2
+
+    def is_open(self):
+        raise NotImplementedError()
+
+    def get_stats(self):
+        raise NotImplementedError()
+
+    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 0) -> \
+            Optional[Tuple[str, Union[str, bytes]]]:
+        raise NotImplementedError()
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 0) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        """
+        Blocks until at least one message is available and returns up to max_count messages, messages that could not
+        be decoded are returned as WormholeChannelPopError instead of raising, so the rest of the batch is not lost
+        """
+        try:
+            result = self.pop_next(wh_receiver_id, queue_names, timeout)
+        except WormholeChannelPopError as e:
+            return [e]
+        if result is None:
+            return []
+        return [result]
+
+    def requeue(self, wh_receiver_id: str, results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]):
+        """
+        Puts messages popped by the receiver back at the head of their queues, for a receiver that popped more messages
+        than it handles. Messages that could not be decoded are replied to with their error instead.
+        """
+        raise NotImplementedError()
+
+    def send(self, wh_sender_id: str, queue_name: str, data: Union[bytes, str], queue_timeout: int = None, flags: int = 0) -> str:
+        raise NotImplementedError()
+
+    def send_many(self, wh_sender_id: str, queue_name: str, datas: Iterable[Any], queue_timeout: int = None,
+                  flags: int = 0) -> List[str]:
+        """Sends all of the datas to the same queue, channels should override this with a batched implementation"""
+        return [self.send(wh_sender_id, queue_name, data, queue_timeout, flags) for data in datas]
+
+    def delete(self, message_id: str) -> None:
+        raise NotImplementedError()
+
+    def reply(self, message_id: str, data: Any, is_error: bool, timeout: int = None, wh_receiver_id: str = ""):
+        raise NotImplementedError()
+
+    def check_for_reply(self, message_id: str) -> bool:
+        raise NotImplementedError()
+
+    def wait_for_reply(self, message_id: str, timeout: int = 30) -> Tuple[bool, Any, str]:
+        """Returns tuple(isSuccess, data)"""
+        raise NotImplementedError()
+
+    def close(self):
+        raise NotImplementedError()
+
+    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
+        raise NotImplementedError()
+
+    def remove_from_groups(self, group_names: List[str], receiver_id: str):
+        raise NotImplementedError()
+
+    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0,
+             lock_timeout: int = 0) -> Optional["WormholeLockSecret"]:
+        raise NotImplementedError()
+
+    def release(self, lock_name: str, lock_secret: str, force=False):
+        raise NotImplementedError()
+
+    def rate_limit(self, limit_name: str, max_amount: int, duration: float, count: int = 1,
+                   partial: bool = False) -> WormholeRateLimitResult:
+        """
+        Admits count requests if no more than max_amount requests were admitted in the last duration seconds.
+        Nothing is admitted when not all of them can be, unless partial is set, then as many as possible are.
+        """
+        raise NotImplementedError()
+
+    def threshold_lock(self, lock_name: str, max_amount: int, duration: float):
+        return self.rate_limit(lock_name, max_amount, duration).allowed
+
+    def is_locked(self, lock_name: str):
+        raise NotImplementedError()
+
+
+class WormholeRedisChannel(AbstractWormholeChannel):
+    MESSAGE_DATA_HKEY: str = "in"
+    MESSAGE_FLAGS_KEY: str = "meta"
+    MESSAGE_RESPONSE_HKEY = "out"
+    MESSAGE_ERROR_HKEY = "err"
+    MESSAGE_WORMHOLE_RECEIVER_ID_HKEY = "hid"
+    GROUP_REGISTRY_PREFIX = "whgm://"
+    GROUP_CHANGES_CHANNEL = "whgmc://changes"
+    LOCK_PREFIX = "whlk://"
+    LOCK_SIGNAL_PREFIX = "whlks://"
+    LOCK_FENCING_PREFIX = "whlkf://"
+    LOCK_SIGNAL_TIMEOUT_MS = 10000
+    RATE_LIMIT_PREFIX = "whrl://"
+    STATS_PREFIX = "whstats://"
+    INLINE_MESSAGE_PREFIX = "whi:"
+    REPLY_INBOX_PREFIX = "whinbox://"
+    CONTENT_PREFIX = "whc://"
+    CONTENT_REFERENCE_HEADER = b"&"
+    SEND_MANY_CHUNK_SIZE = 1000
+
+    __encoder: WormholeEncoder
+    __send_timeout: int
+    __reply_expiration: int
+
+    def __init__(self, redis_uri: str = "redis://localhost:6379/1", max_connections=20, send_timeout: int = DEFAULT_MESSAGE_TIMEOUT, reply_expiration: int = DEFAULT_REPLY_TIMEOUT, redis_pool: BlockingConnectionPool = None,
+                 scripted_send: bool = True, inline_messages: bool = False, reply_inbox: bool = False,
+                 stats_flush_interval: Optional[float] = None, max_blocking_connections: Optional[int] = None,
+                 blocking_redis_pool: BlockingConnectionPool = None,
+                 redis_client: Optional[Union[redis.Redis, "redis.RedisCluster"]] = None,
+                 blocking_redis_client: Optional[Union[redis.Redis, "redis.RedisCluster"]] = None,
+                 encoder: Optional[WormholeEncoder] = None, dedup_threshold: Optional[int] = None,
+                 dedup_cache_size: int = 16, group_cache_ttl: Optional[float] = None):
+        # Short commands and blocking waits (BRPOP and friends) use separate pools so receivers and reply waiters
+        # sitting in blocking commands never hold the connections senders need
+        if redis_client is not None:
+            # A client built by the caller, e.g. a cluster client, its connections are its own business
+            redis_pool = getattr(redis_client, "connection_pool", None)
+            if blocking_redis_client is None:
+                blocking_redis_client = redis_client
+            blocking_redis_pool = getattr(blocking_redis_client, "connection_pool", None)
+        elif redis_pool is not None and blocking_redis_pool is None:
+            blocking_redis_pool = redis_pool  # A single given pool serves both
+        if redis_client is None and redis_pool is None:
+            redis_pool = WormholeConnectionPool.from_url(redis_uri, max_connections=max_connections)
+        if redis_client is None and blocking_redis_pool is None:
+            if max_blocking_connections is None:
+                max_blocking_connections = max_connections
+            # Blocking commands time out by themselves, a socket timeout would cut long waits short
+            blocking_redis_pool = WormholeConnectionPool.from_url(redis_uri, max_connections=max_blocking_connections,
+                                                                  socket_timeout=None)
+        self.__connection_pool = redis_pool
+        self.__blocking_connection_pool = blocking_redis_pool
+        self.__rdb = redis_client or redis.Redis(connection_pool=self.__connection_pool)
+        self.__blocking_rdb = blocking_redis_client or redis.Redis(connection_pool=self.__blocking_connection_pool)
+        self.__encoder = encoder or get_default_encoder()
+        self.__closed = False
+        self.__send_timeout = send_timeout
+        self.__reply_expiration = reply_expiration
+        self.__stats_recorder = WormholeStatsRecorder()
+        self.stats_enabled = True
+        # Stats are kept in process, when an interval is given they are also written to redis every interval seconds
+        self.__stats_flusher: Optional[WormholeStatsFlusher] = None
+        if stats_flush_interval:
+            self.__stats_flusher = WormholeStatsFlusher(self.__stats_recorder, self.__get_rdb, stats_flush_interval)
+            self.__stats_flusher.start()
+        # When enabled, send stores and enqueues messages in a single EVALSHA
+        self.scripted_send = scripted_send
+        # When enabled, messages are sent as a single queue entry carrying their flags, reply address and payload
+        # instead of a message hash, replies to such messages are pushed the same way. Receivers handle both formats.
+        # Note that a sender of inline messages cannot tell whether a timed out message was taken by a receiver
+        self.inline_messages = inline_messages
+        # When enabled, replies to the messages of every sender are pushed to a single inbox list of that sender and
+        # routed to their waiters locally instead of to a list per message. Implies inline messages.
+        self.reply_inbox = reply_inbox
+        self.__inboxes: Dict[str, WormholeReplyInbox] = {}
+        self.__inboxes_lock = threading.Lock()
+        # When set, encoded payloads larger than dedup_threshold bytes are stored once under the hash of their content
+        # and messages carry only the hash. Receivers keep the last dedup_cache_size contents by their hash, every
+        # message is decoded from the cached content to an object of its own.
+        self.dedup_threshold = dedup_threshold
+        self.dedup_cache_size = dedup_cache_size
+        self.__dedup_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self.__dedup_cache_lock = threading.Lock()
+        # When set, the members of groups are cached for up to group_cache_ttl seconds, joins and leaves drop them
+        self.__group_cache: Optional[WormholeGroupCache] = None
+        if group_cache_ttl:
+            self.__group_cache = WormholeGroupCache(self.GROUP_CHANGES_CHANNEL, self.__get_blocking_rdb,
+                                                    group_cache_ttl)
+
+    @property
+    def encoder(self) -> WormholeEncoder:
+        return self.__encoder
+
+    @property
+    def send_timeout(self) -> int:
+        return self.__send_timeout
+
+    @property
+    def reply_expiration(self) -> int:
+        return self.__reply_expiration
+
+    def is_open(self):
+        return not self.__closed
+
+    def __get_rdb(self) -> redis.Redis:
+        if self.__closed:
+            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+        return self.__rdb
+
+    def __get_blocking_rdb(self) -> redis.Redis:
+        if self.__closed:
+            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+        return self.__blocking_rdb
+
+    def _get_rdb(self) -> redis.Redis:
+        return self.__get_rdb()
+
+    def _get_blocking_rdb(self) -> redis.Redis:
+        return self.__get_blocking_rdb()
+
+    def get_pool_stats(self) -> Dict[str, WormholePoolStats]:
+        """Returns the connection stats of the pools of the channel, pools not created by the channel are omitted"""
+        pools = {"commands": self.__connection_pool, "blocking": self.__blocking_connection_pool}
+        return {name: pool.get_stats() for name, pool in pools.items() if isinstance(pool, WormholeConnectionPool)}
+
+    @property
+    def stats_recorder(self) -> WormholeStatsRecorder:
+        return self.__stats_recorder
+
+    def get_stats(self):
+        if not self.stats_enabled:
+            return WormholeChannelStats(-1, -1)
+        return WormholeChannelStats(*self.__stats_recorder.get_rates())
+
+    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
+        if len(group_names) == 0:
+            return
+        rdb = self.__get_rdb()
+        touch_script = get_pool_script(rdb, TOUCH_GROUPS_SCRIPT)
+        joined_count = touch_script(keys=[f"{self.GROUP_REGISTRY_PREFIX}{g}" for g in group_names],
+                                    args=[receiver_id, time.time() + timeout, math.ceil(timeout),
+                                          self.GROUP_CHANGES_CHANNEL] + group_names, client=rdb)
+        if joined_count and self.__group_cache is not None:
+            # Don't wait for our own change to be published back to us
+            self.__group_cache.invalidate(group_names)
+
+    def remove_from_groups(self, group_names: List[str], receiver_id: str):
+        if len(group_names) == 0:
+            return
+        rdb = self.__get_rdb()
+        remove_script = get_pool_script(rdb, REMOVE_FROM_GROUPS_SCRIPT)
+        remove_script(keys=[f"{self.GROUP_REGISTRY_PREFIX}{g}" for g in group_names],
+                      args=[receiver_id, self.GROUP_CHANGES_CHANNEL] + group_names, client=rdb)
+        if self.__group_cache is not None:
+            self.__group_cache.invalidate(group_names)
+
+    def find_group_members(self, group_name):
+        if self.__group_cache is not None:
+            return self.__group_cache.get(group_name, self.__fetch_group_members)
+        return self.__fetch_group_members(group_name)
+
+    def get_group_cache_stats(self) -> Optional[WormholeGroupCacheStats]:
+        """Returns the hit, miss and invalidation counts of the group members cache, None when it is disabled"""
+        if self.__group_cache is None:
+            return None
+        return self.__group_cache.get_stats()
+
+    def __fetch_group_members(self, group_name: str) -> List[str]:
+        # Members are kept in a sorted set scored by their expiration time
+        group_key = f"{self.GROUP_REGISTRY_PREFIX}{group_name}"
+        now = time.time()
+        transaction = self.__get_rdb().pipeline()
+        transaction.zremrangebyscore(group_key, "-inf", now)
+        transaction.zrangebyscore(group_key, now, "+inf")
+        _, members = transaction.execute()
+        return [m.decode() for m in members]
+
+    def send(self, wh_sender_id: str, queue_name: str, data: Any,
+             queue_timeout: int = None, flags: int = 0) -> str:
+        return self.send_many(wh_sender_id, queue_name, [data], queue_timeout, flags)[0]
+
+    def send_many(self, wh_sender_id: str, queue_name: str, datas: Iterable[Any],
+                  queue_timeout: int = None, flags: int = 0) -> List[str]:
+        if queue_timeout is None:
+            queue_timeout = self.__send_timeout
+        actual_timeout = queue_timeout + 2
+        message_ids: List[str] = []
+        encoded_datas: List[bytes] = []
+        stored_content_hashes: Set[str] = set()
+        for data in datas:
+            encoded_data = self.__encoder.encode_for_queue(data, queue_name)
+            if self.dedup_threshold is not None and len(encoded_data) > self.dedup_threshold:
+                encoded_data = self.__store_content(encoded_data, actual_timeout, stored_content_hashes)
+            if self.reply_inbox:
+                # The reply inbox of the sender followed by a correlation id
+                message_id = f"{self.REPLY_INBOX_PREFIX}{wh_sender_id}#{generate_uid()}"
+                encoded_data = pack_inline_message(flags, time.time() + actual_timeout, message_id, encoded_data)
+            elif self.inline_messages:
+                # The message id of an inline message is also the address of the list its reply is pushed to
+                message_id = f"{self.INLINE_MESSAGE_PREFIX}{generate_uid()}"
+                encoded_data = pack_inline_message(flags, time.time() + actual_timeout, message_id, encoded_data)
+            else:
+                message_id = self._generate_message_id(queue_name)
+            message_ids.append(message_id)
+            encoded_datas.append(encoded_data)
+        if len(message_ids) == 0:
+            return message_ids
+        rdb = self.__get_rdb()
+        if self.scripted_send:
+            for chunk_start in range(0, len(message_ids), self.SEND_MANY_CHUNK_SIZE):
+                chunk_end = chunk_start + self.SEND_MANY_CHUNK_SIZE
+                self.__send_scripted(rdb, message_ids[chunk_start:chunk_end], queue_name,
+                                     encoded_datas[chunk_start:chunk_end], flags | self.MESSAGE_FLAG_INLINE_REPLY,
+                                     actual_timeout)
+        else:
+            self.__send_pipelined(rdb, message_ids, queue_name, encoded_datas,
+                                  flags | self.MESSAGE_FLAG_INLINE_REPLY, actual_timeout)
+        if self.stats_enabled:
+            self.__stats_recorder.record_sends(wh_sender_id, len(message_ids))
+        return message_ids
+
+    def __store_content(self, encoded_data: bytes, expiration: int, stored_content_hashes: Set[str]) -> bytes:
+        """Stores the content unless it is already stored and returns the reference to send instead of it"""
+        content_hash = hashlib.blake2b(encoded_data, digest_size=16).hexdigest()
+        if content_hash not in stored_content_hashes:
+            content_key = f"{self.CONTENT_PREFIX}{content_hash}"
+            rdb = self.__get_rdb()
+            touch_script = get_pool_script(rdb, TOUCH_CONTENT_SCRIPT)
+            # Content outlives every message referencing it, a stored copy is only kept alive
+            if not touch_script(keys=[content_key], args=[expiration * 1000], client=rdb):
+                rdb.set(content_key, encoded_data, ex=expiration)
+            stored_content_hashes.add(content_hash)
+        return self.CONTENT_REFERENCE_HEADER + content_hash.encode()
+
+    def __decode_payload(self, rdb: redis.Redis, encoded_data: bytes) -> Any:
+        if encoded_data[:1] != self.CONTENT_REFERENCE_HEADER:
+            return self.__encoder.decode(encoded_data)
+        content_hash = bytes(encoded_data[1:]).decode()
+        with self.__dedup_cache_lock:
+            content = self.__dedup_cache.get(content_hash)
+            if content is not None:
+                self.__dedup_cache.move_to_end(content_hash)
+        if content is None:
+            content = rdb.get(f"{self.CONTENT_PREFIX}{content_hash}")
+            if content is None:
+                raise WormholeDecodeError(f"Content {content_hash} referenced by the message has expired")
+            if self.dedup_cache_size > 0:
+                with self.__dedup_cache_lock:
+                    self.__dedup_cache[content_hash] = content
+                    while len(self.__dedup_cache) > self.dedup_cache_size:
+                        self.__dedup_cache.popitem(last=False)
+        # Handlers may modify their payload, the cached content is never handed out
+        return self.__encoder.decode(content)
+
+    def _generate_message_id(self, queue_name: str) -> str:
+        """The id, and key, of the hash of a message sent to the queue"""
+        return f"wh:{generate_uid()}"
+
+    def __send_pipelined(self, rdb: redis.Redis, message_ids: List[str], queue_name: str,
+                         encoded_datas: List[bytes], flags: int, expiration: int):
+        transaction = rdb.pipeline()
+        if self.__sends_inline_messages():
+            transaction.lpush(queue_name, *encoded_datas)
+        else:
+            encoded_flags = str(flags).encode('utf-8')
+            for message_id, encoded_data in zip(message_ids, encoded_datas):
+                transaction.hset(message_id, self.MESSAGE_DATA_HKEY, encoded_data)
+                transaction.hset(message_id, self.MESSAGE_FLAGS_KEY, encoded_flags)
+                transaction.expire(message_id, expiration)
+            transaction.lpush(queue_name, *message_ids)
+        transaction.expire(queue_name, expiration)
+        transaction.execute()
+
+    def __send_scripted(self, rdb: redis.Redis, message_ids: List[str], queue_name: str,
+                        encoded_datas: List[bytes], flags: int, expiration: int):
+        if self.__sends_inline_messages():
+            send_script = get_pool_script(rdb, SEND_INLINE_SCRIPT)
+            send_script(keys=[queue_name], args=[expiration] + encoded_datas, client=rdb)
+        else:
+            send_script = get_pool_script(rdb, SEND_SCRIPT)
+            send_script(keys=[queue_name] + message_ids,
+                        args=[self.MESSAGE_DATA_HKEY, self.MESSAGE_FLAGS_KEY, flags, expiration] + encoded_datas,
+                        client=rdb)
+
+    def __sends_inline_messages(self) -> bool:
+        return self.inline_messages or self.reply_inbox
+
+    def __get_response_queue(self, message_id: str) -> str:
+        if self.__is_inbox_message_id(message_id):
+            return message_id.rpartition("#")[0]
+        if self.__is_inline_message_id(message_id):
+            return message_id
+        return "response:" + message_id
+
+    def __is_inline_message_id(self, message_id: str) -> bool:
+        return message_id.startswith(self.INLINE_MESSAGE_PREFIX) or self.__is_inbox_message_id(message_id)
+
+    def __is_inbox_message_id(self, message_id: str) -> bool:
+        return message_id.startswith(self.REPLY_INBOX_PREFIX)
+
+    def __get_inbox(self, message_id: str) -> WormholeReplyInbox:
+        inbox_key = self.__get_response_queue(message_id)
+        with self.__inboxes_lock:
+            inbox = self.__inboxes.get(inbox_key)
+            if inbox is None:
+                inbox = WormholeReplyInbox(inbox_key, self.__get_blocking_rdb, self.__reply_expiration)
+                self.__inboxes[inbox_key] = inbox
+            return inbox
+
+    def __decode_inline_reply(self, entry: bytes) -> Tuple[bool, Any, str]:
+        inline_reply = unpack_inline_reply(entry)
+        reply_data = None
+        if inline_reply.data is not None:
+            reply_data = self.__encoder.decode(inline_reply.data)
+        return not inline_reply.is_error, reply_data, inline_reply.receiver_id
+
+    def check_for_reply(self, message_id: str):
+        if self.__is_inbox_message_id(message_id):
+            return self.__get_inbox(message_id).has_reply(message_id)
+        response_queue = self.__get_response_queue(message_id)
+        rdb = self.__get_rdb()
+        return rdb.llen(response_queue) > 0
+
+    def wait_for_reply(self, message_id: str, timeout: int = DEFAULT_MESSAGE_TIMEOUT) -> Tuple[bool, Any, str]:
+        if self.__is_inbox_message_id(message_id):
+            entry = self.__get_inbox(message_id).wait(message_id, timeout)
+            if entry is None:
+                return False, WormholeWaitForReplyError(f"Message timed out, no reply received for message {message_id}"), ""
+            return self.__decode_inline_reply(entry)
+        response_queue = self.__get_response_queue(message_id)
+        rdb = self.__get_rdb()
+        result = self.__get_blocking_rdb().brpop(response_queue, timeout)
+        if result and is_inline_entry(result[1]):
+            # The signal carries the whole reply and the receiver already deleted the message hash
+            return self.__decode_inline_reply(result[1])
+        if self.__is_inline_message_id(message_id):
+            return False, WormholeWaitForReplyError(f"Message timed out, no reply received for message {message_id}"), ""
+        if not result:
+            receiver_id = rdb.hget(message_id, self.MESSAGE_WORMHOLE_RECEIVER_ID_HKEY)
+            if receiver_id is None:
+                return False, WormholeWaitForReplyError(f"Message timed out, no handlers found for message {message_id}"), ""
+            return False, WormholeWaitForReplyError(f"Timeout waiting for results from {receiver_id.decode()}"), ""
+        # A plain signal, the reply was stored in the message hash by an older receiver
+        transaction = rdb.pipeline()
+        transaction.hmget(message_id, self.MESSAGE_RESPONSE_HKEY, self.MESSAGE_ERROR_HKEY,
+                          self.MESSAGE_WORMHOLE_RECEIVER_ID_HKEY)
+        transaction.delete(message_id)
+        (data, error, receiver_id), _ = transaction.execute()
+        if isinstance(receiver_id, bytes):
+            receiver_id = receiver_id.decode()
+        if error is not None:
+            return False, self.__encoder.decode(error), receiver_id
+        if data is None:
+            return True, None, receiver_id
+        return True, self.__encoder.decode(data), receiver_id
+
+    def delete(self, message_id):
+        if self.__is_inbox_message_id(message_id):
+            return  # Nothing is stored per message
+        self.__get_rdb().delete(message_id)
+
+    def reply(self, message_id: str, data: Any, is_error: bool,
+              timeout: int = None, wh_receiver_id: str = ""):
+        if not timeout:
+            timeout = self.__reply_expiration
+        try:
+            response_queue = self.__get_response_queue(message_id)
+            rdb = self.__get_rdb()
+            encoded_data = None
+            if data is not None:
+                encoded_data = self.__encoder.encode(data)
+            if not wh_receiver_id and not self.__is_inline_message_id(message_id):
+                # The hash is deleted below, take the receiver id popping the message tagged it with
+                receiver_id = rdb.hget(message_id, self.MESSAGE_WORMHOLE_RECEIVER_ID_HKEY)
+                if receiver_id is not None:
+                    wh_receiver_id = receiver_id.decode()
+            if not self.__is_inline_message_id(message_id):
+                # Only senders flagging the message read the reply from the signal, the script checks the flag
+                reply_header = pack_inline_reply(wh_receiver_id, None if encoded_data is None else b"", is_error)
+                args = [self.MESSAGE_FLAGS_KEY, self.MESSAGE_FLAG_INLINE_REPLY, timeout, reply_header,
+                        self.MESSAGE_ERROR_HKEY if is_error else self.MESSAGE_RESPONSE_HKEY,
+                        "error" if is_error else "handled"]
+                if encoded_data is not None:
+                    args.append(encoded_data)
+                reply_script = get_pool_script(rdb, REPLY_SCRIPT)
+                reply_script(keys=[message_id, response_queue], args=args, client=rdb)
+                return
+            # The reply travels in the signal itself so the sender gets it with a single BRPOP
+            reply_entry = pack_inline_reply(wh_receiver_id, encoded_data, is_error)
+            if self.__is_inbox_message_id(message_id):
+                reply_entry = pack_inbox_reply(message_id, reply_entry)
+            transaction = rdb.pipeline()
+            transaction.lpush(response_queue, reply_entry)
+            transaction.expire(response_queue, timeout)
+            transaction.execute()
+        except redis.exceptions.ConnectionError as e:
+            if self.__closed:
+                raise WormholeChannelClosedError("Cannot reply using a closed channel")
+            raise WormholeChannelConnectionError(f"Connection error during reply: {e}")
+
+    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 5) -> Optional[
+        Tuple[str, str, Any, int]]:
+        results = self.pop_many(wh_receiver_id, queue_names, 1, timeout)
+        if len(results) == 0:
+            return None
+        if isinstance(results[0], WormholeChannelPopError):
+            raise results[0]
+        return results[0]
+
+    def requeue(self, wh_receiver_id: str, results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]):
+        transaction = self.__get_rdb().pipeline()
+        expiration = self.__send_timeout + 2
+        for result in reversed(results):
+            if isinstance(result, WormholeChannelPopError):
+                queue_name, message_id = result.result_queue_name, result.result_message_id
+            else:
+                queue_name, message_id = result[0], result[1]
+            if not self.__is_inline_message_id(message_id):
+                # The hash of the message is still there, BRPOP takes the pushed id next
+                transaction.rpush(queue_name, message_id)
+            elif isinstance(result, WormholeChannelPopError):
+                # The entry of an inline message is gone along with its undecodable payload
+                self.reply(message_id, ValueError(str(result)), True, wh_receiver_id=wh_receiver_id)
+                continue
+            else:
+                # The entry is packed again from the decoded payload, its expiration starts over
+                encoded_data = self.__encoder.encode_for_queue(result[2], queue_name)
+                transaction.rpush(queue_name, pack_inline_message(result[3], time.time() + expiration, message_id,
+                                                                  encoded_data))
+            transaction.expire(queue_name, expiration)
+        transaction.execute()
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 5) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        rdb = self.__get_rdb()
+        random.shuffle(queue_names)
+        result: Optional[Tuple[bytes, bytes]] = self.__get_blocking_rdb().brpop(queue_names, timeout)
+        did_timeout = result is None
+        if did_timeout:
+            return []
+        if self.__closed:
+            # The channel was closed while the pop was blocked, the message is left for the next receiver
+            self.__blocking_rdb.rpush(*result)
+            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+        popped_entries: List[Tuple[bytes, bytes]] = [result]
+        if max_count > 1:
+            drain_script = get_pool_script(rdb, DRAIN_SCRIPT)
+            drained = drain_script(keys=queue_names, args=[max_count - 1], client=rdb)
+            popped_entries.extend(zip(drained[::2], drained[1::2]))
+
+        # Inline entries carry the whole message, only plain message ids need their hash fetched
+        hash_message_ids = [entry.decode() for _, entry in popped_entries if not is_inline_entry(entry)]
+        hash_payloads: Dict[str, Dict[bytes, bytes]] = {}
+        if len(hash_message_ids) > 0:
+            fetch_script = get_pool_script(rdb, FETCH_AND_TAG_SCRIPT)
+            fetch_result = fetch_script(keys=hash_message_ids,
+                                        args=[self.MESSAGE_WORMHOLE_RECEIVER_ID_HKEY, wh_receiver_id],
+                                        client=rdb)
+            for message_id, flat_payload in zip(hash_message_ids, fetch_result):
+                hash_payloads[message_id] = dict(zip(flat_payload[::2], flat_payload[1::2]))
+
+        results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]] = []
+        now = time.time()
+        for result_queue_name, entry in popped_entries:
+            result_queue_name = result_queue_name.decode()
+            if is_inline_entry(entry):
+                inline_message = unpack_inline_message(entry)
+                if inline_message.expires_at < now:
+                    continue  # stale message, the sender already gave up on it
+                result_message_id = inline_message.reply_address
+                flags = inline_message.flags
+                encoded_data = inline_message.data
+            else:
+                result_message_id = entry.decode()
+                result_payload = hash_payloads[result_message_id]
+                # If the queued message already expired - skip it
+                if self.MESSAGE_DATA_HKEY.encode() not in result_payload:
+                    continue  # empty stale message
+                if self.MESSAGE_FLAGS_KEY.encode() in result_payload:
+                    flags = int(result_payload[self.MESSAGE_FLAGS_KEY.encode()].decode('utf-8')) & \
+                            ~self.MESSAGE_FLAG_INLINE_REPLY
+                else:
+                    flags = 0
+                encoded_data = result_payload[self.MESSAGE_DATA_HKEY.encode()]
+            try:
+                message_data = self.__decode_payload(rdb, encoded_data)
+                results.append((result_queue_name, result_message_id, message_data, flags))
+            except WormholeDecodeError as e:
+                results.append(WormholeChannelPopError(result_queue_name, result_message_id, str(e), e))
+        if self.stats_enabled and len(results) > 0:
+            self.__stats_recorder.record_receives(wh_receiver_id, len(results))
+        return results
+
+    def close(self):
+        self.__closed = True
+        if self.__stats_flusher is not None:
+            self.__stats_flusher.stop()
+        if self.__group_cache is not None:
+            self.__group_cache.close()
+        with self.__inboxes_lock:
+            for inbox in self.__inboxes.values():
+                inbox.close()
+        for rdb in {self.__rdb, self.__blocking_rdb}:
+            rdb.close()
+        for pool in {self.__connection_pool, self.__blocking_connection_pool}:
+            if pool is not None:
+                pool.disconnect()
+
+    def rate_limit(self, limit_name: str, max_amount: int, duration: float, count: int = 1,
+                   partial: bool = False) -> WormholeRateLimitResult:
+        assert duration > 0, "'duration' must be positive"
+        assert 1 <= count <= max_amount, "'count' must be between 1 and 'max_amount'"
+        duration_ms = duration * 1000
+        rdb = self.__get_rdb()
+        rate_limit_script = get_pool_script(rdb, RATE_LIMIT_SCRIPT)
+        admitted_count, retry_after_ms = rate_limit_script(keys=[f"{self.RATE_LIMIT_PREFIX}{limit_name}"],
+                                                           args=[duration_ms / max_amount, duration_ms, count,
+                                                                 int(partial)], client=rdb)
+        return WormholeRateLimitResult(admitted_count, retry_after_ms / 1000)
+
+    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0,
+             lock_timeout: int = 0) -> Optional[WormholeLockSecret]:
+        lock_secret = generate_uid()
+        rdb = self.__get_rdb()
+        acquire_script = get_pool_script(rdb, ACQUIRE_LOCK_SCRIPT)
+        keys = [self.__get_lock_key(lock_name), f"{self.LOCK_FENCING_PREFIX}{lock_name}"]
+        lock_timeout_ms = max(1, int(lock_timeout * 1000)) if lock_timeout > 0 else 0
+        deadline = None
+        if block_timeout:
+            deadline = time.time() + block_timeout
+        while True:
+            is_acquired, value = acquire_script(keys=keys, args=[lock_secret, lock_timeout_ms], client=rdb)
+            if is_acquired:
+                return WormholeLockSecret(lock_secret, value)
+            if not block:
+                return None
+            # Wait for a release signal, but never longer than the lock has to live
+            wait_timeout = 0
+            if deadline is not None:
+                wait_timeout = deadline - time.time()
+                # Redis takes timeouts under a millisecond for 0 and would block forever
+                if wait_timeout < 0.001:
+                    return None  # Timeout
+            if value > 0 and (wait_timeout == 0 or value / 1000 < wait_timeout):
+                wait_timeout = value / 1000
+            self.__get_blocking_rdb().brpop(self.__get_lock_signal_key(lock_name), timeout=wait_timeout)
+
+    def release(self, lock_name: str, lock_secret: str, force=False):
+        rdb = self.__get_rdb()
+        release_script = get_pool_script(rdb, RELEASE_LOCK_SCRIPT)
+        result = release_script(keys=[self.__get_lock_key(lock_name), self.__get_lock_signal_key(lock_name)],
+                                args=[lock_secret, int(force), self.LOCK_SIGNAL_TIMEOUT_MS], client=rdb)
+        if result < 0:
+            raise KeyError("Invalid lock secret, not the owner of this lock")
+        return result > 0
+
+    def is_locked(self, lock_name: str):
+        key = self.__get_lock_key(lock_name)
+        return self.__get_rdb().exists(key) > 0
+
+    def __get_lock_key(self, lock_name: str):
+        return f"{self.LOCK_PREFIX}{lock_name}"
+
+    def __get_lock_signal_key(self, lock_name: str):
+        return f"{self.LOCK_SIGNAL_PREFIX}{lock_name}"
+
+
+def create_default_channel():
+    return WormholeRedisChannel()
@@ -0,0 +1,124 @@
+﻿from typing import *
+
+from redis.cluster import RedisCluster
+from redis.crc import key_slot
+
+from ..channel import WormholeRedisChannel, WormholeLockSecret
+from ..encoding.base import WormholeEncoder
+from ..error import WormholeChannelPopError
+from ..pool import WormholeConnectionPool, WormholePoolStats
+from ..registry import DEFAULT_MESSAGE_TIMEOUT, DEFAULT_REPLY_TIMEOUT
+from ..utils import generate_uid
+from .concurrent_pop import WormholeConcurrentPop
+
+
+def get_hash_tag(key: str) -> str:
+    """The part of the key redis cluster hashes to find its slot"""
+    tag_start = key.find("{")
+    if tag_start >= 0:
+        tag_end = key.find("}", tag_start + 1)
+        if tag_end > tag_start + 1:
+            return key[tag_start + 1:tag_end]
+    return key
+
+
+class WormholeRedisClusterChannel(WormholeRedisChannel):
+    """
+    A redis channel for redis cluster. Queues spread across the nodes by their names, the hash of every message is
+    hash tagged into the slot of its queue and the keys of every lock into a single slot, so every script and
+    transaction runs on a single node.
+    A single blocking pop only covers queues of one slot, receivers of queues in several slots block on every slot
+    at once.
+    """
+
+    def __init__(self, redis_uri: str = "redis://localhost:7000", max_connections=20,
+                 send_timeout: int = DEFAULT_MESSAGE_TIMEOUT, reply_expiration: int = DEFAULT_REPLY_TIMEOUT,
+                 scripted_send: bool = True, inline_messages: bool = False, reply_inbox: bool = False,
+                 stats_flush_interval: Optional[float] = None, max_blocking_connections: Optional[int] = None,
+                 encoder: Optional[WormholeEncoder] = None, dedup_threshold: Optional[int] = None,
+                 dedup_cache_size: int = 16, group_cache_ttl: Optional[float] = None):
+        if max_blocking_connections is None:
+            max_blocking_connections = max_connections
+        # Every node gets a pool of each kind, blocking waits time out by themselves
+        redis_client = RedisCluster.from_url(redis_uri, max_connections=max_connections,
+                                             connection_pool_class=WormholeConnectionPool)
+        blocking_redis_client = RedisCluster.from_url(redis_uri, max_connections=max_blocking_connections,
+                                                      connection_pool_class=WormholeConnectionPool,
+                                                      socket_timeout=None)
+        super().__init__(redis_uri, max_connections, send_timeout, reply_expiration, scripted_send=scripted_send,
+                         inline_messages=inline_messages, reply_inbox=reply_inbox,
+                         stats_flush_interval=stats_flush_interval, redis_client=redis_client,
+                         blocking_redis_client=blocking_redis_client, encoder=encoder,
+                         dedup_threshold=dedup_threshold, dedup_cache_size=dedup_cache_size,
+                         group_cache_ttl=group_cache_ttl)
+        self.__concurrent_pop = WormholeConcurrentPop(self.__pop_slot, self.__requeue_slot)
+
+    def get_pool_stats(self) -> Dict[str, WormholePoolStats]:
+        """Returns the connection stats of the pools of every node, keyed by <pool kind>:<node name>"""
+        result: Dict[str, WormholePoolStats] = {}
+        for pool_kind, rdb in (("commands", self._get_rdb()), ("blocking", self._get_blocking_rdb())):
+            for node in rdb.get_nodes():
+                if node.redis_connection is None:
+                    continue
+                pool = node.redis_connection.connection_pool
+                if isinstance(pool, WormholeConnectionPool):
+                    result[f"{pool_kind}:{node.name}"] = pool.get_stats()
+        return result
+
+    def _generate_message_id(self, queue_name: str) -> str:
+        # The send script and the reply transaction touch the message hash along with the queue
+        return f"wh:{{{get_hash_tag(queue_name)}}}{generate_uid()}"
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 5) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        queue_names_by_slot: Dict[int, List[str]] = {}
+        for queue_name in queue_names:
+            queue_names_by_slot.setdefault(key_slot(queue_name.encode()), []).append(queue_name)
+        if len(queue_names_by_slot) == 1:
+            return super().pop_many(wh_receiver_id, queue_names, max_count, timeout)
+        return self.__concurrent_pop.pop_many(wh_receiver_id, queue_names_by_slot, max_count, timeout)
+
+    def __pop_slot(self, slot: int, wh_receiver_id: str, queue_names: List[str], max_count: int,
+                   timeout: float) -> List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        return super().pop_many(wh_receiver_id, queue_names, max_count, timeout)
+
+    def __requeue_slot(self, slot: int, wh_receiver_id: str,
+                       results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]):
+        self.requeue(wh_receiver_id, results)
+
+    def close(self):
+        if not self.is_open():
+            return
+        node_pools = [node.redis_connection.connection_pool
+                      for rdb in (self._get_rdb(), self._get_blocking_rdb()) for node in rdb.get_nodes()
+                      if node.redis_connection is not None]
+        super().close()
+        # Closing the cluster clients leaves the connections in use open, pops blocked on them would take messages
+        # nobody reads anymore
+        for pool in node_pools:
+            pool.disconnect()
+        self.__concurrent_pop.close()
+
+    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
+        # Groups live in different slots, touch every one of them by itself
+        for group_name in group_names:
+            super().touch_for_groups([group_name], receiver_id, timeout)
+
+    def remove_from_groups(self, group_names: List[str], receiver_id: str):
+        for group_name in group_names:
+            super().remove_from_groups([group_name], receiver_id)
+
+    @staticmethod
+    def __get_tagged_lock_name(lock_name: str) -> str:
+        # The lock, its fencing counter and its release signal share a slot
+        return f"{{{lock_name}}}"
+
+    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0,
+             lock_timeout: int = 0) -> Optional[WormholeLockSecret]:
+        return super().lock(self.__get_tagged_lock_name(lock_name), block, block_timeout, lock_timeout)
+
+    def release(self, lock_name: str, lock_secret: str, force=False):
+        return super().release(self.__get_tagged_lock_name(lock_name), lock_secret, force)
+
+    def is_locked(self, lock_name: str):
+        return super().is_locked(self.__get_tagged_lock_name(lock_name))
@@ -0,0 +1,433 @@
+﻿import os
+import sys
+import queue
+import pickle
+import socket
+import struct
+import tempfile
+import threading
+import socketserver
+
+from multiprocessing import shared_memory, resource_tracker
+
+from typing import *
+
+from ..channel import AbstractWormholeChannel, WormholeChannelStats, WormholeRateLimitResult
+from ..encoding.base import WormholeEncoder
+from ..error import WormholeChannelClosedError, WormholeChannelConnectionError, WormholeDecodeError, \
+    WormholeChannelPopError
+from ..stats import WormholeStatsRecorder
+from ..registry import DEFAULT_MESSAGE_TIMEOUT, DEFAULT_REPLY_TIMEOUT, get_default_encoder
+from .channel_memory import WormholeMemoryChannel, WormholeMemoryStore
+
+# In a directory private to the user, other users can neither connect nor put a socket of their own in its place
+DEFAULT_SOCKET_PATH = os.path.join(tempfile.gettempdir(), f"wormhole-{os.getuid()}", "wormhole.sock")
+
+__FRAME_HEADER_STRUCT = struct.Struct("!I")
+
+# The channel methods a client may call on the broker
+_BROKER_METHODS = frozenset([
+    "send_many", "pop_many", "reply", "delete", "check_for_reply", "wait_for_reply",
+    "touch_for_groups", "remove_from_groups", "find_group_members", "lock", "release", "is_locked",
+    "rate_limit", "requeue"
+])
+
+
+class WormholeIpcSharedPayload(NamedTuple):
+    """Sent to the broker instead of a large payload, the payload itself waits in a shared memory segment"""
+    name: str
+    size: int
+
+
+def _send_frame(sock: socket.socket, obj: Any):
+    frame = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(__FRAME_HEADER_STRUCT.pack(len(frame)) + frame)
+
+
+def _recv_exact(sock: socket.socket, size: int) -> Optional[bytes]:
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return bytes(data)
+
+
+def _recv_frame(sock: socket.socket) -> Any:
+    """Returns the next object sent on the socket, raises EOFError when the other side closed the connection"""
+    header = _recv_exact(sock, __FRAME_HEADER_STRUCT.size)
+    if header is None:
+        raise EOFError("Connection closed")
+    frame_size, = __FRAME_HEADER_STRUCT.unpack(header)
+    frame = _recv_exact(sock, frame_size)
+    if frame is None:
+        raise EOFError("Connection closed")
+    return pickle.loads(frame)
+
+
+def __untrack_shared_memory(shm: shared_memory.SharedMemory):
+    # The creating process must not unlink the segment when it exits, the receiver owns it from now on
+    resource_tracker.unregister(shm._name, "shared_memory")
+
+
+def share_payload(data: bytes) -> WormholeIpcSharedPayload:
+    shm = shared_memory.SharedMemory(create=True, size=len(data))
+    try:
+        shm.buf[:len(data)] = data
+    finally:
+        __untrack_shared_memory(shm)
+        shm.close()
+    return WormholeIpcSharedPayload(shm.name, len(data))
+
+
+def take_shared_payload(payload: WormholeIpcSharedPayload) -> bytes:
+    """Reads the payload and frees its shared memory segment, a shared payload can only be taken once"""
+    shm = shared_memory.SharedMemory(payload.name)
+    try:
+        return bytes(shm.buf[:payload.size])
+    finally:
+        shm.close()
+        shm.unlink()
+
+
+def unlink_shared_payload(payload: WormholeIpcSharedPayload):
+    try:
+        shm = shared_memory.SharedMemory(payload.name)
+    except FileNotFoundError:
+        return  # already taken
+    shm.close()
+    shm.unlink()
+
+
+class _WormholeIpcStore(WormholeMemoryStore):
+    def on_data_dropped(self, data: Any):
+        if isinstance(data, WormholeIpcSharedPayload):
+            unlink_shared_payload(data)
+
+
+class _WormholeIpcRequestHandler(socketserver.BaseRequestHandler):
+    server: "_WormholeIpcServer"
+
+    def setup(self):
+        with self.server.connections_lock:
+            self.server.connections.add(self.request)
+
+    def finish(self):
+        with self.server.connections_lock:
+            self.server.connections.discard(self.request)
+
+    def handle(self):
+        channel = self.server.channel
+        while True:
+            try:
+                method_name, args = _recv_frame(self.request)
+            except (EOFError, OSError):
+                return
+            try:
+                if method_name not in _BROKER_METHODS:
+                    raise AttributeError(f"Unknown broker method: {method_name}")
+                response = (True, getattr(channel, method_name)(*args))
+            except Exception as e:
+                response = (False, e)
+            try:
+                _send_frame(self.request, response)
+            except OSError:
+                return
+
+
+class _WormholeIpcServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+    block_on_close = False
+    channel: WormholeMemoryChannel
+
+    def __init__(self, socket_path: str, channel: WormholeMemoryChannel):
+        super().__init__(socket_path, _WormholeIpcRequestHandler)
+        self.channel = channel
+        self.connections: Set[socket.socket] = set()
+        self.connections_lock = threading.Lock()
+
+    def server_bind(self):
+        super().server_bind()
+        # Frames are unpickled, only the user may connect. Nobody can connect before the server listens
+        os.chmod(self.server_address, 0o600)
+
+    def close_connections(self):
+        with self.connections_lock:
+            connections = list(self.connections)
+        for connection in connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class WormholeIpcBroker:
+    """
+    Holds the queues, replies, groups and locks of all the WormholeIpcChannel instances connected to its unix
+    socket, run one per host with start() or with: python -m wormhole.channel_implementations.channel_ipc [path]
+    Only the user running the broker may connect to its socket, a broker does not start on the socket of another
+    running broker.
+    """
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, send_timeout: int = DEFAULT_MESSAGE_TIMEOUT,
+                 reply_expiration: int = DEFAULT_REPLY_TIMEOUT):
+        self.__socket_path = socket_path
+        self.__channel = WormholeMemoryChannel(_WormholeIpcStore(), send_timeout, reply_expiration,
+                                               encode_payloads=False)
+        self.__server: Optional[_WormholeIpcServer] = None
+        self.__thread: Optional[threading.Thread] = None
+
+    @property
+    def socket_path(self) -> str:
+        return self.__socket_path
+
+    def __create_server(self):
+        if self.__server is not None:
+            raise RuntimeError("Broker already running")
+        socket_directory = os.path.dirname(self.__socket_path)
+        if socket_directory:
+            os.makedirs(socket_directory, mode=0o700, exist_ok=True)
+        if self.__socket_path == DEFAULT_SOCKET_PATH:
+            directory_stat = os.stat(socket_directory)
+            if directory_stat.st_uid != os.getuid() or directory_stat.st_mode & 0o077:
+                raise RuntimeError(f"Socket directory {socket_directory} is not private to the user")
+        if os.path.exists(self.__socket_path):
+            if self.__is_broker_listening():
+                raise RuntimeError(f"Another broker is listening on {self.__socket_path}")
+            os.unlink(self.__socket_path)  # left behind by a broker that did not stop cleanly
+        self.__server = _WormholeIpcServer(self.__socket_path, self.__channel)
+
+    def __is_broker_listening(self) -> bool:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.__socket_path)
+            return True
+        except OSError:
+            return False
+        finally:
+            sock.close()
+
+    def start(self):
+        self.__create_server()
+        self.__thread = threading.Thread(target=self.__server.serve_forever, daemon=True)
+        self.__thread.start()
+
+    def serve_forever(self):
+        self.__create_server()
+        self.__server.serve_forever()
+
+    def stop(self):
+        if self.__server is None:
+            return
+        self.__server.shutdown()
+        self.__server.server_close()
+        # Closing the channel wakes up the requests blocked on it, their clients will see a closed connection
+        self.__channel.close()
+        self.__server.close_connections()
+        self.__server = None
+        if self.__thread is not None:
+            self.__thread.join()
+            self.__thread = None
+        if os.path.exists(self.__socket_path):
+            os.unlink(self.__socket_path)
+
+
+class WormholeIpcChannel(AbstractWormholeChannel):
+    """
+    A channel for wormholes on the same host, talks to a WormholeIpcBroker over a unix socket.
+    Payloads larger than shared_memory_threshold bytes are passed in shared memory segments, only a reference to the
+    segment goes through the broker.
+    """
+    SHARED_MEMORY_THRESHOLD = 64 * 1024
+    __encoder: WormholeEncoder
+
+    def __init__(self, socket_path: str = DEFAULT_SOCKET_PATH, max_connections=20,
+                 send_timeout: int = DEFAULT_MESSAGE_TIMEOUT, reply_expiration: int = DEFAULT_REPLY_TIMEOUT,
+                 shared_memory_threshold: int = SHARED_MEMORY_THRESHOLD, encoder: Optional[WormholeEncoder] = None):
+        self.__socket_path = socket_path
+        self.__send_timeout = send_timeout
+        self.__reply_expiration = reply_expiration
+        self.shared_memory_threshold = shared_memory_threshold
+        self.__encoder = encoder or get_default_encoder()
+        self.__closed = False
+        self.__idle_connections: "queue.LifoQueue[socket.socket]" = queue.LifoQueue()
+        self.__connection_semaphore = threading.BoundedSemaphore(max_connections)
+        self.__connections: Set[socket.socket] = set()
+        self.__connections_lock = threading.Lock()
+        self.__stats_recorder = WormholeStatsRecorder()
+        self.stats_enabled = True
+
+    @property
+    def stats_recorder(self) -> WormholeStatsRecorder:
+        return self.__stats_recorder
+
+    def is_open(self):
+        return not self.__closed
+
+    def close(self):
+        self.__closed = True
+        with self.__connections_lock:
+            connections = list(self.__connections)
+            self.__connections.clear()
+        for connection in connections:
+            # Shutting down wakes up the calls blocked on the connection
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            connection.close()
+
+    def __get_connection(self) -> socket.socket:
+        try:
+            return self.__idle_connections.get_nowait()
+        except queue.Empty:
+            pass
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            connection.connect(self.__socket_path)
+        except OSError as e:
+            connection.close()
+            raise WormholeChannelConnectionError(f"Cannot connect to the wormhole broker at {self.__socket_path}: {e}")
+        with self.__connections_lock:
+            self.__connections.add(connection)
+        return connection
+
+    def __discard_connection(self, connection: socket.socket):
+        with self.__connections_lock:
+            self.__connections.discard(connection)
+        connection.close()
+
+    def __call(self, method_name: str, *args) -> Any:
+        if self.__closed:
+            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+        with self.__connection_semaphore:
+            connection = self.__get_connection()
+            try:
+                _send_frame(connection, (method_name, args))
+                is_success, result = _recv_frame(connection)
+            except (OSError, EOFError) as e:
+                self.__discard_connection(connection)
+                if self.__closed:
+                    raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+                raise WormholeChannelConnectionError(f"Connection error during {method_name}: {e}")
+            self.__idle_connections.put(connection)
+        if not is_success:
+            if isinstance(result, WormholeChannelClosedError):
+                raise WormholeChannelConnectionError("The wormhole broker was stopped")
+            raise result
+        return result
+
+    def __encode(self, data: Any, queue_name: Optional[str] = None) -> Union[bytes, WormholeIpcSharedPayload]:
+        encoded_data = self.__encoder.encode_for_queue(data, queue_name)
+        if len(encoded_data) >= self.shared_memory_threshold:
+            return share_payload(encoded_data)
+        return encoded_data
+
+    def __decode(self, data: Union[bytes, WormholeIpcSharedPayload]) -> Any:
+        if isinstance(data, WormholeIpcSharedPayload):
+            data = take_shared_payload(data)
+        return self.__encoder.decode(data)
+
+    def get_stats(self):
+        if not self.stats_enabled:
+            return WormholeChannelStats(-1, -1)
+        return WormholeChannelStats(*self.__stats_recorder.get_rates())
+
+    def send(self, wh_sender_id: str, queue_name: str, data: Any, queue_timeout: int = None, flags: int = 0) -> str:
+        return self.send_many(wh_sender_id, queue_name, [data], queue_timeout, flags)[0]
+
+    def send_many(self, wh_sender_id: str, queue_name: str, datas: Iterable[Any], queue_timeout: int = None,
+                  flags: int = 0) -> List[str]:
+        if queue_timeout is None:
+            queue_timeout = self.__send_timeout
+        encoded_datas = [self.__encode(data, queue_name) for data in datas]
+        try:
+            message_ids = self.__call("send_many", wh_sender_id, queue_name, encoded_datas, queue_timeout, flags)
+        except Exception:
+            for encoded_data in encoded_datas:
+                if isinstance(encoded_data, WormholeIpcSharedPayload):
+                    unlink_shared_payload(encoded_data)
+            raise
+        if self.stats_enabled and len(message_ids) > 0:
+            self.__stats_recorder.record_sends(wh_sender_id, len(message_ids))
+        return message_ids
+
+    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 5) -> Optional[
+        Tuple[str, str, Any, int]]:
+        results = self.pop_many(wh_receiver_id, queue_names, 1, timeout)
+        if len(results) == 0:
+            return None
+        if isinstance(results[0], WormholeChannelPopError):
+            raise results[0]
+        return results[0]
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 5) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]] = []
+        for queue_name, message_id, data, flags in self.__call("pop_many", wh_receiver_id, queue_names, max_count,
+                                                               timeout):
+            try:
+                results.append((queue_name, message_id, self.__decode(data), flags))
+            except (WormholeDecodeError, FileNotFoundError) as e:
+                results.append(WormholeChannelPopError(queue_name, message_id, str(e), e))
+        if self.stats_enabled and len(results) > 0:
+            self.__stats_recorder.record_receives(wh_receiver_id, len(results))
+        return results
+
+    def requeue(self, wh_receiver_id: str, results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]):
+        encoded_results = []
+        for result in results:
+            if isinstance(result, WormholeChannelPopError):
+                # The undecodable payload was not kept
+                self.reply(result.result_message_id, ValueError(str(result)), True, wh_receiver_id=wh_receiver_id)
+                continue
+            queue_name, message_id, data, flags = result
+            encoded_results.append((queue_name, message_id, self.__encode(data, queue_name), flags))
+        self.__call("requeue", wh_receiver_id, encoded_results)
+
+    def reply(self, message_id: str, data: Any, is_error: bool, timeout: int = None, wh_receiver_id: str = ""):
+        if not timeout:
+            timeout = self.__reply_expiration
+        encoded_data = None
+        if data is not None:
+            encoded_data = self.__encode(data)
+        self.__call("reply", message_id, encoded_data, is_error, timeout, wh_receiver_id)
+
+    def delete(self, message_id: str) -> None:
+        self.__call("delete", message_id)
+
+    def check_for_reply(self, message_id: str) -> bool:
+        return self.__call("check_for_reply", message_id)
+
+    def wait_for_reply(self, message_id: str, timeout: int = DEFAULT_MESSAGE_TIMEOUT) -> Tuple[bool, Any, str]:
+        is_success, data, receiver_id = self.__call("wait_for_reply", message_id, timeout)
+        if data is not None and not isinstance(data, Exception):
+            data = self.__decode(data)
+        return is_success, data, receiver_id
+
+    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
+        self.__call("touch_for_groups", group_names, receiver_id, timeout)
+
+    def remove_from_groups(self, group_names: List[str], receiver_id: str):
+        self.__call("remove_from_groups", group_names, receiver_id)
+
+    def find_group_members(self, group_name: str) -> List[str]:
+        return self.__call("find_group_members", group_name)
+
+    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0, lock_timeout: int = 0) -> Optional[str]:
+        return self.__call("lock", lock_name, block, block_timeout, lock_timeout)
+
+    def release(self, lock_name: str, lock_secret: str, force=False):
+        return self.__call("release", lock_name, lock_secret, force)
+
+    def is_locked(self, lock_name: str):
+        return self.__call("is_locked", lock_name)
+
+    def rate_limit(self, limit_name: str, max_amount: int, duration: float, count: int = 1,
+                   partial: bool = False) -> WormholeRateLimitResult:
+        return self.__call("rate_limit", limit_name, max_amount, duration, count, partial)
+
+
+if __name__ == "__main__":
+    WormholeIpcBroker(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_SOCKET_PATH).serve_forever()
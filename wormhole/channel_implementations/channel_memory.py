@@ -0,0 +1,367 @@
+﻿import time
+import random
+import threading
+
+from collections import deque
+
+from typing import *
+
+from ..channel import AbstractWormholeChannel, WormholeChannelStats, WormholeLockSecret, WormholeRateLimitResult
+from ..encoding.base import WormholeEncoder
+from ..error import WormholeChannelClosedError, WormholeWaitForReplyError, WormholeDecodeError, \
+    WormholeChannelPopError
+from ..stats import WormholeStatsRecorder
+from ..registry import DEFAULT_MESSAGE_TIMEOUT, DEFAULT_REPLY_TIMEOUT, get_default_encoder
+from ..utils import generate_uid
+
+
+class _MemoryMessage(NamedTuple):
+    message_id: str
+    data: Any
+    flags: int
+    expires_at: float
+
+
+class _MemoryReply(NamedTuple):
+    is_success: bool
+    data: Any
+    receiver_id: str
+    expires_at: float
+
+
+class WormholeMemoryStore:
+    """
+    The state shared by all the memory channels created with it, like a redis database is for the redis channels.
+    Uses a single condition variable for every change, threading primitives are cooperative when gevent monkey
+    patched the threading module, so the store works for both threads and greenlets.
+    """
+    __default_store: Optional["WormholeMemoryStore"] = None
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.queues: Dict[str, Deque[_MemoryMessage]] = {}
+        self.replies: Dict[str, _MemoryReply] = {}
+        self.taken_messages: Dict[str, Tuple[str, float]] = {}
+        self.groups: Dict[str, Dict[str, float]] = {}
+        self.locks: Dict[str, Tuple[str, float]] = {}
+        self.lock_fencing_tokens: Dict[str, int] = {}
+        # rate limit name -> theoretical arrival time of the next request
+        self.rate_limits: Dict[str, float] = {}
+        self.last_cleanup_time = time.time()
+
+    @classmethod
+    def get_default(cls) -> "WormholeMemoryStore":
+        if cls.__default_store is None:
+            cls.__default_store = WormholeMemoryStore()
+        return cls.__default_store
+
+    def on_data_dropped(self, data: Any):
+        """Called with the payload of every message or reply dropped without being received"""
+        pass
+
+    def cleanup_if_needed(self, now: float):
+        """Drops expired messages, replies and tracking data, must be called while holding the condition"""
+        if now - self.last_cleanup_time < 1:
+            return
+        self.last_cleanup_time = now
+        for message_id in [k for k, v in self.replies.items() if v.expires_at < now]:
+            self.on_data_dropped(self.replies.pop(message_id).data)
+        for message_id in [k for k, v in self.taken_messages.items() if v[1] < now]:
+            del self.taken_messages[message_id]
+        for limit_name in [k for k, v in self.rate_limits.items() if v < now]:
+            del self.rate_limits[limit_name]
+        for queue_name, queue in list(self.queues.items()):
+            while queue and queue[0].expires_at < now:
+                self.on_data_dropped(queue.popleft().data)
+            if len(queue) == 0:
+                del self.queues[queue_name]
+
+
+class WormholeMemoryChannel(AbstractWormholeChannel):
+    """
+    An in-process channel, all the wormholes using channels of the same store can talk to each other.
+    Payloads are passed through the encoder by default so senders and handlers never share objects, pass
+    encode_payloads=False to pass them by reference.
+    """
+    __encoder: WormholeEncoder
+
+    def __init__(self, store: Optional[WormholeMemoryStore] = None, send_timeout: int = DEFAULT_MESSAGE_TIMEOUT,
+                 reply_expiration: int = DEFAULT_REPLY_TIMEOUT, encode_payloads: bool = True,
+                 encoder: Optional[WormholeEncoder] = None):
+        if store is None:
+            store = WormholeMemoryStore.get_default()
+        self.__store = store
+        self.__encoder = encoder or get_default_encoder()
+        self.__encode_payloads = encode_payloads
+        self.__closed = False
+        self.__send_timeout = send_timeout
+        self.__reply_expiration = reply_expiration
+        self.__stats_recorder = WormholeStatsRecorder()
+        self.stats_enabled = True
+
+    @property
+    def store(self) -> WormholeMemoryStore:
+        return self.__store
+
+    def is_open(self):
+        return not self.__closed
+
+    def close(self):
+        with self.__store.condition:
+            self.__closed = True
+            # Wake up our blocked pops and waits so they notice the channel closed
+            self.__store.condition.notify_all()
+
+    def __check_open(self):
+        if self.__closed:
+            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+
+    def __wait(self, deadline: Optional[float]) -> bool:
+        """Waits for a change in the store, returns False when the deadline passed"""
+        if deadline is None:
+            self.__store.condition.wait()
+            return True
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return False
+        self.__store.condition.wait(remaining)
+        return True
+
+    @staticmethod
+    def __get_deadline(timeout: float) -> Optional[float]:
+        if not timeout:
+            return None  # block forever, like a BRPOP with a zero timeout
+        return time.time() + timeout
+
+    def __encode(self, data: Any, queue_name: Optional[str] = None) -> Any:
+        if self.__encode_payloads:
+            return self.__encoder.encode_for_queue(data, queue_name)
+        return data
+
+    def __decode(self, data: Any) -> Any:
+        if self.__encode_payloads:
+            return self.__encoder.decode(data)
+        return data
+
+    @property
+    def stats_recorder(self) -> WormholeStatsRecorder:
+        return self.__stats_recorder
+
+    def get_stats(self):
+        if not self.stats_enabled:
+            return WormholeChannelStats(-1, -1)
+        return WormholeChannelStats(*self.__stats_recorder.get_rates())
+
+    def send(self, wh_sender_id: str, queue_name: str, data: Any, queue_timeout: int = None, flags: int = 0) -> str:
+        return self.send_many(wh_sender_id, queue_name, [data], queue_timeout, flags)[0]
+
+    def send_many(self, wh_sender_id: str, queue_name: str, datas: Iterable[Any], queue_timeout: int = None,
+                  flags: int = 0) -> List[str]:
+        self.__check_open()
+        if queue_timeout is None:
+            queue_timeout = self.__send_timeout
+        expires_at = time.time() + queue_timeout + 2
+        messages = [_MemoryMessage(f"whm:{generate_uid()}", self.__encode(data, queue_name), flags, expires_at)
+                    for data in datas]
+        with self.__store.condition:
+            self.__store.cleanup_if_needed(time.time())
+            self.__store.queues.setdefault(queue_name, deque()).extend(messages)
+            self.__store.condition.notify_all()
+        if self.stats_enabled and len(messages) > 0:
+            self.__stats_recorder.record_sends(wh_sender_id, len(messages))
+        return [m.message_id for m in messages]
+
+    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 5) -> Optional[
+        Tuple[str, str, Any, int]]:
+        results = self.pop_many(wh_receiver_id, queue_names, 1, timeout)
+        if len(results) == 0:
+            return None
+        if isinstance(results[0], WormholeChannelPopError):
+            raise results[0]
+        return results[0]
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 5) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        self.__check_open()
+        deadline = self.__get_deadline(timeout)
+        queue_names = list(queue_names)
+        random.shuffle(queue_names)
+        popped: List[Tuple[str, _MemoryMessage]] = []
+        with self.__store.condition:
+            while True:
+                self.__check_open()
+                now = time.time()
+                for queue_name in queue_names:
+                    queue = self.__store.queues.get(queue_name)
+                    while queue and len(popped) < max_count:
+                        message = queue.popleft()
+                        if message.expires_at < now:
+                            # stale message, the sender already gave up on it
+                            self.__store.on_data_dropped(message.data)
+                            continue
+                        popped.append((queue_name, message))
+                        self.__store.taken_messages[message.message_id] = (wh_receiver_id, message.expires_at)
+                if len(popped) > 0 or not self.__wait(deadline):
+                    break
+        results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]] = []
+        for queue_name, message in popped:
+            try:
+                results.append((queue_name, message.message_id, self.__decode(message.data), message.flags))
+            except WormholeDecodeError as e:
+                results.append(WormholeChannelPopError(queue_name, message.message_id, str(e), e))
+        if self.stats_enabled and len(popped) > 0:
+            self.__stats_recorder.record_receives(wh_receiver_id, len(popped))
+        return results
+
+    def requeue(self, wh_receiver_id: str, results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]):
+        self.__check_open()
+        for result in results:
+            if isinstance(result, WormholeChannelPopError):
+                # The undecodable payload was not kept
+                self.reply(result.result_message_id, ValueError(str(result)), True, wh_receiver_id=wh_receiver_id)
+        with self.__store.condition:
+            for queue_name, message_id, data, flags in reversed([r for r in results
+                                                                 if not isinstance(r, WormholeChannelPopError)]):
+                taken_message = self.__store.taken_messages.pop(message_id, None)
+                expires_at = time.time() + self.__send_timeout + 2 if taken_message is None else taken_message[1]
+                message = _MemoryMessage(message_id, self.__encode(data, queue_name), flags, expires_at)
+                self.__store.queues.setdefault(queue_name, deque()).appendleft(message)
+            self.__store.condition.notify_all()
+
+    def reply(self, message_id: str, data: Any, is_error: bool, timeout: int = None, wh_receiver_id: str = ""):
+        self.__check_open()
+        if not timeout:
+            timeout = self.__reply_expiration
+        now = time.time()
+        reply = _MemoryReply(not is_error, self.__encode(data) if data is not None else None, wh_receiver_id,
+                             now + timeout)
+        with self.__store.condition:
+            self.__store.taken_messages.pop(message_id, None)
+            self.__store.replies[message_id] = reply
+            self.__store.cleanup_if_needed(now)
+            self.__store.condition.notify_all()
+
+    def delete(self, message_id: str) -> None:
+        self.__check_open()
+        with self.__store.condition:
+            self.__store.taken_messages.pop(message_id, None)
+            reply = self.__store.replies.pop(message_id, None)
+            if reply is not None:
+                self.__store.on_data_dropped(reply.data)
+
+    def check_for_reply(self, message_id: str) -> bool:
+        self.__check_open()
+        with self.__store.condition:
+            return message_id in self.__store.replies
+
+    def wait_for_reply(self, message_id: str, timeout: int = DEFAULT_MESSAGE_TIMEOUT) -> Tuple[bool, Any, str]:
+        self.__check_open()
+        deadline = self.__get_deadline(timeout)
+        with self.__store.condition:
+            while message_id not in self.__store.replies:
+                if not self.__wait(deadline):
+                    taken_message = self.__store.taken_messages.get(message_id)
+                    if taken_message is None:
+                        return False, WormholeWaitForReplyError(f"Message timed out, no handlers found for message {message_id}"), ""
+                    return False, WormholeWaitForReplyError(f"Timeout waiting for results from {taken_message[0]}"), ""
+                self.__check_open()
+            reply = self.__store.replies.pop(message_id)
+        reply_data = reply.data
+        if reply_data is not None:
+            reply_data = self.__decode(reply_data)
+        return reply.is_success, reply_data, reply.receiver_id
+
+    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
+        self.__check_open()
+        expires_at = time.time() + timeout
+        with self.__store.condition:
+            for group_name in group_names:
+                self.__store.groups.setdefault(group_name, {})[receiver_id] = expires_at
+
+    def remove_from_groups(self, group_names: List[str], receiver_id: str):
+        self.__check_open()
+        with self.__store.condition:
+            for group_name in group_names:
+                self.__store.groups.get(group_name, {}).pop(receiver_id, None)
+
+    def find_group_members(self, group_name: str) -> List[str]:
+        self.__check_open()
+        now = time.time()
+        with self.__store.condition:
+            members = self.__store.groups.get(group_name, {})
+            for receiver_id in [k for k, v in members.items() if v < now]:
+                del members[receiver_id]
+            return list(members.keys())
+
+    def __is_locked(self, lock_name: str, now: float) -> bool:
+        lock = self.__store.locks.get(lock_name)
+        if lock is None:
+            return False
+        if lock[1] < now:
+            del self.__store.locks[lock_name]
+            return False
+        return True
+
+    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0,
+             lock_timeout: int = 0) -> Optional[WormholeLockSecret]:
+        self.__check_open()
+        lock_secret = generate_uid()
+        deadline = self.__get_deadline(block_timeout)
+        with self.__store.condition:
+            while self.__is_locked(lock_name, time.time()):
+                if not block:
+                    return None
+                lock_expires_at = self.__store.locks[lock_name][1]
+                wait_deadline = deadline
+                if lock_expires_at != float("inf") and (wait_deadline is None or lock_expires_at < wait_deadline):
+                    # Wake up when the lock expires even if nobody releases it
+                    wait_deadline = lock_expires_at
+                if not self.__wait(wait_deadline) and wait_deadline == deadline:
+                    return None  # Timeout
+                self.__check_open()
+            expires_at = float("inf")
+            if lock_timeout > 0:
+                expires_at = time.time() + lock_timeout
+            self.__store.locks[lock_name] = (lock_secret, expires_at)
+            fencing_token = self.__store.lock_fencing_tokens.get(lock_name, 0) + 1
+            self.__store.lock_fencing_tokens[lock_name] = fencing_token
+        return WormholeLockSecret(lock_secret, fencing_token)
+
+    def release(self, lock_name: str, lock_secret: str, force=False):
+        self.__check_open()
+        with self.__store.condition:
+            if not self.__is_locked(lock_name, time.time()):
+                return False  # not locked
+            if not force and self.__store.locks[lock_name][0] != lock_secret:
+                raise KeyError("Invalid lock secret, not the owner of this lock")
+            del self.__store.locks[lock_name]
+            self.__store.condition.notify_all()
+        return True
+
+    def is_locked(self, lock_name: str):
+        self.__check_open()
+        with self.__store.condition:
+            return self.__is_locked(lock_name, time.time())
+
+    def rate_limit(self, limit_name: str, max_amount: int, duration: float, count: int = 1,
+                   partial: bool = False) -> WormholeRateLimitResult:
+        assert duration > 0, "'duration' must be positive"
+        assert 1 <= count <= max_amount, "'count' must be between 1 and 'max_amount'"
+        self.__check_open()
+        emission_interval = duration / max_amount
+        with self.__store.condition:
+            now = time.time()
+            tat = max(self.__store.rate_limits.get(limit_name, now), now)
+            available = int((now + duration - tat) / emission_interval + 1e-9)
+            admitted_count = 0
+            if available >= count:
+                admitted_count = count
+            elif partial and available > 0:
+                admitted_count = available
+            tat += admitted_count * emission_interval
+            self.__store.rate_limits[limit_name] = tat
+        retry_after = 0.0
+        if admitted_count < count:
+            needed = 1 if partial else count - admitted_count
+            retry_after = tat + needed * emission_interval - duration - now
+        return WormholeRateLimitResult(admitted_count, retry_after)
@@ -0,0 +1,176 @@
+﻿from typing import *
+
+from ..channel import AbstractWormholeChannel, WormholeRedisChannel, WormholeChannelStats, WormholeLockSecret, \
+    WormholeRateLimitResult
+from ..error import WormholeChannelClosedError, WormholeChannelPopError
+from ..registry import DEFAULT_MESSAGE_TIMEOUT
+from ..utils import hash_string
+from .concurrent_pop import WormholeConcurrentPop
+
+_PopResult = Union[Tuple[str, str, Any, int], WormholeChannelPopError]
+
+
+class WormholeShardedChannel(AbstractWormholeChannel):
+    """
+    Spreads queues over several independent channels, usually redis channels of separate redis processes.
+    Every queue is placed on a shard by rendezvous hashing of its name, so adding or removing a shard only moves the
+    queues of that shard. Groups, locks and rate limits are placed by their names the same way. Message ids carry the
+    name of their shard so replies go through the shard of the message.
+    A receiver of queues on a single shard pops from it directly, a receiver of queues on several shards pops from
+    all of them at once and returns once any of them popped. Pops still in flight are taken over by the next pop of
+    the receiver, the messages they pop that no pop of the receiver is waiting for are put back on their queues.
+    """
+    MESSAGE_ID_PREFIX = "whs:"
+    MESSAGE_ID_SEPARATOR = "|"
+    PLACEMENT_CACHE_SIZE = 10000
+
+    def __init__(self, shards: Union[Dict[str, AbstractWormholeChannel], List[AbstractWormholeChannel]]):
+        if not isinstance(shards, dict):
+            shards = {f"shard{i}": shard for i, shard in enumerate(shards)}
+        assert len(shards) > 0, "At least one shard is needed"
+        assert not any(self.MESSAGE_ID_SEPARATOR in n for n in shards), \
+            f"Shard names cannot contain '{self.MESSAGE_ID_SEPARATOR}'"
+        self.__shards = shards
+        self.__placements: Dict[str, str] = {}
+        self.__concurrent_pop = WormholeConcurrentPop(self.__pop_shard, self.__requeue_shard, self.__wrap_pop_result)
+        self.__closed = False
+
+    @classmethod
+    def from_uris(cls, redis_uris: List[str], **channel_kwargs) -> "WormholeShardedChannel":
+        """Creates a redis channel for every uri, the uris name the shards"""
+        return cls({uri: WormholeRedisChannel(uri, **channel_kwargs) for uri in redis_uris})
+
+    @property
+    def shards(self) -> Dict[str, AbstractWormholeChannel]:
+        return dict(self.__shards)
+
+    def get_shard_name(self, key: str) -> str:
+        """Returns the name of the shard with the highest rendezvous score of the key"""
+        shard_name = self.__placements.get(key)
+        if shard_name is None:
+            shard_name = max(self.__shards, key=lambda n: hash_string(f"{n}{self.MESSAGE_ID_SEPARATOR}{key}"))
+            if len(self.__placements) >= self.PLACEMENT_CACHE_SIZE:
+                self.__placements.clear()
+            self.__placements[key] = shard_name
+        return shard_name
+
+    def get_shard(self, key: str) -> AbstractWormholeChannel:
+        return self.__shards[self.get_shard_name(key)]
+
+    def __wrap_message_id(self, shard_name: str, message_id: str) -> str:
+        return f"{self.MESSAGE_ID_PREFIX}{shard_name}{self.MESSAGE_ID_SEPARATOR}{message_id}"
+
+    def __unwrap_message_id(self, message_id: str) -> Tuple[AbstractWormholeChannel, str]:
+        if not message_id.startswith(self.MESSAGE_ID_PREFIX):
+            raise ValueError(f"Not a sharded message id: '{message_id}'")
+        shard_name, _, shard_message_id = message_id[len(self.MESSAGE_ID_PREFIX):].partition(self.MESSAGE_ID_SEPARATOR)
+        return self.__shards[shard_name], shard_message_id
+
+    def __wrap_pop_result(self, shard_name: str, result: _PopResult) -> _PopResult:
+        if isinstance(result, WormholeChannelPopError):
+            return WormholeChannelPopError(result.result_queue_name,
+                                           self.__wrap_message_id(shard_name, result.result_message_id),
+                                           str(result), result.inner_exception)
+        queue_name, message_id, data, flags = result
+        return queue_name, self.__wrap_message_id(shard_name, message_id), data, flags
+
+    def is_open(self):
+        return not self.__closed
+
+    def get_stats(self):
+        shard_stats = [shard.get_stats() for shard in self.__shards.values()]
+        return WormholeChannelStats(sum(s.sends_per_second for s in shard_stats),
+                                    sum(s.processing_per_second for s in shard_stats))
+
+    def send(self, wh_sender_id: str, queue_name: str, data: Any, queue_timeout: int = None, flags: int = 0) -> str:
+        return self.send_many(wh_sender_id, queue_name, [data], queue_timeout, flags)[0]
+
+    def send_many(self, wh_sender_id: str, queue_name: str, datas: Iterable[Any], queue_timeout: int = None,
+                  flags: int = 0) -> List[str]:
+        self.__check_open()
+        shard_name = self.get_shard_name(queue_name)
+        message_ids = self.__shards[shard_name].send_many(wh_sender_id, queue_name, datas, queue_timeout, flags)
+        return [self.__wrap_message_id(shard_name, message_id) for message_id in message_ids]
+
+    def delete(self, message_id: str) -> None:
+        shard, shard_message_id = self.__unwrap_message_id(message_id)
+        shard.delete(shard_message_id)
+
+    def reply(self, message_id: str, data: Any, is_error: bool, timeout: int = None, wh_receiver_id: str = ""):
+        shard, shard_message_id = self.__unwrap_message_id(message_id)
+        shard.reply(shard_message_id, data, is_error, timeout, wh_receiver_id)
+
+    def check_for_reply(self, message_id: str) -> bool:
+        shard, shard_message_id = self.__unwrap_message_id(message_id)
+        return shard.check_for_reply(shard_message_id)
+
+    def wait_for_reply(self, message_id: str, timeout: int = DEFAULT_MESSAGE_TIMEOUT) -> Tuple[bool, Any, str]:
+        shard, shard_message_id = self.__unwrap_message_id(message_id)
+        return shard.wait_for_reply(shard_message_id, timeout)
+
+    def pop_next(self, wh_receiver_id: str, queue_names: List[str], timeout: int = 5) -> Optional[
+        Tuple[str, str, Any, int]]:
+        results = self.pop_many(wh_receiver_id, queue_names, 1, timeout)
+        if len(results) == 0:
+            return None
+        if isinstance(results[0], WormholeChannelPopError):
+            raise results[0]
+        return results[0]
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 5) -> \
+            List[_PopResult]:
+        self.__check_open()
+        queue_names_by_shard = self.__group_by_shard(queue_names)
+        if len(queue_names_by_shard) == 1:
+            shard_name, shard_queue_names = next(iter(queue_names_by_shard.items()))
+            results = self.__shards[shard_name].pop_many(wh_receiver_id, shard_queue_names, max_count, timeout)
+            return [self.__wrap_pop_result(shard_name, result) for result in results]
+        return self.__concurrent_pop.pop_many(wh_receiver_id, queue_names_by_shard, max_count, timeout)
+
+    def __pop_shard(self, shard_name: str, wh_receiver_id: str, queue_names: List[str], max_count: int,
+                    timeout: float) -> List[_PopResult]:
+        return self.__shards[shard_name].pop_many(wh_receiver_id, queue_names, max_count, timeout)
+
+    def __requeue_shard(self, shard_name: str, wh_receiver_id: str, results: List[_PopResult]):
+        self.__shards[shard_name].requeue(wh_receiver_id, results)
+
+    def close(self):
+        self.__closed = True
+        for shard in self.__shards.values():
+            shard.close()
+        self.__concurrent_pop.close()
+
+    def __check_open(self):
+        if self.__closed:
+            raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+
+    def touch_for_groups(self, group_names: List[str], receiver_id: str, timeout: int = 5):
+        for shard_name, shard_group_names in self.__group_by_shard(group_names).items():
+            self.__shards[shard_name].touch_for_groups(shard_group_names, receiver_id, timeout)
+
+    def remove_from_groups(self, group_names: List[str], receiver_id: str):
+        for shard_name, shard_group_names in self.__group_by_shard(group_names).items():
+            self.__shards[shard_name].remove_from_groups(shard_group_names, receiver_id)
+
+    def find_group_members(self, group_name: str):
+        return self.get_shard(group_name).find_group_members(group_name)
+
+    def __group_by_shard(self, keys: List[str]) -> Dict[str, List[str]]:
+        keys_by_shard: Dict[str, List[str]] = {}
+        for key in keys:
+            keys_by_shard.setdefault(self.get_shard_name(key), []).append(key)
+        return keys_by_shard
+
+    def lock(self, lock_name: str, block: bool = True, block_timeout: int = 0,
+             lock_timeout: int = 0) -> Optional[WormholeLockSecret]:
+        return self.get_shard(lock_name).lock(lock_name, block, block_timeout, lock_timeout)
+
+    def release(self, lock_name: str, lock_secret: str, force=False):
+        return self.get_shard(lock_name).release(lock_name, lock_secret, force)
+
+    def is_locked(self, lock_name: str):
+        return self.get_shard(lock_name).is_locked(lock_name)
+
+    def rate_limit(self, limit_name: str, max_amount: int, duration: float, count: int = 1,
+                   partial: bool = False) -> WormholeRateLimitResult:
+        return self.get_shard(limit_name).rate_limit(limit_name, max_amount, duration, count, partial)
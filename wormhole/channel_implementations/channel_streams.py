@@ -0,0 +1,210 @@
+﻿import time
+import random
+
+import redis
+
+from typing import *
+
+from redis import BlockingConnectionPool
+
+from ..channel import WormholeRedisChannel
+from ..encoding.base import WormholeEncoder
+from ..error import WormholeChannelClosedError, WormholeChannelConnectionError, WormholeDecodeError, \
+    WormholeChannelPopError
+from ..registry import DEFAULT_MESSAGE_TIMEOUT, DEFAULT_REPLY_TIMEOUT
+from ..scripts import get_pool_script, ENSURE_STREAM_GROUPS_SCRIPT
+from ..utils import generate_uid
+from ..wire import pack_inline_message, unpack_inline_message, pack_inline_reply
+
+# queue name, stream entry id, stream entry fields (None when the entry was trimmed from the stream)
+_StreamEntry = Tuple[str, bytes, Optional[Dict[bytes, bytes]]]
+
+
+class WormholeRedisStreamChannel(WormholeRedisChannel):
+    """
+    A redis channel that keeps every queue in a redis stream read by a single consumer group, so every message is
+    handled by one receiver. Messages are acknowledged when they are replied to or deleted, messages left pending by
+    a receiver that died are reclaimed by other receivers after claim_idle_timeout seconds.
+    Replies travel like the replies to inline messages of WormholeRedisChannel.
+    """
+    CONSUMER_GROUP_NAME = "wormhole"
+    STREAM_ENTRY_FIELD = b"m"
+
+    def __init__(self, redis_uri: str = "redis://localhost:6379/1", max_connections=20,
+                 send_timeout: int = DEFAULT_MESSAGE_TIMEOUT, reply_expiration: int = DEFAULT_REPLY_TIMEOUT,
+                 redis_pool: BlockingConnectionPool = None, stream_max_length: int = 100000,
+                 claim_idle_timeout: int = 60, stats_flush_interval: Optional[float] = None,
+                 max_blocking_connections: Optional[int] = None, encoder: Optional[WormholeEncoder] = None):
+        super().__init__(redis_uri, max_connections, send_timeout, reply_expiration, redis_pool,
+                         stats_flush_interval=stats_flush_interval, max_blocking_connections=max_blocking_connections,
+                         encoder=encoder)
+        self.stream_max_length = stream_max_length
+        self.claim_idle_timeout = claim_idle_timeout
+        self.__known_groups: Set[str] = set()
+        self.__pending_entries: Dict[str, Tuple[str, bytes]] = {}
+        self.__buffered_entries: Dict[str, List[_StreamEntry]] = {}
+        self.__last_reclaim_time = 0.0
+
+    def send_many(self, wh_sender_id: str, queue_name: str, datas: Iterable[Any],
+                  queue_timeout: int = None, flags: int = 0) -> List[str]:
+        if queue_timeout is None:
+            queue_timeout = self.send_timeout
+        actual_timeout = queue_timeout + 2
+        message_ids: List[str] = []
+        rdb = self._get_rdb()
+        transaction = rdb.pipeline()
+        for data in datas:
+            message_id = f"{self.INLINE_MESSAGE_PREFIX}{generate_uid()}"
+            entry = pack_inline_message(flags, time.time() + actual_timeout, message_id,
+                                        self.encoder.encode_for_queue(data, queue_name))
+            transaction.xadd(queue_name, {self.STREAM_ENTRY_FIELD: entry}, maxlen=self.stream_max_length,
+                             approximate=True)
+            message_ids.append(message_id)
+        if len(message_ids) == 0:
+            return message_ids
+        transaction.expire(queue_name, actual_timeout)
+        transaction.execute()
+        if self.stats_enabled:
+            self.stats_recorder.record_sends(wh_sender_id, len(message_ids))
+        return message_ids
+
+    def reply(self, message_id: str, data: Any, is_error: bool,
+              timeout: int = None, wh_receiver_id: str = ""):
+        if not timeout:
+            timeout = self.reply_expiration
+        encoded_data = None
+        if data is not None:
+            encoded_data = self.encoder.encode(data)
+        try:
+            rdb = self._get_rdb()
+            transaction = rdb.pipeline()
+            transaction.lpush(message_id, pack_inline_reply(wh_receiver_id, encoded_data, is_error))
+            transaction.expire(message_id, timeout)
+            self.__acknowledge(transaction, message_id)
+            transaction.execute()
+            transaction.close()
+        except redis.exceptions.ConnectionError as e:
+            if not self.is_open():
+                raise WormholeChannelClosedError("Cannot reply using a closed channel")
+            raise WormholeChannelConnectionError(f"Connection error during reply: {e}")
+
+    def delete(self, message_id: str):
+        transaction = self._get_rdb().pipeline()
+        self.__acknowledge(transaction, message_id)
+        transaction.execute()
+
+    def __acknowledge(self, transaction: "redis.client.Pipeline", message_id: str):
+        pending_entry = self.__pending_entries.pop(message_id, None)
+        if pending_entry is None:
+            return
+        queue_name, entry_id = pending_entry
+        transaction.xack(queue_name, self.CONSUMER_GROUP_NAME, entry_id)
+        # Every queue has a single consumer group, so acknowledged entries are not needed anymore
+        transaction.xdel(queue_name, entry_id)
+
+    def requeue(self, wh_receiver_id: str, results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]):
+        # Entries stay pending until acknowledged, once forgotten here they are reclaimed like those of a dead receiver
+        for result in results:
+            message_id = result.result_message_id if isinstance(result, WormholeChannelPopError) else result[1]
+            self.__pending_entries.pop(message_id, None)
+
+    def pop_many(self, wh_receiver_id: str, queue_names: List[str], max_count: int, timeout: int = 5) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        rdb = self._get_rdb()
+        random.shuffle(queue_names)
+        entries = self.__take_buffered_entries(wh_receiver_id, queue_names)
+        if len(entries) == 0:
+            self.__ensure_groups(rdb, queue_names)
+            entries = self.__reclaim_entries(rdb, wh_receiver_id, queue_names, max_count)
+        if len(entries) == 0:
+            entries = self.__read_entries(rdb, wh_receiver_id, queue_names, max_count, timeout)
+        if len(entries) > max_count:
+            # Reading several streams may return more entries than asked for, keep them for the next pop
+            self.__buffered_entries.setdefault(wh_receiver_id, []).extend(entries[max_count:])
+            entries = entries[:max_count]
+        return self.__process_entries(rdb, wh_receiver_id, entries)
+
+    def __take_buffered_entries(self, wh_receiver_id: str, queue_names: List[str]) -> List[_StreamEntry]:
+        buffered_entries = self.__buffered_entries.get(wh_receiver_id)
+        if not buffered_entries:
+            return []
+        queue_names_set = set(queue_names)
+        entries = [e for e in buffered_entries if e[0] in queue_names_set]
+        self.__buffered_entries[wh_receiver_id] = [e for e in buffered_entries if e[0] not in queue_names_set]
+        return entries
+
+    def __ensure_groups(self, rdb: redis.Redis, queue_names: List[str]):
+        missing_groups = [q for q in queue_names if q not in self.__known_groups]
+        if len(missing_groups) == 0:
+            return
+        ensure_script = get_pool_script(rdb, ENSURE_STREAM_GROUPS_SCRIPT)
+        ensure_script(keys=missing_groups, args=[self.CONSUMER_GROUP_NAME, self.send_timeout + 2], client=rdb)
+        self.__known_groups.update(missing_groups)
+
+    def __reclaim_entries(self, rdb: redis.Redis, wh_receiver_id: str, queue_names: List[str],
+                          max_count: int) -> List[_StreamEntry]:
+        now = time.time()
+        if now - self.__last_reclaim_time < self.claim_idle_timeout / 2:
+            return []
+        self.__last_reclaim_time = now
+        transaction = rdb.pipeline(transaction=False)
+        for queue_name in queue_names:
+            transaction.xautoclaim(queue_name, self.CONSUMER_GROUP_NAME, wh_receiver_id,
+                                   int(self.claim_idle_timeout * 1000), count=max_count)
+        entries: List[_StreamEntry] = []
+        for queue_name, result in zip(queue_names, transaction.execute(raise_on_error=False)):
+            if isinstance(result, Exception):
+                continue  # The stream expired, the next read will create it again
+            for entry_id, fields in result[1]:
+                entries.append((queue_name, entry_id, fields))
+        return entries
+
+    def __read_entries(self, rdb: redis.Redis, wh_receiver_id: str, queue_names: List[str], max_count: int,
+                       timeout: int) -> List[_StreamEntry]:
+        streams = {queue_name: ">" for queue_name in queue_names}
+        try:
+            result = self._get_blocking_rdb().xreadgroup(self.CONSUMER_GROUP_NAME, wh_receiver_id, streams, count=max_count,
+                                    block=int(timeout * 1000))
+        except redis.exceptions.ResponseError as e:
+            if "NOGROUP" not in str(e):
+                raise
+            # One of the streams expired along with its group, create the groups again and let the caller retry
+            self.__known_groups.difference_update(queue_names)
+            self.__ensure_groups(rdb, queue_names)
+            return []
+        entries: List[_StreamEntry] = []
+        for queue_name, stream_entries in result or []:
+            queue_name = queue_name.decode()
+            for entry_id, fields in stream_entries:
+                entries.append((queue_name, entry_id, fields))
+        return entries
+
+    def __process_entries(self, rdb: redis.Redis, wh_receiver_id: str, entries: List[_StreamEntry]) -> \
+            List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]]:
+        results: List[Union[Tuple[str, str, Any, int], WormholeChannelPopError]] = []
+        stale_entries: List[Tuple[str, bytes]] = []
+        now = time.time()
+        for queue_name, entry_id, fields in entries:
+            if not fields or self.STREAM_ENTRY_FIELD not in fields:
+                stale_entries.append((queue_name, entry_id))  # trimmed from the stream
+                continue
+            inline_message = unpack_inline_message(fields[self.STREAM_ENTRY_FIELD])
+            if inline_message.expires_at < now:
+                stale_entries.append((queue_name, entry_id))  # the sender already gave up on it
+                continue
+            message_id = inline_message.reply_address
+            self.__pending_entries[message_id] = (queue_name, entry_id)
+            try:
+                message_data = self.encoder.decode(inline_message.data)
+                results.append((queue_name, message_id, message_data, inline_message.flags))
+            except WormholeDecodeError as e:
+                results.append(WormholeChannelPopError(queue_name, message_id, str(e), e))
+        if len(stale_entries) > 0:
+            transaction = rdb.pipeline()
+            for queue_name, entry_id in stale_entries:
+                transaction.xack(queue_name, self.CONSUMER_GROUP_NAME, entry_id)
+                transaction.xdel(queue_name, entry_id)
+            transaction.execute()
+        if self.stats_enabled and len(results) > 0:
+            self.stats_recorder.record_receives(wh_receiver_id, len(results))
+        return results
@@ -0,0 +1,127 @@
+﻿import time
+import threading
+
+from typing import *
+
+from ..error import WormholeChannelClosedError, WormholeChannelPopError
+
+_PopResult = Union[Tuple[str, str, Any, int], WormholeChannelPopError]
+# The part and the queue names of a pop in flight
+_PartPopKey = Tuple[Hashable, Tuple[str, ...]]
+
+
+class _WaitingPop:
+    """A pop_many call waiting for the pops of its parts to hand it messages"""
+
+    def __init__(self, queue_names: Set[str], max_count: int):
+        self.queue_names = queue_names
+        self.max_count = max_count
+        self.results: List[_PopResult] = []
+        self.pop_error: Optional[Exception] = None
+
+
+class _Receiver:
+    """The pops of one receiver in flight on the parts and its pop_many calls waiting for them"""
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.part_pops: Set[_PartPopKey] = set()
+        self.waiting: List[_WaitingPop] = []
+
+
+class WormholeConcurrentPop:
+    """
+    Pops queues no single blocking pop covers, like the queues of several shards or cluster slots, by popping the
+    queues of every part concurrently and returning once any part popped.
+    Pops still in flight when a call returns are taken over by the next call of the receiver popping the same queues,
+    the messages they pop that no call of the receiver is waiting for are requeued on their part.
+    """
+
+    def __init__(self, pop_part: Callable[[Hashable, str, List[str], int, float], List[_PopResult]],
+                 requeue_part: Callable[[Hashable, str, List[_PopResult]], None],
+                 wrap_result: Callable[[Hashable, _PopResult], _PopResult] = lambda part, result: result):
+        self.__pop_part = pop_part
+        self.__requeue_part = requeue_part
+        self.__wrap_result = wrap_result
+        self.__receivers: Dict[str, _Receiver] = {}
+        self.__receivers_lock = threading.Lock()
+        self.__closed = False
+
+    def pop_many(self, wh_receiver_id: str, queue_names_by_part: Dict[Hashable, List[str]], max_count: int,
+                 timeout: float) -> List[_PopResult]:
+        receiver = self.__get_receiver(wh_receiver_id)
+        waiting_pop = _WaitingPop({q for queue_names in queue_names_by_part.values() for q in queue_names}, max_count)
+        deadline = None
+        if timeout:
+            deadline = time.time() + timeout
+        with receiver.condition:
+            receiver.waiting.append(waiting_pop)
+            try:
+                while len(waiting_pop.results) == 0 and waiting_pop.pop_error is None:
+                    if self.__closed:
+                        raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+                    remaining = None
+                    if deadline is not None:
+                        remaining = deadline - time.time()
+                        if remaining < 0.001:
+                            break  # Timeout, a blocking pop takes a shorter timeout for none at all
+                    for part, queue_names in queue_names_by_part.items():
+                        part_pop_key = (part, tuple(sorted(queue_names)))
+                        # A pop of the same queues left in flight by an earlier call pops for this one too
+                        if part_pop_key not in receiver.part_pops:
+                            receiver.part_pops.add(part_pop_key)
+                            threading.Thread(target=self.__pop, daemon=True,
+                                             args=(receiver, wh_receiver_id, part_pop_key, max_count,
+                                                   remaining or 0)).start()
+                    receiver.condition.wait(remaining)
+            finally:
+                receiver.waiting.remove(waiting_pop)
+        if len(waiting_pop.results) == 0 and waiting_pop.pop_error is not None:
+            raise waiting_pop.pop_error
+        return waiting_pop.results
+
+    def __get_receiver(self, wh_receiver_id: str) -> _Receiver:
+        with self.__receivers_lock:
+            receiver = self.__receivers.get(wh_receiver_id)
+            if receiver is None:
+                receiver = _Receiver()
+                self.__receivers[wh_receiver_id] = receiver
+            return receiver
+
+    def __pop(self, receiver: _Receiver, wh_receiver_id: str, part_pop_key: _PartPopKey, max_count: int,
+              timeout: float):
+        part, queue_names = part_pop_key
+        results: List[_PopResult] = []
+        pop_error: Optional[Exception] = None
+        try:
+            results = self.__pop_part(part, wh_receiver_id, list(queue_names), max_count, timeout)
+        except Exception as e:
+            pop_error = e
+        leftovers: List[_PopResult] = []
+        with receiver.condition:
+            receiver.part_pops.discard(part_pop_key)
+            for result in results:
+                queue_name = result.result_queue_name if isinstance(result, WormholeChannelPopError) else result[0]
+                waiting_pop = next((p for p in receiver.waiting
+                                    if queue_name in p.queue_names and len(p.results) < p.max_count), None)
+                if waiting_pop is None:
+                    leftovers.append(result)
+                else:
+                    waiting_pop.results.append(self.__wrap_result(part, result))
+            if pop_error is not None and not self.__closed:
+                for waiting_pop in receiver.waiting:
+                    if not waiting_pop.queue_names.isdisjoint(queue_names):
+                        waiting_pop.pop_error = pop_error
+            receiver.condition.notify_all()
+        if len(leftovers) > 0:
+            # Messages no call is waiting for go back to their queues, a stopped receiver must not keep them
+            self.__requeue_part(part, wh_receiver_id, leftovers)
+
+    def close(self):
+        """Wakes the waiting calls up, the pops in flight end with their channels"""
+        self.__closed = True
+        with self.__receivers_lock:
+            receivers = list(self.__receivers.values())
+        for receiver in receivers:
+            with receiver.condition:
+                receiver.condition.notify_all()
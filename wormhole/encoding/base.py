@@ -1,4 +1,4 @@
-from typing import Any
+from typing import Any, Optional
 
 import abc
 
@@ -10,5 +10,9 @@ class WormholeEncoder(metaclass=abc.ABCMeta):
     def encode(self, data: Any) -> bytes:
         raise NotImplementedError
 
+    def encode_for_queue(self, data: Any, queue_name: Optional[str]) -> bytes:
+        """Encodes data sent to the queue, encoders adapting to the payloads of every queue override this"""
+        return self.encode(data)
+
     def decode(self, data: bytes) -> Any:
         raise NotImplementedError
\ No newline at end of file
@@ -0,0 +1,52 @@
+from typing import *
+
+from ..error import WormholeDecodeError
+from ..registry import DEFAULT_MESSAGE_TIMEOUT
+from .base import WormholeEncoder
+from .blobstore import WormholeBlobStore, WormholeMmapBlobStore
+from .pickleenc import WormholePickleEncoder
+
+
+class WormholeBlobEncoder(WormholeEncoder):
+    """
+    Encodes with an inner encoder and moves encoded data larger than threshold bytes to a blob store, only a
+    reference to the blob is sent through the channel. A blob is deleted once it was decoded, the message or reply
+    it carries was consumed, or when its ttl expires.
+    Blobs are handed to the inner encoder as views of the store. Bytes payloads decode to bytes, with zero_copy the
+    default pickle encoder decodes uncompressed bytes payloads into views of the blob instead.
+    """
+    BLOB_HEADER = b'@'
+    DEFAULT_THRESHOLD = 1024 * 1024
+
+    def __init__(self, blob_store: Optional[WormholeBlobStore] = None, inner_encoder: Optional[WormholeEncoder] = None,
+                 threshold: int = DEFAULT_THRESHOLD, ttl: int = DEFAULT_MESSAGE_TIMEOUT, zero_copy: bool = False):
+        if blob_store is None:
+            blob_store = WormholeMmapBlobStore()
+        if inner_encoder is None:
+            inner_encoder = WormholePickleEncoder(zero_copy=zero_copy)
+        self.blob_store = blob_store
+        self.inner_encoder = inner_encoder
+        self.threshold = threshold
+        self.ttl = ttl
+
+    def encode(self, obj: Any) -> bytes:
+        return self.encode_for_queue(obj, None)
+
+    def encode_for_queue(self, obj: Any, queue_name: Optional[str]) -> bytes:
+        data = self.inner_encoder.encode_for_queue(obj, queue_name)
+        if len(data) <= self.threshold:
+            return data
+        return self.BLOB_HEADER + self.blob_store.put(data, self.ttl).encode()
+
+    def decode(self, data: bytes) -> Any:
+        if data[0] != self.BLOB_HEADER[0]:
+            return self.inner_encoder.decode(data)
+        ref = bytes(data[1:]).decode()
+        try:
+            blob = self.blob_store.get(ref)
+        except KeyError as e:
+            raise WormholeDecodeError(f"Error decoding data: {e}")
+        try:
+            return self.inner_encoder.decode(blob)
+        finally:
+            self.blob_store.delete(ref)
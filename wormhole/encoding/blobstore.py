@@ -0,0 +1,90 @@
+from typing import *
+
+import os
+import re
+import abc
+import mmap
+import time
+import tempfile
+
+from ..utils import generate_uid
+
+# In a directory private to the user, other users can neither read the blobs nor put blobs of their own in it
+DEFAULT_BLOB_DIRECTORY = os.path.join(tempfile.gettempdir(), f"wormhole-blobs-{os.getuid()}")
+
+
+class WormholeBlobStore(metaclass=abc.ABCMeta):
+    """
+    Keeps payloads too large for the channel, only a reference to the blob travels through the channel
+    """
+    def put(self, data: bytes, ttl: int) -> str:
+        """Stores the data for up to ttl seconds and returns its reference"""
+        raise NotImplementedError
+
+    def get(self, ref: str) -> memoryview:
+        """Returns the data of the reference, raises KeyError when the blob does not exist"""
+        raise NotImplementedError
+
+    def delete(self, ref: str):
+        raise NotImplementedError
+
+
+class WormholeMmapBlobStore(WormholeBlobStore):
+    """
+    Keeps every blob in a file of a directory shared by the processes of a host, blobs are read zero-copy from a memory
+    map of their file. Expired blobs are removed by the stores writing to the directory.
+    """
+    CLEANUP_INTERVAL = 60
+    REF_RE = re.compile(r"^(\d+)-[0-9a-f]{32}$")
+
+    def __init__(self, directory: Optional[str] = None):
+        if directory is None:
+            directory = DEFAULT_BLOB_DIRECTORY
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if directory == DEFAULT_BLOB_DIRECTORY:
+            directory_stat = os.stat(directory)
+            if directory_stat.st_uid != os.getuid() or directory_stat.st_mode & 0o077:
+                raise RuntimeError(f"Blob directory {directory} is not private to the user")
+        self.directory = directory
+        self.__last_cleanup_time = 0.0
+
+    def __get_path(self, ref: str) -> str:
+        if self.REF_RE.match(ref) is None:
+            raise KeyError(f"Invalid blob reference: '{ref}'")
+        return os.path.join(self.directory, ref)
+
+    def put(self, data: bytes, ttl: int) -> str:
+        now = time.time()
+        self.cleanup_if_needed(now)
+        # The expiration time leads the name so expired blobs are found without reading them
+        ref = f"{int(now + ttl)}-{generate_uid()}"
+        path = self.__get_path(ref)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        # Readers never see a partially written blob
+        os.replace(temp_path, path)
+        return ref
+
+    def get(self, ref: str) -> memoryview:
+        try:
+            with open(self.__get_path(ref), "rb") as f:
+                # The map outlives the file, it is released along with the last view of it
+                return memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+        except FileNotFoundError:
+            raise KeyError(f"No such blob: '{ref}'")
+
+    def delete(self, ref: str):
+        try:
+            os.unlink(self.__get_path(ref))
+        except FileNotFoundError:
+            pass
+
+    def cleanup_if_needed(self, now: float):
+        if now - self.__last_cleanup_time < self.CLEANUP_INTERVAL:
+            return
+        self.__last_cleanup_time = now
+        for name in os.listdir(self.directory):
+            re_match = self.REF_RE.match(name)
+            if re_match is not None and int(re_match.group(1)) < now:
+                self.delete(name)
@@ -0,0 +1,111 @@
+from typing import *
+
+import gzip
+import lzma
+import zlib
+
+from ..error import WormholeDecodeError
+
+try:
+    import mgzip
+except ImportError:
+    mgzip = None
+
+
+class WormholeCompressionPolicy:
+    """
+    Decides which payloads are compressed and how.
+    Every queue has a threshold, payloads shorter than the threshold of their queue are not compressed. The threshold
+    starts at min_length, it doubles whenever a payload of the queue does not compress below max_ratio of its length
+    and halves back whenever one does. Every probe_interval-th payload below the raised threshold is compressed anyway
+    so queues whose payloads became compressible again are noticed.
+    Payloads longer than SAMPLE_LENGTH * 4 are first sampled, a sample compressing badly skips the whole payload.
+    gzip and mgzip (multi-threaded gzip) payloads are decoded by every receiver, zlib and lzma payloads only by
+    receivers knowing their header.
+    """
+    GZIP_HEADER = b'$'
+    ZLIB_HEADER = b'~'
+    LZMA_HEADER = b'*'
+    CODECS = ("gzip", "mgzip", "zlib", "lzma")
+    SAMPLE_LENGTH = 4096
+    MAX_THRESHOLD = 16 * 1024 * 1024
+    MAX_TRACKED_QUEUES = 10000
+    MGZIP_BLOCK_LENGTH = 1024 * 1024
+    DEFAULT_MIN_LENGTH = 2048
+
+    def __init__(self, codec: str = "gzip", level: int = 6, min_length: int = DEFAULT_MIN_LENGTH,
+                 max_ratio: float = 0.9, probe_interval: int = 64, threads: Optional[int] = None):
+        if codec not in self.CODECS:
+            raise ValueError(f"Unknown compression codec: {codec}")
+        if codec == "mgzip" and mgzip is None:
+            raise ValueError("The mgzip codec requires the mgzip package")
+        self.codec = codec
+        self.level = level
+        self.min_length = min_length
+        self.max_ratio = max_ratio
+        self.probe_interval = probe_interval
+        self.threads = threads
+        # queue name -> (threshold, payloads skipped below the threshold since the last probe)
+        self.__queue_thresholds: Dict[str, Tuple[int, int]] = {}
+
+    def get_threshold(self, queue_name: Optional[str]) -> int:
+        return self.__queue_thresholds.get(queue_name, (self.min_length, 0))[0]
+
+    def compress_if_needed(self, data: bytes, queue_name: Optional[str] = None) -> bytes:
+        """Returns the compressed data behind its codec header, or the data itself when compressing does not pay"""
+        length = len(data)
+        if length <= self.min_length:
+            return data
+        threshold, skipped_count = self.__queue_thresholds.get(queue_name, (self.min_length, 0))
+        if length <= threshold:
+            skipped_count += 1
+            if skipped_count < self.probe_interval:
+                self.__set_threshold(queue_name, threshold, skipped_count)
+                return data
+        compressed = None
+        if length <= self.SAMPLE_LENGTH * 4 or self.__sample_compresses(data):
+            compressed = self.__compress(data)
+            if len(compressed) > length * self.max_ratio:
+                compressed = None
+        if compressed is None:
+            self.__set_threshold(queue_name, min(max(threshold, length) * 2, self.MAX_THRESHOLD), 0)
+            return data
+        self.__set_threshold(queue_name, max(self.min_length, threshold // 2), 0)
+        return compressed
+
+    def __sample_compresses(self, data: bytes) -> bool:
+        sample_start = (len(data) - self.SAMPLE_LENGTH) // 2
+        sample = memoryview(data)[sample_start:sample_start + self.SAMPLE_LENGTH]
+        return len(zlib.compress(sample, 1)) <= self.SAMPLE_LENGTH * self.max_ratio
+
+    def __set_threshold(self, queue_name: Optional[str], threshold: int, skipped_count: int):
+        if threshold == self.min_length and skipped_count == 0:
+            self.__queue_thresholds.pop(queue_name, None)
+            return
+        if len(self.__queue_thresholds) >= self.MAX_TRACKED_QUEUES and queue_name not in self.__queue_thresholds:
+            self.__queue_thresholds.clear()
+        self.__queue_thresholds[queue_name] = (threshold, skipped_count)
+
+    def __compress(self, data: bytes) -> bytes:
+        if self.codec == "gzip":
+            return self.GZIP_HEADER + gzip.compress(data, self.level)
+        if self.codec == "mgzip":
+            return self.GZIP_HEADER + mgzip.compress(data, compresslevel=self.level, thread=self.threads,
+                                                     blocksize=self.MGZIP_BLOCK_LENGTH)
+        if self.codec == "zlib":
+            return self.ZLIB_HEADER + zlib.compress(data, self.level)
+        return self.LZMA_HEADER + lzma.compress(data, preset=self.level)
+
+    @classmethod
+    def decompress_if_needed(cls, data: bytes) -> bytes:
+        header = data[0]
+        try:
+            if header == cls.GZIP_HEADER[0]:
+                return gzip.decompress(data[1:])
+            if header == cls.ZLIB_HEADER[0]:
+                return zlib.decompress(data[1:])
+            if header == cls.LZMA_HEADER[0]:
+                return lzma.decompress(data[1:])
+        except (OSError, EOFError, zlib.error, lzma.LZMAError) as e:
+            raise WormholeDecodeError(f"Error decompressing data: {e}")
+        return data
\ No newline at end of file
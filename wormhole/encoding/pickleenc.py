@@ -1,6 +1,8 @@
-from typing import Any
+from typing import Any, Optional, List, Union
 
-import gzip
+import io
+import pickle
+import struct
 
 from ..error import WormholeDecodeError
 
@@ -10,38 +12,143 @@ except ImportError:
     from pickle import loads, dumps, UnpicklingError
 
 from .base import WormholeEncoder
+from .compression import WormholeCompressionPolicy
+
+
+class _OutOfBandPickler(pickle.Pickler):
+    """
+    Pickles with protocol 5, bytes and bytearrays of at least min_length bytes are kept out of the pickle by their
+    persistent id, the index of their frame and whether it is a bytearray
+    """
+
+    def __init__(self, file, buffer_callback, min_length: int):
+        super().__init__(file, protocol=5, buffer_callback=buffer_callback)
+        self.min_length = min_length
+        self.frames: List[Union[bytes, bytearray]] = []
+
+    def persistent_id(self, obj):
+        if (type(obj) is bytes or type(obj) is bytearray) and len(obj) >= self.min_length:
+            self.frames.append(obj)
+            return len(self.frames) - 1, type(obj) is bytearray
+        return None
+
+
+class _OutOfBandUnpickler(pickle.Unpickler):
+    """
+    Loads the out-of-band bytes and bytearrays as copies of their frames, or as memoryviews of them when zero_copy is
+    set
+    """
+
+    def __init__(self, file, frames: List[memoryview], buffers: List[memoryview], zero_copy: bool):
+        super().__init__(file, buffers=buffers)
+        self.frames = frames
+        self.zero_copy = zero_copy
+
+    def persistent_load(self, pid):
+        index, is_bytearray = pid
+        frame = self.frames[index]
+        if self.zero_copy:
+            return frame
+        return bytearray(frame) if is_bytearray else bytes(frame)
 
 
 class WormholePickleEncoder(WormholeEncoder):
-    MINIMUM_LENGTH_TO_COMPRESS = 2048
-    COMPRESSION_HEADER = b'$'
+    """
+    Pickles objects, raw bytes are sent as they are. Raw bytes decoded from a memoryview, like a blob of a blob store,
+    are copied back to bytes unless zero_copy is set, in which case they are decoded as a view.
+    When an out_of_band_threshold is given, objects are pickled with protocol 5 and buffers of at least that many bytes
+    (bytes, bytearrays and objects pickling their data as PickleBuffers, like numpy arrays) are framed after the
+    pickle instead of being copied into it. Only the pickle itself is compressed. Such buffers are decoded as copies,
+    bytes to bytes and bytearrays to bytearrays. With zero_copy they are decoded over the received payload instead,
+    bytes and bytearrays as read-only memoryviews.
+    """
+    MINIMUM_LENGTH_TO_COMPRESS = WormholeCompressionPolicy.DEFAULT_MIN_LENGTH
+    COMPRESSION_HEADER = WormholeCompressionPolicy.GZIP_HEADER
     UNPICKLED_DATA_HEADER = b'%'
     PICKLED_DATA_HEADER = b'^'
+    OUT_OF_BAND_HEADER = b'!'
+    # Frame count, buffer count and pickle length, followed by the length of every frame and buffer
+    OUT_OF_BAND_FRAME = struct.Struct("<IIQ")
 
-    @classmethod
-    def __compress_data_if_needed(cls, data: bytes) -> bytes:
-        if len(data) > cls.MINIMUM_LENGTH_TO_COMPRESS:
-            return cls.COMPRESSION_HEADER + gzip.compress(data)
-        return data
-
-    def __decompress_data_if_needed(self, data: bytes) -> bytes:
-        if data[0] == self.COMPRESSION_HEADER[0]:
-            return gzip.decompress(data[1:])
-        return data
+    def __init__(self, compression_policy: Optional[WormholeCompressionPolicy] = None,
+                 out_of_band_threshold: Optional[int] = None, zero_copy: bool = False):
+        if compression_policy is None:
+            compression_policy = WormholeCompressionPolicy(min_length=self.MINIMUM_LENGTH_TO_COMPRESS)
+        self.compression_policy = compression_policy
+        self.out_of_band_threshold = out_of_band_threshold
+        self.zero_copy = zero_copy
 
     def encode(self, obj: Any) -> bytes:
+        return self.encode_for_queue(obj, None)
+
+    def encode_for_queue(self, obj: Any, queue_name: Optional[str]) -> bytes:
         if isinstance(obj, bytes):
             data = self.UNPICKLED_DATA_HEADER + obj
+        elif self.out_of_band_threshold is not None:
+            return self.__encode_out_of_band(obj, queue_name)
         else:
             data = dumps(obj)
-        data = self.__compress_data_if_needed(data)
-        return data
+        return self.compression_policy.compress_if_needed(data, queue_name)
+
+    def __encode_out_of_band(self, obj: Any, queue_name: Optional[str]) -> bytes:
+        buffers: List[memoryview] = []
+
+        def buffer_callback(buffer: pickle.PickleBuffer) -> bool:
+            raw_buffer = buffer.raw()
+            if raw_buffer.nbytes < self.out_of_band_threshold:
+                return True  # Small buffers are cheaper in-band
+            buffers.append(raw_buffer)
+            return False
+
+        stream = io.BytesIO()
+        pickler = _OutOfBandPickler(stream, buffer_callback, self.out_of_band_threshold)
+        pickler.dump(obj)
+        frames = pickler.frames
+        data = self.compression_policy.compress_if_needed(stream.getbuffer(), queue_name)
+        if len(frames) == 0 and len(buffers) == 0:
+            return bytes(data)
+        header = self.OUT_OF_BAND_FRAME.pack(len(frames), len(buffers), len(data))
+        lengths = [len(f) for f in frames] + [b.nbytes for b in buffers]
+        # The only copy of frames and buffers is into the payload itself
+        return b"".join([self.OUT_OF_BAND_HEADER, header, struct.pack(f"<{len(lengths)}Q", *lengths), data] +
+                        frames + buffers)
+
+    def __decode_out_of_band(self, data: bytes) -> Any:
+        view = memoryview(data)
+        try:
+            frame_count, buffer_count, pickle_length = self.OUT_OF_BAND_FRAME.unpack_from(view, 1)
+            offset = 1 + self.OUT_OF_BAND_FRAME.size
+            lengths = struct.unpack_from(f"<{frame_count + buffer_count}Q", view, offset)
+        except struct.error as e:
+            raise WormholeDecodeError(f"Error decoding data: {e}")
+        offset += 8 * len(lengths)
+        pickled = view[offset:offset + pickle_length]
+        offset += pickle_length
+        views: List[Union[memoryview, bytearray]] = []
+        for length in lengths:
+            views.append(view[offset:offset + length])
+            offset += length
+        if not self.zero_copy:
+            # Objects rebuilt from buffers get writable copies, as they would from an in-band pickle
+            views[frame_count:] = [bytearray(v) for v in views[frame_count:]]
+        if offset != len(view):
+            raise WormholeDecodeError(f"Error decoding data: expected {offset} bytes, got {len(view)}")
+        try:
+            pickled = self.compression_policy.decompress_if_needed(pickled)
+            return _OutOfBandUnpickler(io.BytesIO(pickled), views[:frame_count], views[frame_count:],
+                                       self.zero_copy).load()
+        except Exception as e:
+            raise WormholeDecodeError(f"Error decoding data: {e}")
 
     def decode(self, data: bytes) -> Any:
-        data = self.__decompress_data_if_needed(data)
+        if data[0] == self.OUT_OF_BAND_HEADER[0]:
+            return self.__decode_out_of_band(data)
+        data = self.compression_policy.decompress_if_needed(data)
         if data[0] == self.UNPICKLED_DATA_HEADER[0]:
+            if isinstance(data, memoryview) and not self.zero_copy:
+                return bytes(data[1:])
             return data[1:]
         try:
             return loads(data)
         except Exception as e:
-            raise WormholeDecodeError(f"Error decoding data: {e} {repr(data)}")
+            raise WormholeDecodeError(f"Error decoding data: {e} {repr(data)}")
\ No newline at end of file
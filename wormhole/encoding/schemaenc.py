@@ -0,0 +1,36 @@
+from typing import *
+
+from ..error import WormholeDecodeError
+from ..schema import get_schema, get_schema_by_type_id
+from .base import WormholeEncoder
+from .pickleenc import WormholePickleEncoder
+
+
+class WormholeSchemaEncoder(WormholeEncoder):
+    """
+    Packs instances of classes declared with wormhole_schema by their fields, everything else is encoded by the
+    fallback encoder
+    """
+    SCHEMA_HEADER = b'#'
+
+    def __init__(self, fallback_encoder: Optional[WormholeEncoder] = None):
+        if fallback_encoder is None:
+            fallback_encoder = WormholePickleEncoder()
+        self.fallback_encoder = fallback_encoder
+
+    def encode(self, obj: Any) -> bytes:
+        return self.encode_for_queue(obj, None)
+
+    def encode_for_queue(self, obj: Any, queue_name: Optional[str]) -> bytes:
+        schema = get_schema(type(obj))
+        if schema is None:
+            return self.fallback_encoder.encode_for_queue(obj, queue_name)
+        return self.SCHEMA_HEADER + schema.pack(obj)
+
+    def decode(self, data: bytes) -> Any:
+        if data[0] != self.SCHEMA_HEADER[0]:
+            return self.fallback_encoder.decode(data)
+        schema = get_schema_by_type_id(data[1]) if len(data) > 1 else None
+        if schema is None:
+            raise WormholeDecodeError(f"Error decoding data: unknown schema type id {data[1:2]}")
+        return schema.unpack(data, 1)
\ No newline at end of file
@@ -0,0 +1,202 @@
+from typing import *
+
+import time
+import zlib
+import heapq
+import struct
+import threading
+import collections
+
+import redis
+
+from ..error import WormholeDecodeError
+from .base import WormholeEncoder
+from .pickleenc import WormholePickleEncoder
+
+
+def train_zdict(samples: List[bytes], max_size: int, shingle_length: int = 8) -> bytes:
+    """
+    Builds a zlib preset dictionary from samples. Samples are picked greedily by how many shingles (substrings of
+    shingle_length bytes) seen in other samples they add, the most useful sample ends up at the end of the dictionary
+    where zlib finds its matches cheapest.
+    """
+    shingle_sets = [{sample[i:i + shingle_length] for i in range(len(sample) - shingle_length + 1)}
+                    for sample in samples]
+    document_frequency = collections.Counter(shingle for shingles in shingle_sets for shingle in shingles)
+    covered: Set[bytes] = set()
+
+    def gain(index: int) -> int:
+        return sum(document_frequency[s] - 1 for s in shingle_sets[index] if s not in covered)
+
+    # Gains only shrink as shingles get covered, a stale gain is recomputed only when it tops the heap (lazy greedy)
+    heap = [(-gain(i), i) for i in range(len(samples))]
+    heapq.heapify(heap)
+    picked: List[bytes] = []
+    size = 0
+    while heap and size < max_size:
+        _, index = heapq.heappop(heap)
+        current_gain = gain(index)
+        if heap and current_gain < -heap[0][0]:
+            heapq.heappush(heap, (-current_gain, index))
+            continue
+        if current_gain == 0:
+            break
+        covered.update(shingle_sets[index])
+        picked.append(samples[index])
+        size += len(samples[index])
+    return b"".join(reversed(picked))[-max_size:]
+
+
+class WormholeZdictEncoder(WormholeEncoder):
+    """
+    Compresses small payloads with a zlib preset dictionary trained for their queue.
+    Until a queue has a dictionary its payloads are sampled, once sample_count samples were taken a dictionary is
+    trained from them on a background thread and shared through redis under a numeric id, the id of the dictionary of
+    every queue is kept in redis too. Payloads are sent uncompressed until the dictionary is ready. Payloads carry the
+    id of their dictionary so receivers fetch and cache it on first sight.
+    Dictionaries are never modified, a retrained dictionary gets a new id and the replaced one expires after
+    RETIRED_DICTIONARY_TTL seconds.
+    """
+    ZDICT_HEADER = b'z'
+    DICTIONARY_ID = struct.Struct("<I")
+    DICTIONARY_PREFIX = "whzd://"
+    QUEUE_DICTIONARY_PREFIX = "whzdq://"
+    DICTIONARY_ID_COUNTER = "whzd-ids"
+    RETIRED_DICTIONARY_TTL = 24 * 60 * 60
+    MAX_SAMPLED_QUEUES = 1000
+    MAX_WINDOW_BITS = 15
+
+    def __init__(self, rdb: redis.Redis, inner_encoder: Optional[WormholeEncoder] = None, min_length: int = 64,
+                 max_length: int = 16 * 1024, sample_count: int = 256, dictionary_size: int = 4096,
+                 level: int = 6, refresh_interval: float = 30):
+        if inner_encoder is None:
+            inner_encoder = WormholePickleEncoder()
+        self.rdb = rdb
+        self.inner_encoder = inner_encoder
+        self.min_length = min_length
+        self.max_length = max_length
+        self.sample_count = sample_count
+        self.dictionary_size = dictionary_size
+        # Setting up a compressor hashes its whole window, a window just large enough for the dictionary is cheapest
+        self.__window_bits = min(self.MAX_WINDOW_BITS, max(9, (dictionary_size - 1).bit_length()))
+        self.level = level
+        self.refresh_interval = refresh_interval
+        self.__dictionaries: Dict[int, bytes] = {}
+        # queue name -> (time to look the dictionary id up again, dictionary id or None)
+        self.__queue_dictionary_ids: Dict[str, Tuple[float, Optional[int]]] = {}
+        self.__samples: Dict[str, List[bytes]] = {}
+        # Guards the samples and the trainings, senders of a queue race to hand its samples to a training
+        self.__training_lock = threading.Lock()
+        # queue name -> thread training its dictionary
+        self.__trainings: Dict[str, threading.Thread] = {}
+
+    def encode(self, obj: Any) -> bytes:
+        return self.inner_encoder.encode(obj)
+
+    def encode_for_queue(self, obj: Any, queue_name: Optional[str]) -> bytes:
+        data = self.inner_encoder.encode_for_queue(obj, queue_name)
+        if queue_name is None or not self.min_length <= len(data) <= self.max_length:
+            return data
+        dictionary_id = self.get_dictionary_id(queue_name)
+        if dictionary_id is None:
+            self.__add_sample(queue_name, data)
+            return data
+        # Raw deflate, the dictionary id replaces the zlib header
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, -self.__window_bits,
+                                      zdict=self.__get_dictionary(dictionary_id))
+        compressed = compressor.compress(data) + compressor.flush()
+        if len(compressed) + 5 >= len(data):
+            return data
+        return self.ZDICT_HEADER + self.DICTIONARY_ID.pack(dictionary_id) + compressed
+
+    def decode(self, data: bytes) -> Any:
+        if data[0] != self.ZDICT_HEADER[0]:
+            return self.inner_encoder.decode(data)
+        try:
+            dictionary_id, = self.DICTIONARY_ID.unpack_from(data, 1)
+            # The largest window decompresses data of any window size
+            decompressor = zlib.decompressobj(-self.MAX_WINDOW_BITS, zdict=self.__get_dictionary(dictionary_id))
+            decompressed = decompressor.decompress(memoryview(data)[1 + self.DICTIONARY_ID.size:])
+        except (struct.error, zlib.error, KeyError) as e:
+            raise WormholeDecodeError(f"Error decoding data: {e}")
+        return self.inner_encoder.decode(decompressed)
+
+    def get_dictionary_id(self, queue_name: str) -> Optional[int]:
+        """The id of the dictionary of the queue, looked up in redis at most every refresh_interval seconds"""
+        now = time.time()
+        refresh_time, dictionary_id = self.__queue_dictionary_ids.get(queue_name, (0, None))
+        if refresh_time > now:
+            return dictionary_id
+        dictionary_id = self.rdb.get(f"{self.QUEUE_DICTIONARY_PREFIX}{queue_name}")
+        if dictionary_id is not None:
+            dictionary_id = int(dictionary_id)
+        self.__queue_dictionary_ids[queue_name] = (now + self.refresh_interval, dictionary_id)
+        return dictionary_id
+
+    def train(self, queue_name: str, samples: List[bytes], replace: bool = True) -> int:
+        """
+        Trains a dictionary for the queue from encoded payloads and returns its id. When the queue already has a
+        dictionary and replace is False, the existing dictionary is kept and its id is returned.
+        """
+        dictionary = train_zdict(samples, self.dictionary_size)
+        dictionary_id = self.rdb.incr(self.DICTIONARY_ID_COUNTER)
+        dictionary_key = f"{self.DICTIONARY_PREFIX}{dictionary_id}"
+        queue_key = f"{self.QUEUE_DICTIONARY_PREFIX}{queue_name}"
+        self.rdb.set(dictionary_key, dictionary)
+        if replace:
+            previous_id = self.rdb.getset(queue_key, dictionary_id)
+            if previous_id is not None:
+                # Messages compressed with the replaced dictionary may still be queued
+                self.rdb.expire(f"{self.DICTIONARY_PREFIX}{int(previous_id)}", self.RETIRED_DICTIONARY_TTL)
+        elif not self.rdb.set(queue_key, dictionary_id, nx=True):
+            # Another sender trained one first, use it
+            self.rdb.delete(dictionary_key)
+            self.__queue_dictionary_ids.pop(queue_name, None)
+            return self.get_dictionary_id(queue_name)
+        self.__dictionaries[dictionary_id] = dictionary
+        self.__queue_dictionary_ids[queue_name] = (time.time() + self.refresh_interval, dictionary_id)
+        return dictionary_id
+
+    def wait_for_training(self, timeout: Optional[float] = None):
+        """Waits for the dictionaries being trained to be ready"""
+        with self.__training_lock:
+            trainings = list(self.__trainings.values())
+        deadline = None if timeout is None else time.time() + timeout
+        for training in trainings:
+            training.join(None if deadline is None else max(0.0, deadline - time.time()))
+
+    def __add_sample(self, queue_name: str, data: bytes):
+        with self.__training_lock:
+            if queue_name in self.__trainings:
+                return
+            samples = self.__samples.get(queue_name)
+            if samples is None:
+                if len(self.__samples) >= self.MAX_SAMPLED_QUEUES:
+                    self.__samples.clear()
+                samples = self.__samples[queue_name] = []
+            samples.append(bytes(data))
+            if len(samples) < self.sample_count:
+                return
+            del self.__samples[queue_name]
+            # Training takes a while, it is kept off the send path
+            training = threading.Thread(target=self.__train_in_background, args=(queue_name, samples), daemon=True)
+            self.__trainings[queue_name] = training
+        training.start()
+
+    def __train_in_background(self, queue_name: str, samples: List[bytes]):
+        try:
+            self.train(queue_name, samples, replace=False)
+        except redis.RedisError:
+            pass  # The queue is sampled again
+        finally:
+            with self.__training_lock:
+                del self.__trainings[queue_name]
+
+    def __get_dictionary(self, dictionary_id: int) -> bytes:
+        dictionary = self.__dictionaries.get(dictionary_id)
+        if dictionary is None:
+            dictionary = self.rdb.get(f"{self.DICTIONARY_PREFIX}{dictionary_id}")
+            if dictionary is None:
+                raise KeyError(f"No such compression dictionary: {dictionary_id}")
+            self.__dictionaries[dictionary_id] = dictionary
+        return dictionary
\ No newline at end of file
@@ -0,0 +1,109 @@
+﻿import time
+import threading
+
+import redis
+
+from typing import *
+
+
+class WormholeGroupCacheStats(NamedTuple):
+    hits: int
+    misses: int
+    invalidations: int
+
+
+class WormholeGroupCache:
+    """
+    Keeps the members of groups for up to ttl seconds, the members of a group are dropped as soon as a member joins or
+    leaves it. Joins and leaves are published on a pub/sub channel, a listener thread (a greenlet when gevent patched
+    threading) subscribes to it. Members are only kept while the listener is subscribed, so no change goes unnoticed.
+    Members leaving by expiring are not published, they are dropped from the cache by the ttl.
+    """
+    LISTEN_TIMEOUT = 1
+
+    def __init__(self, changes_channel: str, get_rdb: Callable[[], redis.Redis], ttl: float):
+        self.__changes_channel = changes_channel
+        self.__get_rdb = get_rdb
+        self.__ttl = ttl
+        self.__lock = threading.Lock()
+        # group name -> (expiration time, members)
+        self.__entries: Dict[str, Tuple[float, List[str]]] = {}
+        # Grows with every invalidation, members fetched across an invalidation may be stale and are not kept
+        self.__generation = 0
+        self.__listener: Optional[threading.Thread] = None
+        self.__is_subscribed = False
+        self.__closed = False
+        self.__hits = 0
+        self.__misses = 0
+        self.__invalidations = 0
+
+    def get(self, group_name: str, fetch: Callable[[str], List[str]]) -> List[str]:
+        with self.__lock:
+            self.__start_listener_if_needed()
+            entry = self.__entries.get(group_name)
+            if entry is not None and entry[0] > time.monotonic():
+                self.__hits += 1
+                return list(entry[1])
+            self.__misses += 1
+            generation = self.__generation
+        members = fetch(group_name)
+        with self.__lock:
+            if self.__is_subscribed and generation == self.__generation:
+                self.__entries[group_name] = (time.monotonic() + self.__ttl, members)
+        return list(members)
+
+    def invalidate(self, group_names: Optional[Iterable[str]] = None):
+        """Drops the members of the groups, of all the groups when none are given"""
+        with self.__lock:
+            self.__generation += 1
+            self.__invalidations += 1
+            if group_names is None:
+                self.__entries.clear()
+                return
+            for group_name in group_names:
+                self.__entries.pop(group_name, None)
+
+    def get_stats(self) -> WormholeGroupCacheStats:
+        with self.__lock:
+            return WormholeGroupCacheStats(self.__hits, self.__misses, self.__invalidations)
+
+    def close(self):
+        with self.__lock:
+            self.__closed = True
+            self.__is_subscribed = False
+            self.__entries.clear()
+
+    def __start_listener_if_needed(self):
+        if self.__listener is not None or self.__closed:
+            return
+        self.__listener = threading.Thread(target=self.__listen_loop, daemon=True)
+        self.__listener.start()
+
+    def __listen_loop(self):
+        pubsub = None
+        try:
+            pubsub = self.__get_rdb().pubsub()
+            pubsub.subscribe(self.__changes_channel)
+            while not self.__closed:
+                message = pubsub.get_message(timeout=self.LISTEN_TIMEOUT)
+                if message is None:
+                    continue
+                if message["type"] == "subscribe":
+                    # Changes published before the subscription took effect were missed
+                    self.invalidate()
+                    with self.__lock:
+                        self.__is_subscribed = not self.__closed
+                elif message["type"] == "message":
+                    self.invalidate([message["data"].decode()])
+        except Exception:
+            pass  # The channel was closed or the connection failed, the next get subscribes again
+        finally:
+            with self.__lock:
+                self.__is_subscribed = False
+                self.__entries.clear()
+                self.__listener = None
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
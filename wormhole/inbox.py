@@ -0,0 +1,117 @@
+﻿import time
+import threading
+
+import redis
+
+from typing import *
+
+from .error import WormholeChannelClosedError, WormholeChannelConnectionError
+from .wire import unpack_inbox_reply
+
+
+class WormholeReplyInbox:
+    """
+    Receives the replies to all the messages sent by one wormhole from a single redis list.
+    A dispatcher thread (a greenlet when gevent patched threading) blocks on the list while there are waiters and
+    routes every reply entry to the waiter of its message id, replies nobody waits for yet are kept until they expire.
+    """
+    DISPATCH_BLOCK_TIMEOUT = 1
+    DISPATCH_BATCH_SIZE = 100
+
+    def __init__(self, inbox_key: str, get_rdb: Callable[[], redis.Redis], reply_expiration: int):
+        self.__inbox_key = inbox_key
+        self.__get_rdb = get_rdb
+        self.__reply_expiration = reply_expiration
+        self.__condition = threading.Condition()
+        # message id -> (expiration time, inline reply entry)
+        self.__replies: Dict[str, Tuple[float, bytes]] = {}
+        self.__waiter_count = 0
+        self.__dispatcher: Optional[threading.Thread] = None
+        self.__dispatch_error: Optional[Exception] = None
+        self.__closed = False
+        self.__last_prune_time = time.time()
+
+    @property
+    def inbox_key(self) -> str:
+        return self.__inbox_key
+
+    def close(self):
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+
+    def has_reply(self, message_id: str) -> bool:
+        with self.__condition:
+            if message_id in self.__replies:
+                return True
+        self.__deliver(self.__get_rdb().rpop(self.__inbox_key, self.DISPATCH_BATCH_SIZE) or [])
+        with self.__condition:
+            return message_id in self.__replies
+
+    def wait(self, message_id: str, timeout: float) -> Optional[bytes]:
+        """Returns the inline reply entry of the message or None when the timeout passed, a zero timeout blocks forever"""
+        deadline = None
+        if timeout:
+            deadline = time.time() + timeout
+        with self.__condition:
+            self.__waiter_count += 1
+            try:
+                while message_id not in self.__replies:
+                    if self.__closed:
+                        raise WormholeChannelClosedError("Wormhole channel was closed, cannot use")
+                    if self.__dispatch_error is not None:
+                        dispatch_error, self.__dispatch_error = self.__dispatch_error, None
+                        raise WormholeChannelConnectionError(f"Connection error receiving replies: {dispatch_error}")
+                    self.__start_dispatcher_if_needed()
+                    if deadline is None:
+                        self.__condition.wait()
+                        continue
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self.__condition.wait(remaining)
+                return self.__replies.pop(message_id)[1]
+            finally:
+                self.__waiter_count -= 1
+
+    def __start_dispatcher_if_needed(self):
+        if self.__dispatcher is not None:
+            return
+        self.__dispatcher = threading.Thread(target=self.__dispatch_loop, daemon=True)
+        self.__dispatcher.start()
+
+    def __dispatch_loop(self):
+        while True:
+            with self.__condition:
+                if self.__closed or self.__waiter_count == 0:
+                    # Nobody is waiting, don't hold a connection until the next wait
+                    self.__dispatcher = None
+                    return
+            try:
+                rdb = self.__get_rdb()
+                result = rdb.brpop(self.__inbox_key, self.DISPATCH_BLOCK_TIMEOUT)
+                if result:
+                    entries = [result[1]] + (rdb.rpop(self.__inbox_key, self.DISPATCH_BATCH_SIZE) or [])
+                    self.__deliver(entries)
+            except Exception as e:
+                # Closing the channel disconnects the pool under the blocked BRPOP, anything may be raised here
+                with self.__condition:
+                    self.__dispatcher = None
+                    if not self.__closed:
+                        self.__dispatch_error = e
+                    self.__condition.notify_all()
+                return
+
+    def __deliver(self, entries: List[bytes]):
+        if len(entries) == 0:
+            return
+        now = time.time()
+        with self.__condition:
+            if now - self.__last_prune_time >= 1:
+                self.__last_prune_time = now
+                for message_id in [k for k, v in self.__replies.items() if v[0] < now]:
+                    del self.__replies[message_id]
+            for entry in entries:
+                message_id, reply_entry = unpack_inbox_reply(entry)
+                self.__replies[message_id] = (now + self.__reply_expiration, reply_entry)
+            self.__condition.notify_all()
@@ -0,0 +1,54 @@
+﻿import time
+import threading
+
+from redis import BlockingConnectionPool
+
+from typing import *
+
+
+class WormholePoolStats(NamedTuple):
+    max_connections: int
+    in_use: int
+    checkouts: int
+    total_wait_time: float
+    max_wait_time: float
+
+    @property
+    def average_wait_time(self) -> float:
+        if self.checkouts == 0:
+            return 0.0
+        return self.total_wait_time / self.checkouts
+
+
+class WormholeConnectionPool(BlockingConnectionPool):
+    """A blocking connection pool measuring how long getting a connection from it takes"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.__stats_lock = threading.Lock()
+        self.__in_use = 0
+        self.__checkouts = 0
+        self.__total_wait_time = 0.0
+        self.__max_wait_time = 0.0
+
+    def get_connection(self, *args, **kwargs):
+        start_time = time.monotonic()
+        connection = super().get_connection(*args, **kwargs)
+        wait_time = time.monotonic() - start_time
+        with self.__stats_lock:
+            self.__in_use += 1
+            self.__checkouts += 1
+            self.__total_wait_time += wait_time
+            if wait_time > self.__max_wait_time:
+                self.__max_wait_time = wait_time
+        return connection
+
+    def release(self, connection):
+        with self.__stats_lock:
+            self.__in_use = max(0, self.__in_use - 1)
+        super().release(connection)
+
+    def get_stats(self) -> WormholePoolStats:
+        with self.__stats_lock:
+            return WormholePoolStats(self.max_connections, self.__in_use, self.__checkouts,
+                                     self.__total_wait_time, self.__max_wait_time)
@@ -0,0 +1,53 @@
+﻿import time
+import threading
+
+from typing import *
+
+from .channel import AbstractWormholeChannel, WormholeRateLimitResult
+
+
+class WormholeLocalRateLimiter:
+    """
+    Admits requests against a channel rate limit shared by all processes, taking tokens from the channel in batches
+    so most admit decisions are made locally without a round trip.
+    Tokens of a batch are only good for duration seconds, the window they were admitted in, and once the channel
+    denies a batch requests are denied locally until the channel may admit again.
+    """
+
+    def __init__(self, channel: AbstractWormholeChannel, limit_name: str, max_amount: int, duration: float,
+                 batch_size: Optional[int] = None):
+        if batch_size is None:
+            batch_size = max(1, max_amount // 10)
+        assert 1 <= batch_size <= max_amount, "'batch_size' must be between 1 and 'max_amount'"
+        self.channel = channel
+        self.limit_name = limit_name
+        self.max_amount = max_amount
+        self.duration = duration
+        self.batch_size = batch_size
+        self.__lock = threading.Lock()
+        self.__tokens = 0
+        self.__tokens_expire_at = 0.0
+        self.__denied_until = 0.0
+
+    def admit(self, count: int = 1) -> WormholeRateLimitResult:
+        with self.__lock:
+            now = time.monotonic()
+            if self.__tokens_expire_at < now:
+                self.__tokens = 0
+            if self.__tokens < count:
+                if self.__denied_until > now:
+                    return WormholeRateLimitResult(0, self.__denied_until - now)
+                self.__take_batch(count, now)
+            if self.__tokens < count:
+                return WormholeRateLimitResult(0, self.__denied_until - now)
+            self.__tokens -= count
+            return WormholeRateLimitResult(count, 0.0)
+
+    def __take_batch(self, count: int, now: float):
+        requested = min(self.max_amount, max(self.batch_size, count - self.__tokens))
+        result = self.channel.rate_limit(self.limit_name, self.max_amount, self.duration, requested, partial=True)
+        if result.admitted_count > 0:
+            self.__tokens += result.admitted_count
+            self.__tokens_expire_at = now + self.duration
+        if self.__tokens < count:
+            self.__denied_until = now + max(result.retry_after, 0.001)
@@ -0,0 +1,143 @@
+﻿import struct
+
+from typing import *
+
+from .error import WormholeSchemaError, WormholeDecodeError
+
+T = TypeVar("T")
+
+# Fixed size fields are packed by a single precompiled struct, str and bytes fields follow them prefixed by length
+FIXED_FIELD_FORMATS: Dict[type, str] = {float: "d", int: "q", bool: "?"}
+VARIABLE_FIELD_TYPES = (str, bytes)
+
+
+class WormholeSchema:
+    """
+    The fields of a message class and the struct packing them, instances are packed as their type id, their fixed
+    size fields, the lengths of their variable size fields and the variable size fields themselves
+    """
+    def __init__(self, type_id: int, cls: type, fields: List[Tuple[str, type]]):
+        self.type_id = type_id
+        self.cls = cls
+        self.field_names = [name for name, _ in fields]
+        fixed_fields = [(name, t) for name, t in fields if t in FIXED_FIELD_FORMATS]
+        variable_fields = [(name, t) for name, t in fields if t in VARIABLE_FIELD_TYPES]
+        fixed_formats = "".join(FIXED_FIELD_FORMATS[t] for _, t in fixed_fields)
+        self.__struct = struct.Struct(f"<B{fixed_formats}{'I' * len(variable_fields)}")
+        self.__pack, self.__unpack = self.__compile(fixed_fields, variable_fields)
+
+    def __compile(self, fixed_fields: List[Tuple[str, type]],
+                  variable_fields: List[Tuple[str, type]]) -> Tuple[Callable, Callable]:
+        """Generates the pack and unpack functions of the fields, like namedtuple does for its classes"""
+        fixed_names = [f"obj.{name}" for name, _ in fixed_fields]
+        variable_names = [f"v{i}" for i in range(len(variable_fields))]
+        pack_lines = ["def pack(obj):"]
+        for variable_name, (name, field_type) in zip(variable_names, variable_fields):
+            pack_lines.append(f"    {variable_name} = obj.{name}{'.encode()' if field_type is str else ''}")
+        header_values = ", ".join([str(self.type_id)] + fixed_names + [f"len({v})" for v in variable_names])
+        pack_lines.append(f"    return b''.join((struct_pack({header_values}), {', '.join(variable_names)}))")
+
+        unpacked_names = [f"f{i}" for i in range(len(fixed_fields))] + [f"l{i}" for i in range(len(variable_fields))]
+        unpack_lines = ["def unpack(data, offset):",
+                        f"    _, {''.join(n + ', ' for n in unpacked_names)}= struct_unpack_from(data, offset)",
+                        "    obj = new(cls)"]
+        for i, (name, _) in enumerate(fixed_fields):
+            unpack_lines.append(f"    obj.{name} = f{i}")
+        unpack_lines.append(f"    offset += {self.__struct.size}")
+        for i, (name, field_type) in enumerate(variable_fields):
+            value = "str(data[offset:end], 'utf-8')" if field_type is str else "bytes(data[offset:end])"
+            unpack_lines.append(f"    end = offset + l{i}")
+            unpack_lines.append(f"    obj.{name} = {value}")
+            unpack_lines.append("    offset = end")
+        unpack_lines.append("    return obj")
+        namespace = {"struct_pack": self.__struct.pack, "struct_unpack_from": self.__struct.unpack_from,
+                     "new": self.cls.__new__, "cls": self.cls}
+        exec("\n".join(pack_lines + unpack_lines), namespace)
+        return namespace["pack"], namespace["unpack"]
+
+    def pack(self, obj: Any) -> bytes:
+        try:
+            return self.__pack(obj)
+        except (struct.error, AttributeError, TypeError) as e:
+            raise WormholeSchemaError(f"Cannot pack {self.cls.__name__}: {e}")
+
+    def unpack(self, data: bytes, offset: int = 0) -> Any:
+        """Unpacks an instance packed at the offset of the data"""
+        try:
+            return self.__unpack(data, offset)
+        except (struct.error, UnicodeDecodeError) as e:
+            raise WormholeDecodeError(f"Cannot unpack {self.cls.__name__}: {e}")
+
+
+__SCHEMAS_BY_TYPE_ID: Dict[int, WormholeSchema] = {}
+__SCHEMAS_BY_CLASS: Dict[type, WormholeSchema] = {}
+
+
+def get_schema(cls: type) -> Optional[WormholeSchema]:
+    """Returns the schema of exactly this class, subclasses of schema classes have no schema of their own"""
+    return __SCHEMAS_BY_CLASS.get(cls)
+
+
+def get_schema_by_type_id(type_id: int) -> Optional[WormholeSchema]:
+    return __SCHEMAS_BY_TYPE_ID.get(type_id)
+
+
+def wormhole_schema(type_id: int) -> Callable[[Type[T]], Type[T]]:
+    """
+    Declares the annotated fields of a class as its schema, the schema encoder packs instances of the class instead
+    of pickling them. Fields may be float, int, bool, str or bytes, the class is rebuilt with a slot per field and gets
+    an __init__ taking the fields in order when it has none.
+    The type id identifies the class on the wire, every process must register the same class under it.
+    """
+    if not 0 <= type_id <= 255:
+        raise WormholeSchemaError(f"Schema type id must fit in a byte: {type_id}")
+
+    def decorator(cls: Type[T]) -> Type[T]:
+        existing_schema = __SCHEMAS_BY_TYPE_ID.get(type_id)
+        if existing_schema is not None and existing_schema.cls.__qualname__ != cls.__qualname__:
+            raise WormholeSchemaError(f"Schema type id {type_id} is already used by {existing_schema.cls.__name__}")
+        # Fields of base classes come first
+        field_types: Dict[str, type] = {}
+        for base in reversed(cls.__mro__):
+            field_types.update(base.__dict__.get("__annotations__", {}))
+        for name, field_type in field_types.items():
+            if field_type not in FIXED_FIELD_FORMATS and field_type not in VARIABLE_FIELD_TYPES:
+                raise WormholeSchemaError(f"Unsupported type of schema field {cls.__name__}.{name}: {field_type}")
+        fields = list(field_types.items())
+        schema_cls = __rebuild_with_slots(cls, [name for name, _ in fields])
+        schema = WormholeSchema(type_id, schema_cls, fields)
+        __SCHEMAS_BY_TYPE_ID[type_id] = schema
+        __SCHEMAS_BY_CLASS[schema_cls] = schema
+        return schema_cls
+    return decorator
+
+
+def __rebuild_with_slots(cls: type, field_names: List[str]) -> type:
+    cls_dict = dict(cls.__dict__)
+    defaults = {name: cls_dict.pop(name) for name in field_names if name in cls_dict}
+    cls_dict.pop("__dict__", None)
+    cls_dict.pop("__weakref__", None)
+    base_slots = {name for base in cls.__mro__[1:] for name in base.__dict__.get("__slots__", ())}
+    cls_dict["__slots__"] = tuple(name for name in field_names if name not in base_slots)
+    if "__init__" not in cls_dict:
+        cls_dict["__init__"] = __make_init(field_names, defaults)
+    return type(cls)(cls.__name__, cls.__bases__, cls_dict)
+
+
+def __make_init(field_names: List[str], defaults: Dict[str, Any]) -> Callable:
+    missing = object()
+
+    def __init__(self, *args, **kwargs):
+        if len(args) > len(field_names):
+            raise TypeError(f"{type(self).__name__}() takes {len(field_names)} positional arguments")
+        values = dict(zip(field_names, args))
+        for name, value in kwargs.items():
+            if name not in field_names or name in values:
+                raise TypeError(f"{type(self).__name__}() got an unexpected or duplicate argument '{name}'")
+            values[name] = value
+        for name in field_names:
+            value = values.get(name, defaults.get(name, missing))
+            if value is missing:
+                raise TypeError(f"{type(self).__name__}() missing argument '{name}'")
+            setattr(self, name, value)
+    return __init__
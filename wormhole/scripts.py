@@ -0,0 +1,236 @@
+﻿import weakref
+
+from typing import *
+
+if TYPE_CHECKING:
+    from redis import Redis, ConnectionPool
+    from redis.commands.core import Script
+
+__SCRIPTS_BY_POOL: "weakref.WeakKeyDictionary[ConnectionPool, Dict[str, Script]]" = weakref.WeakKeyDictionary()
+
+# KEYS: queue_name, message_id...
+# ARGV: data_hkey, flags_hkey, flags, expiration, data...
+SEND_SCRIPT = """
+for i = 2, #KEYS do
+    local message_id = KEYS[i]
+    redis.call('HMSET', message_id, ARGV[1], ARGV[i + 3], ARGV[2], ARGV[3])
+    redis.call('EXPIRE', message_id, ARGV[4])
+    redis.call('LPUSH', KEYS[1], message_id)
+end
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+return true
+"""
+
+# KEYS: queue_name
+# ARGV: expiration, inline_entry...
+SEND_INLINE_SCRIPT = """
+for i = 2, #ARGV do
+    redis.call('LPUSH', KEYS[1], ARGV[i])
+end
+redis.call('EXPIRE', KEYS[1], ARGV[1])
+return true
+"""
+
+# KEYS: queue_name...
+# ARGV: max_count
+# Pops up to max_count entries from the queues without blocking, returns a flat list of queue_name, entry
+DRAIN_SCRIPT = """
+local result = {}
+local remaining = tonumber(ARGV[1])
+for _, queue_name in ipairs(KEYS) do
+    while remaining > 0 do
+        local entry = redis.call('RPOP', queue_name)
+        if not entry then
+            break
+        end
+        table.insert(result, queue_name)
+        table.insert(result, entry)
+        remaining = remaining - 1
+    end
+end
+return result
+"""
+
+# KEYS: message_id...
+# ARGV: receiver_id_hkey, receiver_id
+# Marks every existing message as taken by the receiver, returns the flat HGETALL of every message, expired messages
+# are returned as empty lists
+FETCH_AND_TAG_SCRIPT = """
+local result = {}
+for _, message_id in ipairs(KEYS) do
+    if redis.call('EXISTS', message_id) == 1 then
+        redis.call('HSET', message_id, ARGV[1], ARGV[2])
+        table.insert(result, redis.call('HGETALL', message_id))
+    else
+        table.insert(result, {})
+    end
+end
+return result
+"""
+
+# KEYS: message_id, response_queue
+# ARGV: flags_hkey, inline_reply_flag, expiration, inline_reply_header, reply_hkey, signal[, data]
+# Senders flagging their messages get the reply in the signal itself, the reply to messages of older senders is stored
+# in the message hash and only signalled
+REPLY_SCRIPT = """
+local flags = tonumber(redis.call('HGET', KEYS[1], ARGV[1]) or '0')
+if bit.band(flags, tonumber(ARGV[2])) ~= 0 then
+    redis.call('LPUSH', KEYS[2], ARGV[4] .. (ARGV[7] or ''))
+    redis.call('DEL', KEYS[1])
+else
+    if ARGV[7] then
+        redis.call('HSET', KEYS[1], ARGV[5], ARGV[7])
+    end
+    redis.call('LPUSH', KEYS[2], ARGV[6])
+    redis.call('EXPIRE', KEYS[1], ARGV[3])
+end
+redis.call('EXPIRE', KEYS[2], ARGV[3])
+return true
+"""
+
+# KEYS: stream_name...
+# ARGV: group_name, expiration
+# Creates the consumer group on every stream (creating the stream when needed), streams created here expire like queues
+ENSURE_STREAM_GROUPS_SCRIPT = """
+for _, stream_name in ipairs(KEYS) do
+    local created = redis.pcall('XGROUP', 'CREATE', stream_name, ARGV[1], '0', 'MKSTREAM')
+    if type(created) == 'table' and created.err and not string.find(created.err, 'BUSYGROUP') then
+        return redis.error_reply(created.err)
+    end
+    if redis.call('TTL', stream_name) == -1 then
+        redis.call('EXPIRE', stream_name, ARGV[2])
+    end
+end
+return true
+"""
+
+# KEYS: group_key...
+# ARGV: receiver_id, expires_at, timeout, changes_channel, group_name...
+# Adds the receiver to every group sorted set scored by its expiration time, a group key lives as long as its longest
+# living member. The names of the groups the receiver joined are published, returns how many it joined.
+TOUCH_GROUPS_SCRIPT = """
+local timeout = tonumber(ARGV[3])
+local joined = 0
+for i, group_key in ipairs(KEYS) do
+    if redis.call('ZADD', group_key, ARGV[2], ARGV[1]) == 1 then
+        redis.call('PUBLISH', ARGV[4], ARGV[i + 4])
+        joined = joined + 1
+    end
+    if redis.call('TTL', group_key) < timeout then
+        redis.call('EXPIRE', group_key, timeout)
+    end
+end
+return joined
+"""
+
+# KEYS: group_key...
+# ARGV: receiver_id, changes_channel, group_name...
+# The names of the groups the receiver left are published
+REMOVE_FROM_GROUPS_SCRIPT = """
+for i, group_key in ipairs(KEYS) do
+    if redis.call('ZREM', group_key, ARGV[1]) == 1 then
+        redis.call('PUBLISH', ARGV[2], ARGV[i + 2])
+    end
+end
+return true
+"""
+
+# KEYS: lock_key, fencing_counter_key
+# ARGV: lock_secret, lock_timeout_ms (0 for no timeout)
+# Returns {1, fencing_token} when the lock was acquired, {0, lock_pttl} when it is held by someone else
+ACQUIRE_LOCK_SCRIPT = """
+local acquired
+if tonumber(ARGV[2]) > 0 then
+    acquired = redis.call('SET', KEYS[1], ARGV[1], 'NX', 'PX', ARGV[2])
+else
+    acquired = redis.call('SET', KEYS[1], ARGV[1], 'NX')
+end
+if acquired then
+    return {1, redis.call('INCR', KEYS[2])}
+end
+return {0, redis.call('PTTL', KEYS[1])}
+"""
+
+# KEYS: lock_key, lock_signal_key
+# ARGV: lock_secret, force, signal_timeout_ms
+# Releases the lock when the secret matches and wakes up a single waiter, returns 1 when released, 0 when the lock was
+# not held and -1 when it is held by someone else
+RELEASE_LOCK_SCRIPT = """
+local locker_secret = redis.call('GET', KEYS[1])
+if not locker_secret then
+    return 0
+end
+if ARGV[2] ~= '1' and locker_secret ~= ARGV[1] then
+    return -1
+end
+redis.call('DEL', KEYS[1])
+redis.call('LPUSH', KEYS[2], 1)
+redis.call('PEXPIRE', KEYS[2], ARGV[3])
+return 1
+"""
+
+# KEYS: rate_limit_key
+# ARGV: emission_interval_ms, duration_ms, count, partial
+# GCRA, the key holds the theoretical arrival time of the next request in milliseconds.
+# Returns {admitted_count, retry_after_ms}
+RATE_LIMIT_SCRIPT = """
+local time = redis.call('TIME')
+local now = tonumber(time[1]) * 1000 + tonumber(time[2]) / 1000
+local emission_interval = tonumber(ARGV[1])
+local duration = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]) or now)
+if tat < now then
+    tat = now
+end
+local available = math.floor((now + duration - tat) / emission_interval + 0.000001)
+local admitted = 0
+if available >= count then
+    admitted = count
+elseif ARGV[4] == '1' and available > 0 then
+    admitted = available
+end
+if admitted > 0 then
+    tat = tat + admitted * emission_interval
+    redis.call('SET', KEYS[1], string.format('%.3f', tat), 'PX', math.ceil(tat - now))
+end
+local retry_after = 0
+if admitted < count then
+    local needed = count - admitted
+    if ARGV[4] == '1' then
+        needed = 1
+    end
+    retry_after = math.ceil(tat + needed * emission_interval - duration - now)
+end
+return {admitted, retry_after}
+"""
+
+# KEYS: content_key
+# ARGV: expiration_ms
+# Extends the expiration of stored content to at least expiration_ms, returns 0 when the content is not stored
+TOUCH_CONTENT_SCRIPT = """
+local ttl = redis.call('PTTL', KEYS[1])
+if ttl == -2 then
+    return 0
+end
+if ttl >= 0 and ttl < tonumber(ARGV[1]) then
+    redis.call('PEXPIRE', KEYS[1], ARGV[1])
+end
+return 1
+"""
+
+
+def get_pool_script(rdb: "Redis", source: str) -> "Script":
+    """
+    Returns a script object shared by all the clients of the connection pool of rdb, the script is loaded to the
+    server on its first use and re-loaded whenever the server replies with NOSCRIPT
+    """
+    # Cluster clients have no single pool, their scripts are loaded on every node they are called on
+    pool_scripts = __SCRIPTS_BY_POOL.setdefault(getattr(rdb, "connection_pool", rdb), {})
+    script = pool_scripts.get(source)
+    if script is None:
+        script = rdb.register_script(source)
+        # Scripts are always executed with an explicit client, don't let the cache keep the pool alive
+        script.registered_client = None
+        pool_scripts[source] = script
+    return script
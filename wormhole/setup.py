@@ -1,34 +1,44 @@
-﻿from enum import Enum, auto
-
-from wormhole.channel import WormholeRedisChannel
-from wormhole.basic import BasicWormhole
-from wormhole.error import BaseWormholeException
-from wormhole.registry import set_primary_wormhole, get_primary_wormhole
-
-from typing import *
-
-
-class WormholeAsyncType(Enum):
-    NONE = auto()
-    GEVENT = auto()
-
-
-class WormholeSetupError(BaseWormholeException):
-    pass
-
-
-def basic_wormhole_setup(channel_uri: str = "redis://localhost:6379/1",
-                         async_type: Union[WormholeAsyncType, str] = WormholeAsyncType.NONE):
-    if get_primary_wormhole() is not None:
-        raise WormholeSetupError("Primary wormhole already set up")
-    channel = WormholeRedisChannel(channel_uri)
-    wormhole: Optional[BasicWormhole] = None
-    if async_type == WormholeAsyncType.NONE:
-        wormhole = BasicWormhole(channel)
-    if async_type in ("gevent", WormholeAsyncType.GEVENT):
-        from .async_implementations.async_gevent import GeventWormhole
-        wormhole = GeventWormhole(channel)
-    if wormhole is None:
-        raise WormholeSetupError(f"Unknown async type specified: {async_type}")
-    set_primary_wormhole(wormhole)
-    return wormhole
+﻿from enum import Enum, auto
+
+from wormhole.channel import WormholeRedisChannel, AbstractWormholeChannel
+from wormhole.basic import BasicWormhole
+from wormhole.error import BaseWormholeException
+from wormhole.registry import set_primary_wormhole, get_primary_wormhole
+
+from typing import *
+
+
+class WormholeAsyncType(Enum):
+    NONE = auto()
+    GEVENT = auto()
+
+
+class WormholeSetupError(BaseWormholeException):
+    pass
+
+
+def create_channel(channel_uri: str) -> AbstractWormholeChannel:
+    if channel_uri.startswith("unix://"):
+        from .channel_implementations.channel_ipc import WormholeIpcChannel
+        return WormholeIpcChannel(channel_uri[len("unix://"):])
+    if channel_uri.startswith("redis+cluster://"):
+        from .channel_implementations.channel_cluster import WormholeRedisClusterChannel
+        return WormholeRedisClusterChannel("redis://" + channel_uri[len("redis+cluster://"):])
+    return WormholeRedisChannel(channel_uri)
+
+
+def basic_wormhole_setup(channel_uri: str = "redis://localhost:6379/1",
+                         async_type: Union[WormholeAsyncType, str] = WormholeAsyncType.NONE):
+    if get_primary_wormhole() is not None:
+        raise WormholeSetupError("Primary wormhole already set up")
+    channel = create_channel(channel_uri)
+    wormhole: Optional[BasicWormhole] = None
+    if async_type == WormholeAsyncType.NONE:
+        wormhole = BasicWormhole(channel)
+    if async_type in ("gevent", WormholeAsyncType.GEVENT):
+        from .async_implementations.async_gevent import GeventWormhole
+        wormhole = GeventWormhole(channel)
+    if wormhole is None:
+        raise WormholeSetupError(f"Unknown async type specified: {async_type}")
+    set_primary_wormhole(wormhole)
+    return wormhole
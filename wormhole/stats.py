@@ -0,0 +1,119 @@
+﻿import math
+import time
+import threading
+
+from typing import *
+
+if TYPE_CHECKING:
+    import redis
+
+DEFAULT_RATE_TIME_CONSTANT = 10.0
+
+
+class WormholeRateCounter:
+    """
+    Counts events and keeps an exponentially decayed rate of them, events older than time_constant seconds weigh
+    about a third as much as new ones. Updates take no locks, an event may rarely be lost to a concurrent update.
+    """
+
+    def __init__(self, time_constant: float = DEFAULT_RATE_TIME_CONSTANT):
+        self.time_constant = time_constant
+        self.total = 0
+        self.__value = 0.0
+        self.__last_update_time = time.monotonic()
+
+    def __decay(self, now: float) -> float:
+        return self.__value * math.exp((self.__last_update_time - now) / self.time_constant)
+
+    def add(self, count: int = 1):
+        now = time.monotonic()
+        self.__value = self.__decay(now) + count
+        self.__last_update_time = now
+        self.total += count
+
+    @property
+    def rate(self) -> float:
+        """Events per second"""
+        return self.__decay(time.monotonic()) / self.time_constant
+
+
+class WormholeRateStats(NamedTuple):
+    sends: WormholeRateCounter
+    receives: WormholeRateCounter
+
+
+class WormholeStatsRecorder:
+    """The send and receive rates of every wormhole using a channel, kept in process"""
+
+    def __init__(self, time_constant: float = DEFAULT_RATE_TIME_CONSTANT):
+        self.time_constant = time_constant
+        self.__stats_by_id: Dict[str, WormholeRateStats] = {}
+
+    def __get_stats(self, wh_id: str) -> WormholeRateStats:
+        stats = self.__stats_by_id.get(wh_id)
+        if stats is None:
+            stats = WormholeRateStats(WormholeRateCounter(self.time_constant),
+                                      WormholeRateCounter(self.time_constant))
+            self.__stats_by_id[wh_id] = stats
+        return stats
+
+    def record_sends(self, wh_id: str, count: int = 1):
+        self.__get_stats(wh_id).sends.add(count)
+
+    def record_receives(self, wh_id: str, count: int = 1):
+        self.__get_stats(wh_id).receives.add(count)
+
+    def items(self) -> List[Tuple[str, WormholeRateStats]]:
+        return list(self.__stats_by_id.items())
+
+    def get_rates(self) -> Tuple[float, float]:
+        """Returns the total send and receive rates of all the wormholes"""
+        all_stats = list(self.__stats_by_id.values())
+        return sum(s.sends.rate for s in all_stats), sum(s.receives.rate for s in all_stats)
+
+
+class WormholeStatsFlusher:
+    """Writes the recorded stats of every wormhole to a whstats://<wormhole id> hash every interval seconds"""
+    STATS_PREFIX = "whstats://"
+
+    def __init__(self, recorder: WormholeStatsRecorder, get_rdb: Callable[[], "redis.Redis"], interval: float):
+        self.__recorder = recorder
+        self.__get_rdb = get_rdb
+        self.__interval = interval
+        self.__stop_event = threading.Event()
+        self.__thread: Optional[threading.Thread] = None
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.__flush_loop, daemon=True)
+        self.__thread.start()
+
+    def stop(self):
+        self.__stop_event.set()
+
+    def flush(self):
+        items = self.__recorder.items()
+        if len(items) == 0:
+            return
+        now = time.time()
+        transaction = self.__get_rdb().pipeline(transaction=False)
+        for wh_id, stats in items:
+            stats_key = f"{self.STATS_PREFIX}{wh_id}"
+            transaction.hset(stats_key, mapping={
+                "sends_per_second": stats.sends.rate,
+                "processing_per_second": stats.receives.rate,
+                "sends": stats.sends.total,
+                "processed": stats.receives.total,
+                "updated_at": now
+            })
+            # Stats of a wormhole that stopped disappear after a few intervals
+            transaction.expire(stats_key, max(1, int(self.__interval * 3)))
+        transaction.execute()
+
+    def __flush_loop(self):
+        while not self.__stop_event.wait(self.__interval):
+            try:
+                self.flush()
+            except Exception:
+                if self.__stop_event.is_set():
+                    return
+                continue  # Stats are best effort, try again on the next interval
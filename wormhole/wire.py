@@ -0,0 +1,84 @@
+﻿import struct
+
+from typing import *
+
+# Inline entries start with a zero byte so they can never be confused with plain message ids or reply signals
+INLINE_ENTRY_MARKER = b"\x00"
+
+# marker, flags, expiration timestamp, reply address length
+__INLINE_MESSAGE_STRUCT = struct.Struct("!cIdH")
+# marker, reply status, receiver id length
+__INLINE_REPLY_STRUCT = struct.Struct("!cBH")
+
+INLINE_REPLY_STATUS_ERROR = 1
+INLINE_REPLY_STATUS_HAS_DATA = 2
+
+
+class WormholeInlineMessage(NamedTuple):
+    flags: int
+    expires_at: float
+    reply_address: str
+    data: bytes
+
+
+class WormholeInlineReply(NamedTuple):
+    is_error: bool
+    receiver_id: str
+    data: Optional[bytes]
+
+
+def is_inline_entry(entry: bytes) -> bool:
+    return entry[:1] == INLINE_ENTRY_MARKER
+
+
+def pack_inline_message(flags: int, expires_at: float, reply_address: str, data: bytes) -> bytes:
+    encoded_reply_address = reply_address.encode()
+    header = __INLINE_MESSAGE_STRUCT.pack(INLINE_ENTRY_MARKER, flags, expires_at, len(encoded_reply_address))
+    return header + encoded_reply_address + data
+
+
+def unpack_inline_message(entry: bytes) -> WormholeInlineMessage:
+    _, flags, expires_at, reply_address_length = __INLINE_MESSAGE_STRUCT.unpack_from(entry)
+    reply_address_start = __INLINE_MESSAGE_STRUCT.size
+    data_start = reply_address_start + reply_address_length
+    reply_address = entry[reply_address_start:data_start].decode()
+    return WormholeInlineMessage(flags, expires_at, reply_address, entry[data_start:])
+
+
+def pack_inline_reply(receiver_id: str, data: Optional[bytes], is_error: bool) -> bytes:
+    status = 0
+    if is_error:
+        status |= INLINE_REPLY_STATUS_ERROR
+    if data is not None:
+        status |= INLINE_REPLY_STATUS_HAS_DATA
+    else:
+        data = b""
+    encoded_receiver_id = receiver_id.encode()
+    header = __INLINE_REPLY_STRUCT.pack(INLINE_ENTRY_MARKER, status, len(encoded_receiver_id))
+    return header + encoded_receiver_id + data
+
+
+def unpack_inline_reply(entry: bytes) -> WormholeInlineReply:
+    _, status, receiver_id_length = __INLINE_REPLY_STRUCT.unpack_from(entry)
+    receiver_id_start = __INLINE_REPLY_STRUCT.size
+    data_start = receiver_id_start + receiver_id_length
+    receiver_id = entry[receiver_id_start:data_start].decode()
+    data: Optional[bytes] = None
+    if status & INLINE_REPLY_STATUS_HAS_DATA:
+        data = entry[data_start:]
+    return WormholeInlineReply(bool(status & INLINE_REPLY_STATUS_ERROR), receiver_id, data)
+
+
+# message id length, followed by the message id and an inline reply entry
+__INBOX_REPLY_STRUCT = struct.Struct("!H")
+
+
+def pack_inbox_reply(message_id: str, reply_entry: bytes) -> bytes:
+    encoded_message_id = message_id.encode()
+    return __INBOX_REPLY_STRUCT.pack(len(encoded_message_id)) + encoded_message_id + reply_entry
+
+
+def unpack_inbox_reply(entry: bytes) -> Tuple[str, bytes]:
+    message_id_length, = __INBOX_REPLY_STRUCT.unpack_from(entry)
+    reply_entry_start = __INBOX_REPLY_STRUCT.size + message_id_length
+    return entry[__INBOX_REPLY_STRUCT.size:reply_entry_start].decode(), entry[reply_entry_start:]